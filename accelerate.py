@@ -0,0 +1,168 @@
+"""
+Closed forms of counted loops (`for i L..U`).
+
+A loop body made of per-iteration variables (`d = i * 2`) and affine
+updates of accumulators (`s! = s + d`, `p! = p * 2 + 1`) does not need to
+be run once per iteration: after N iterations of `s! = a * s + e`,
+
+    s = a^N * s0 + sum(a^j * e_(N-1-j) for j < N)
+
+which takes the same time to compute for any N. When `a` is 1 and `e` is
+linear in the loop variable the sum is exact, otherwise each `e` is bound
+by its bounds over all the iterations.
+"""
+
+from dataclasses import dataclass
+
+from bdsl_ir import Assign, BinOp, Declare, Expr, Num, Program, Statement, Var
+from bounds import Bounds, Interval, IntervalPoint
+
+type Number = int | float
+
+
+@dataclass(frozen=True, slots=True)
+class Update:
+    """`name! = scale * name + rest` (rest is None for 0)"""
+
+    name: str
+    scale: Number
+    rest: Expr | None
+
+
+def combine(op: str, lhs: Expr | None, rhs: Expr | None) -> Expr | None:
+    """`lhs op rhs` for `+` and `-`, None standing for 0"""
+    if rhs is None:
+        return lhs
+    if lhs is None:
+        return rhs if op == '+' else BinOp('-', Num(0), rhs)
+    return BinOp(op, lhs, rhs)
+
+
+def linear_form(expr: Expr, name: str) -> tuple[Number, Expr | None] | None:
+    """
+    Writes the expression as `a * name + rest`, `a` being a number and
+    `rest` not reading `name` (None for 0). None if it is not linear in
+    `name`.
+    """
+    if name not in expr.free_vars():
+        return 0, expr
+    match expr:
+        case Var():
+            return 1, None
+        case BinOp(op='+' | '-' as op, lhs=lhs, rhs=rhs):
+            lhs_form, rhs_form = linear_form(lhs, name), linear_form(rhs, name)
+            if lhs_form is None or rhs_form is None:
+                return None
+            sign = 1 if op == '+' else -1
+            return lhs_form[0] + sign * rhs_form[0], combine(op, lhs_form[1], rhs_form[1])
+        case BinOp(op='*' | '/' as op, lhs=lhs, rhs=rhs):
+            if isinstance(rhs, Num) and not (op == '/' and rhs.value == 0):
+                operand, factor = lhs, rhs.value
+            elif op == '*' and isinstance(lhs, Num):
+                operand, factor = rhs, lhs.value
+            else:
+                return None
+            form = linear_form(operand, name)
+            if form is None:
+                return None
+            scale, rest = form
+            scale = scale / factor if op == '/' else scale * factor
+            if rest is not None:
+                rest = BinOp(op, rest, Num(factor))
+            return scale, rest
+    return None
+
+
+def substitute(expr: Expr, defs: dict[str, Expr]) -> Expr:
+    """Replaces the variables defined in `defs` with their expression"""
+    if not expr.free_vars() & defs.keys():
+        return expr
+    match expr:
+        case Var(name=name):
+            return defs[name]
+        case BinOp(op=op, lhs=lhs, rhs=rhs):
+            return BinOp(op, substitute(lhs, defs), substitute(rhs, defs))
+    # Calls take their arguments by value: evaluated in the loop context
+    return expr
+
+
+def affine_updates(
+    body: Program, builtins: set[str]
+) -> tuple[list[Statement], list[Update]] | None:
+    """
+    Splits a loop body into the statements declaring per-iteration
+    variables and the affine updates of the accumulators (the variables it
+    overwrites). None if the body does anything else: queries, branches,
+    nested loops, updates reading another accumulator or calling user
+    functions (that could print).
+    """
+    accumulators = {stmt.name for stmt in body if isinstance(stmt, Assign) and stmt.overwrite}
+    locals_stmts: list[Statement] = []
+    # Per-iteration variables, by the expression (of the loop variable) they hold
+    defs: dict[str, Expr] = {}
+    updates: dict[str, Update] = {}
+    for stmt in body:
+        match stmt:
+            case Declare(name=name, overwrite=False) if name not in accumulators:
+                locals_stmts.append(stmt)
+            case Assign(name=name, overwrite=False, expr=expr) if (
+                name not in accumulators
+                and not expr.free_vars() & accumulators
+                and expr.fn_calls() <= builtins
+            ):
+                locals_stmts.append(stmt)
+                defs[name] = substitute(expr, defs)
+            case Assign(name=name, overwrite=True, expr=expr) if (
+                name not in updates and expr.fn_calls() <= builtins
+            ):
+                form = linear_form(substitute(expr, defs), name)
+                if form is None:
+                    return None
+                scale, rest = form
+                if rest is not None and rest.free_vars() & accumulators:
+                    return None
+                updates[name] = Update(name, scale, rest)
+            case _:
+                return None
+    return locals_stmts, list(updates.values())
+
+
+def exact(value: float) -> Number:
+    """The value as an int if it is one (and a float can hold it exactly)"""
+    if value.is_integer() and abs(value) < 2**53:
+        return int(value)
+    return value
+
+
+def power(scale: Number, trips: int) -> Number:
+    """`scale^trips`. Raises OverflowError if it does not fit a float"""
+    return exact(float(scale) ** trips)
+
+
+def power_sums(scale: Number, trips: int) -> tuple[Number, Number]:
+    """
+    Sums of the even and of the odd powers `scale^j`, for `j < trips`.
+    Raises OverflowError if they do not fit a float.
+    """
+    evens, odds = (trips + 1) // 2, trips // 2
+    square = float(scale) * float(scale)
+    if square == 1:
+        return evens, exact(scale * odds)
+    return (
+        exact((1 - square**evens) / (1 - square)),
+        exact(scale * (1 - square**odds) / (1 - square)),
+    )
+
+
+def scale_bounds(bounds: Bounds, factor: Number) -> Bounds:
+    """`bounds * factor`, for a number of any sign (negative ones flip the ends)"""
+    if factor == 0:
+        return Bounds.from_num_tuples(((0, 0),))
+    intervals = []
+    for lo, hi in bounds.get_bounds():
+        lo = None if lo is None else IntervalPoint(lo.value * factor, lo.is_included)
+        hi = None if hi is None else IntervalPoint(hi.value * factor, hi.is_included)
+        intervals.append(Interval(lo, hi) if factor > 0 else Interval(hi, lo))
+    res = Bounds.union_many(intervals)
+    assert res is not None, 'Empty bounds'
+    return res
@@ -0,0 +1,207 @@
+"""
+In-process API: analyzes a program and returns its results as data.
+
+`analyze` runs a program in a fresh `Interpreter` that prints nothing: the
+query results (`x?`), the final bounds of every variable and the errors
+are collected in an `AnalysisResult`. Nothing is ANSI formatted and
+errors never exit the process, so a long-lived process can answer many
+analyses (parsed programs are cached, and interpreters are cheap).
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Iterable
+
+from bdsl import Interpreter, Opts
+from bdsl_ir import Program
+from bdsl_parser import iter_statements, parse_program
+from bdsl_types import InterpreterContext, ProgramData, VarContext
+from bounds import Bounds
+from examples.errors import InterpreterError, VariableNotDefinedError
+from optimizer import optimize
+
+
+def bounds_to_json(bounds: Bounds | None) -> dict[str, Any] | None:
+    """
+    JSON friendly form of the bounds: their text and their intervals, as
+    `[low, low_included, high, high_included]` (None ends are unbounded).
+    """
+    if bounds is None:
+        return None
+    intervals = []
+    for lo, hi in bounds.get_bounds():
+        intervals.append(
+            [
+                None if lo is None else lo.value,
+                lo is not None and lo.is_included,
+                None if hi is None else hi.value,
+                hi is not None and hi.is_included,
+            ]
+        )
+    return {'text': str(bounds), 'intervals': intervals}
+
+
+@dataclass
+class QueryResult:
+    """Bounds printed by a `x?` query"""
+
+    line: int
+    varname: str
+    bounds: Bounds | None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {'line': self.line, 'var': self.varname, 'bounds': bounds_to_json(self.bounds)}
+
+
+@dataclass
+class Diagnostic:
+    """An error found while parsing or running the program"""
+
+    # Exception name, like `VariableNotDefinedError` or `AssertionError`
+    kind: str
+    message: str
+    # Source line, None if unknown
+    line: int | None
+    # First and last column, if known
+    cols: tuple[int, int] | None = None
+    severity: str = 'error'
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'kind': self.kind,
+            'message': self.message,
+            'line': self.line,
+            'cols': self.cols,
+            'severity': self.severity,
+        }
+
+
+@dataclass
+class AnalysisResult:
+    """Everything a run produced, up to its first error"""
+
+    # Final bounds of each variable of the top level context
+    bounds: dict[str, Bounds | None] = field(default_factory=dict)
+    queries: list[QueryResult] = field(default_factory=list)
+    diagnostics: list[Diagnostic] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not any(d.severity == 'error' for d in self.diagnostics)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'ok': self.ok,
+            'bounds': {name: bounds_to_json(bds) for name, bds in self.bounds.items()},
+            'queries': [q.to_dict() for q in self.queries],
+            'diagnostics': [d.to_dict() for d in self.diagnostics],
+        }
+
+
+class CollectingInterpreter(Interpreter):
+    """Interpreter recording query results instead of printing anything"""
+
+    def __init__(self, opts: Opts | None = None) -> None:
+        super().__init__(opts)
+        self.queries: list[QueryResult] = []
+
+    def print(self, *args):
+        pass
+
+    def print_var_msg(
+        self,
+        varname: str,
+        line: str,
+        line_num: int,
+        colno: int,
+        curr_context: VarContext,
+        interpreter_context: InterpreterContext,
+    ):
+        if varname not in curr_context:
+            raise VariableNotDefinedError(
+                varname,
+                line_num,
+                interpreter_context=interpreter_context,
+                colno=colno,
+            )
+        bounds = self.calc_bounds(varname, curr_context)
+        self.queries.append(QueryResult(line_num, varname, bounds))
+
+
+def _parse_error_line(lines: tuple[str, ...]) -> int | None:
+    """Line where parsing the program fails"""
+    last_read = None
+
+    def numbered():
+        nonlocal last_read
+        for line_num, line in enumerate(lines, start=1):
+            last_read = line_num
+            yield line
+
+    try:
+        for _ in iter_statements(numbered()):
+            pass
+    except AssertionError:
+        return last_read
+    return None
+
+
+def to_diagnostic(error: Exception, line: int | None) -> Diagnostic:
+    """Diagnostic of an error, raised at `line` unless it knows its location"""
+    if isinstance(error, InterpreterError):
+        message = error.get_message(color=False)
+        return Diagnostic(type(error).__name__, message, error.lineno, error.cols)
+    return Diagnostic(type(error).__name__, str(error), line)
+
+
+def final_bounds(interpreter: Interpreter) -> dict[str, Bounds | None]:
+    """Bounds of the top level variables (None for the ones failing to compute)"""
+    if not interpreter.context_stack:
+        return {}
+    context = interpreter.context_stack[0]
+    bounds: dict[str, Bounds | None] = {}
+    for name in context:
+        try:
+            bounds[name] = interpreter.calc_bounds(name, context)
+        except Exception:  # pylint: disable=broad-exception-caught
+            bounds[name] = None
+    return bounds
+
+
+def analyze(
+    source: str | Iterable[str],
+    opts: Opts | None = None,
+    filename: str = '<input>',
+    prelude: Iterable[Program] = (),
+) -> AnalysisResult:
+    """
+    Analyzes a program, given as its text or as its lines.
+
+    The `prelude` programs (like shared function definitions) run first, in
+    the same interpreter.
+    """
+    if isinstance(source, str):
+        source = source.splitlines(keepends=True)
+    lines = tuple(source)
+    result = AnalysisResult()
+
+    try:
+        program = parse_program(lines)
+    except AssertionError as e:
+        result.diagnostics.append(to_diagnostic(e, _parse_error_line(lines)))
+        return result
+
+    interpreter = CollectingInterpreter(opts)
+    try:
+        if interpreter.opts.optimize:
+            program = optimize(program)
+        for library in prelude:
+            interpreter.exec_program(library)
+        interpreter.exec_program(program, ProgramData(filename))
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        # Any failure (like a division by 0) is a diagnostic, not a crash
+        line = None if interpreter.stmt is None else interpreter.stmt.line_num
+        result.diagnostics.append(to_diagnostic(e, line))
+
+    result.queries = interpreter.queries
+    result.bounds = final_bounds(interpreter)
+    return result
@@ -0,0 +1,126 @@
+"""
+Batch mode: analyzes many programs in one process.
+
+Files are spread over a pool of worker processes (`-j`). Each worker
+keeps the interpreter modules loaded, and every file runs in a fresh
+`Interpreter`. Results are reported in the order the files were given, then
+followed by the overall throughput. With `--profile-out`, the profiles of
+all the files are written to that one JSON file.
+"""
+
+import glob
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import repeat
+
+import bdsl
+from bdsl_types import ProgramData
+from colors import c
+from examples.errors import InterpreterError
+
+
+@dataclass
+class FileResult:
+    """Outcome of analyzing one file"""
+
+    filename: str
+    output: str
+    # Error message, if the analysis failed
+    error: str | None
+    lines: int
+    seconds: float
+    # Profile, as in `ProfilingInterpreter.to_dict` (with `--profile-out`)
+    profile: dict | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def expand_files(patterns: list[str]) -> list[str]:
+    """Files matching the given paths or glob patterns, in the given order"""
+    files: list[str] = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        files.extend(matches or [pattern])
+    return files
+
+
+def run_file(filename: str, opts: 'bdsl.Opts') -> FileResult:
+    """Analyzes a file in a fresh interpreter, capturing its output"""
+    start = time.perf_counter()
+    out = io.StringIO()
+    error = None
+    lines = 0
+    profile = None
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            code = f.readlines()
+        lines = len(code)
+        interpreter = bdsl.make_interpreter(opts, out)
+        interpreter.exec_code(code, ProgramData(filename))
+        if opts.stats:
+            interpreter.print_stats()
+        if opts.profile and opts.profile_out is not None:
+            # Written once for the whole batch, by `main`
+            interpreter.stop()
+            profile = interpreter.to_dict()
+        else:
+            bdsl.report_profile(interpreter, opts)
+    except InterpreterError as e:
+        error = e.format()
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        # One failing file must not stop the others
+        error = f'{type(e).__name__}: {e}'
+    seconds = time.perf_counter() - start
+    return FileResult(filename, out.getvalue(), error, lines, seconds, profile)
+
+
+def run_batch(files: list[str], opts: 'bdsl.Opts', jobs: int) -> list[FileResult]:
+    """Analyzes files over `jobs` processes. Results keep the order of `files`"""
+    if jobs <= 1 or len(files) <= 1:
+        return [run_file(filename, opts) for filename in files]
+
+    chunksize = max(1, len(files) // (4 * jobs))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(run_file, files, repeat(opts), chunksize=chunksize))
+
+
+def print_results(results: list[FileResult], seconds: float):
+    for res in results:
+        print(c.BOLD(f'==> {res.filename} <=='))
+        print(res.output, end='')
+        if res.error is not None:
+            print(res.error)
+
+    failed = sum(not res.ok for res in results)
+    lines = sum(res.lines for res in results)
+    rate = 1 / seconds if seconds > 0 else 0
+    summary = f'{len(results)} files ({failed} failed), {lines} lines in {seconds:.3f}s'
+    summary += f': {len(results) * rate:.1f} files/s, {lines * rate:.0f} lines/s'
+    print(c.YELLOW(summary))
+
+
+def write_profiles(results: list[FileResult], path: str):
+    """Writes the profiles of the files to one JSON document"""
+    files = [{'filename': res.filename, **res.profile} for res in results if res.profile]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'files': files}, f, indent=2)
+        f.write('\n')
+
+
+def main(patterns: list[str], opts: 'bdsl.Opts') -> int:
+    """Runs batch mode, returning the exit code"""
+    files = expand_files(patterns)
+    jobs = opts.jobs or os.cpu_count() or 1
+
+    start = time.perf_counter()
+    results = run_batch(files, opts, jobs)
+    print_results(results, time.perf_counter() - start)
+    if opts.profile and opts.profile_out is not None:
+        write_profiles(results, opts.profile_out)
+    return 0 if all(res.ok for res in results) else 1
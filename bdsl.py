@@ -3,34 +3,70 @@
 
 
 import sys
+from functools import lru_cache
 from warnings import warn
-from typing import Callable
+from typing import Callable, Iterable, TextIO
 
 from bounds import Bounds, IntOrFloat, Interval, IntervalPoint, split_interval
-from examples.errors import VariableNotDefinedError
+from examples.errors import InterpreterError, VariableNotDefinedError
 import lexer
+import vectorized
 from colors import c
 from bdsl_types import (
     BuiltinFunction,
     InterpreterContext,
     ProgramData,
+    RunStats,
     VarData,
     VarContext,
     FunctionData,
     Conditions,
+    callers,
+    fn_key,
     merge_contexts,
-    numOrNone,
     populate_builtin_fcns,
     split_context,
 )
 
-from configuration import UNICODE_OUT, VERBOSE, WARN_IF_NONE
-
-
-context_stack: list[VarContext] = []
-other_context_stack: list[VarContext] = []
-split_cond_stack: list[Conditions] = []
-functions: dict[str, FunctionData | BuiltinFunction] = {}
+from bdsl_ir import (
+    Assign,
+    BinOp,
+    Call,
+    Condition,
+    Declare,
+    Else,
+    End,
+    Expr,
+    Finalize,
+    FnDef,
+    For,
+    If,
+    Num,
+    Query,
+    Return,
+    Show,
+    Statement,
+    Var,
+    While,
+    has_output,
+)
+from bdsl_parser import iter_statements, parse_program
+from optimizer import optimize
+
+from fn_cache import FunctionCache
+from accelerate import affine_updates, linear_form, power, power_sums, scale_bounds
+from relational import DBM, ZERO, Difference, alias_differences, condition_differences
+
+from configuration import (
+    FN_CACHE_SIZE,
+    MAX_FRAGMENTS,
+    NARROW_PASSES,
+    UNROLL_LIMIT,
+    UNICODE_OUT,
+    VECTORIZE_MIN_PAIRS,
+    WARN_IF_NONE,
+    WIDEN_DELAY,
+)
 
 
 def collapse_expr(opvars: list[Bounds], opops: list[str]):
@@ -48,6 +84,9 @@ def collapse_expr(opvars: list[Bounds], opops: list[str]):
         min_in = False
         max_in = False
         zero_exclude = False
+        if op == '/' and (r20 is None or r20.value <= 0) and (r21 is None or r21.value >= 0):
+            # The divisor reaches 0: the quotient can be as large as any number
+            return Interval(None, None), False
         if op == '/':
             if r10 is None or r21 is None:
                 r_min = None
@@ -94,15 +133,8 @@ def collapse_expr(opvars: list[Bounds], opops: list[str]):
 
         return Interval(r_min, r_max), zero_exclude
 
-    while len(opops) > 0:
-        op = opops.pop(0)
-        assert op in lexer.OPS, f'Operator {op} not implemented'
-
-        b1 = opvars.pop(0)
-        b2 = opvars.pop(0)
-
-        bbs: Bounds | None = None
-        # print(f'b1: {b1}, b2: {b2}')
+    def __collapse_bounds(b1: Bounds, b2: Bounds, op: str) -> Bounds | None:
+        results: list[Interval] = []
         for rs1_i in b1.get_bounds():
             for rs2_i in b2.get_bounds():
 
@@ -110,178 +142,48 @@ def collapse_expr(opvars: list[Bounds], opops: list[str]):
 
                 if zero_exclude:
                     i1, i2 = split_interval(result_ij, IntervalPoint(0, False))
-                    if i1 and i2:
-                        result_ij = Bounds.from_list([i1, i2])
-                    elif i1:
-                        result_ij = Bounds.from_interval(i1)
-                    else:
-                        assert i2
-                        result_ij = Bounds.from_interval(i2)
+                    results.extend(i for i in (i1, i2) if i)
                 else:
-                    result_ij = Bounds.from_interval(result_ij)
-                if bbs is None:
-                    bbs = result_ij
-                else:
-                    bbs.union_bounds(result_ij)
-                # print(f'bbs: {bbs}')
-
-        assert bbs
-        opvars.insert(0, bbs)
-    assert len(opvars) == 1
-    return opvars[0]
-
-
-def calc_bounds(
-    v_name: str, context: VarContext, program_data: ProgramData, opts: 'Opts'
-) -> Bounds | None:
-    """Calculate bounds for variable v_name from given context"""
-    assert v_name in context, f'Variable {v_name} not defined'
-    vardata = context[v_name]
-    if vardata.bounds is not None:
-        if vardata.bounds.get_bounds()[0] != (None, None):
-            # print('TRUE BOUNDS: ', vardata.bounds.get_bounds())
-            return Bounds(vardata.bounds.get_bounds())
-    expr = vardata.expr
-
-    if expr is None:
-        if WARN_IF_NONE:
-            warn(f'variable {v_name} got None bounds and expression')
-        return None
-
-    assert len(expr) > 0
-    is_fn_call, rest = lexer.match_token(''.join(expr), lexer.FN_CALL_RE)
-    if is_fn_call:
-        assert rest is not None
-        fn_name = rest[0]
-        func = functions[fn_name]
-        args = rest[1].split(',')
-        assert len(args) == len(func.args), 'Wrong number of arguments'
-
-        return evaluate_func(func, args, context, program_data, opts)
-
-        # Now the context stack will hold the function processed code.
-
-    if len(expr) == 2:
-        l_v = numOrNone(expr[0])
-        u_v = numOrNone(expr[1])
-        return Bounds.from_interval(
-            Interval(
-                IntervalPoint(l_v) if l_v is not None else None,
-                IntervalPoint(u_v) if u_v is not None else None,
-            )
-        )
-
-    opvars = list[str | IntervalPoint]()
-    opops = []
-
-    for e in expr:
-        # match_var = re.match(VAR_RE, e)
-        match_var, match_groups = lexer.match_token(e, lexer.VAR_RE)
-        if match_var:
-            assert match_groups is not None
-            opvars.append(match_groups[0])
-            for g in match_groups[1:]:
-                assert g == '', f'Variable {e} cannot have modifiers in expression'
-            continue
-
-        # match_op = re.match(OP_RE, e)
-        match_op, _ = lexer.match_token(e, lexer.OP_RE)
-        if match_op:
-            opops.append(e)  # match_op.groups()[0]
-            continue
-        match_num, match_groups = lexer.match_token(e, lexer.NUM_RE)
-        if match_num:
-            assert match_groups is not None
-            num_val = numOrNone(match_groups[0])
-            assert num_val is not None, f'Value {match_groups[0]} not a number'
-            opvars.append(IntervalPoint(num_val))
-            # opvars.append(match_groups[0])
-            # for g in match_groups[1:]:
-            #     assert g == '', \
-            #         f'Variable {e} cannot have modifiers in expression'
-            continue
-
-        assert False, f'Token {e} in expression {vardata} not implemented'
-
-    assert len(opvars) == len(opops) + 1, f'Expression {vardata} malformed'
-
-    varlist: list[Bounds] = []
-    for op in opvars:
-        if isinstance(op, IntervalPoint):
-            varlist.append(Bounds(((op, op),)))
-        else:
-            bds = calc_bounds(op, context, program_data, opts)
-            if bds is None:
-                return None
-            varlist.append(bds)
-
-    return collapse_expr(varlist, opops)
-
-
-def print_vars(context: VarContext):
-    print(c.YELLOW('vars:'))
-    for v in context:
-        print(f'\t{context[v]}')
-        # print(vardict)
-
-
-def print_fcns(opts: 'Opts'):
-    print(c.YELLOW('funcs:'))
-    for f in functions.values():
-
-        body = ['!builtin'] if f.is_builtin else f.body
-        assert body
-
-        if opts.verbose == 0:
-            print(f'\t{c.GREEN(f.name)}, args: {f.args}, body_count: {len(body)}')
-        else:
-            print(f'   {c.GREEN(f.name)} ({', '.join(f.args)})')
-            # print('  body:')
-            for line in body:
-                print('\t' + line)
+                    results.append(result_ij)
 
+        return Bounds.union_many(results)
 
-def gt(x: IntOrFloat | str, y: IntOrFloat | str, eq: bool, program_data, opts) -> Bounds:
-    curr_context = context_stack[-1]
-    assert not (isinstance(x, str) and isinstance(y, str)), f'Cannot compare vars rn {x} == {y}'
+    while len(opops) > 0:
+        op = opops.pop(0)
+        assert op in lexer.OPS, f'Operator {op} not implemented'
 
-    if isinstance(x, str):
-        assert not isinstance(y, str)
+        b1 = opvars.pop(0)
+        b2 = opvars.pop(0)
 
-        bds = curr_context[x].bounds
-        # print('bds:', curr_context[x].bounds)
-        # print('expr:', curr_context[x].expr)
-        if bds is None:
-            bds = calc_bounds(x, curr_context, program_data, opts)
-        # assert bds is not None, f'Variable {x} has no bounds'
-        return bds.copy().intersect_interval((IntervalPoint(y, eq), None))
+        bbs: Bounds | None = None
+        # Fragmented operands: combine all the pairs of intervals at once
+        if vectorized.HAS_NUMPY and len(b1) * len(b2) >= VECTORIZE_MIN_PAIRS:
+            bbs = vectorized.collapse_bounds(b1, b2, op)
+        if bbs is None:
+            bbs = __collapse_bounds(b1, b2, op)
+        if bbs is None:
+            # Only empty results
+            return None
+        opvars.insert(0, bbs)
+    assert len(opvars) == 1
+    return opvars[0]
 
-    assert isinstance(y, str) and not isinstance(x, str)
 
-    bds = curr_context[y].bounds
-    assert bds is not None, f'Variable {y} has no bounds'
-    return bds.copy().intersect_interval((None, IntervalPoint(x, eq)))
+def is_skipped(stmt: Statement, context: VarContext) -> bool:
+    """Whether a statement is not run: branches that never run only follow if/else/end"""
+    return context.unreachable and not isinstance(stmt, (If, Else, End))
 
 
-def eq(x: IntOrFloat | str, y: IntOrFloat | str) -> Bounds:
-    curr_context = context_stack[-1]
-    assert not (
-        isinstance(x, str) and isinstance(y, str)
-    ), f'Operator "==" not implemented for two vars ({x} == {y}) atm'
+def unbounded() -> Bounds:
+    """Bounds of a variable that could hold anything"""
+    return Bounds.from_num_tuples(((None, None),))
 
-    if isinstance(x, str):
-        var = curr_context[x]
-        assert not isinstance(y, str)
-        val = IntervalPoint(y, True)
-    else:
-        assert isinstance(y, str)
-        assert not isinstance(x, str)
-        var = curr_context[y]
-        val = IntervalPoint(x, True)
 
-    bds = var.bounds
-    assert bds is not None, f'Variable {var.name} has no bounds'
-    return bds.copy().intersect_interval((val, val))
+@lru_cache(maxsize=256, typed=True)
+def literal_bounds(value: IntOrFloat) -> Bounds:
+    """Bounds of a literal, built once: callers must copy them"""
+    point = IntervalPoint(value)
+    return Bounds(((point, point),))
 
 
 def neq(x: IntOrFloat | str, y: IntOrFloat | str) -> Bounds:
@@ -305,379 +207,784 @@ def neq(x: IntOrFloat | str, y: IntOrFloat | str) -> Bounds:
     # return bds.copy().intersect_interval((val+1, None)).union_interval().get_bounds()
 
 
-def get_cond(vals: list[IntOrFloat | str], cond: str, program_data, opts) -> Bounds:
-    assert len(vals) == 2, f'Need 2 values for condition, got {vals}'
-
-    if cond == '>':
-        return gt(vals[0], vals[1], False, program_data, opts)
-    if cond == '<':
-        return gt(vals[1], vals[0], False, program_data, opts)
-    if cond == '==':
-        return eq(vals[0], vals[1])
-    if cond == '!=':
-        assert False, 'Operator "!=" not implemented'
-        # return neq(vals[0], vals[1])
-    if cond == '>=':
-        return gt(vals[0], vals[1], True, program_data, opts)
-        # assert False, 'Operator >=" not implemented'
-        # return gte(vals[0], vals[1])
-    if cond == '<=':
-        # assert False, 'Operator <=" not implemented'
-        return gt(vals[1], vals[0], True, program_data, opts)
-    assert False, f'Condition {cond} not implemented'
-
-
-def pase_condition(
-    tokens: list[str], context: VarContext, program_data: ProgramData, opts: 'Opts'
-) -> Conditions:
-    assert len(tokens) > 0, 'No tokens to parse'
-    assert len(tokens) % 3 == 0, f'Condition {tokens} malformed'
-
-    assert len(tokens) == 3, 'Only one condition with 3 tokens supported now.'
-
-    conds = {}
-    varname = None
-    vals: list[IntOrFloat | str] = []
-    cond = None
-    if VERBOSE:
-        print('pase_condition: ', tokens)
-    for token in tokens:
-        (t_type, *rest) = lexer.get_token_type(token)
-        if VERBOSE:
-            print('t_type:', lexer.token_names[t_type], rest)
-        if t_type == lexer.TOKEN_VAR:
-            varname = rest[0]
-            # if varname not in context:
-            #     raise VariableNotDefinedError(
-            #         varname,
-            #     )
-            assert varname in context, f'Variable {varname} not defined'
-            vals.append(varname)
-        elif t_type == lexer.TOKEN_COND:
-            cond = rest[0]
-            # print('cond:', cond)
-
-        elif t_type == lexer.TOKEN_NUM:
-            val_n = numOrNone(rest[0])
-            assert val_n is not None, f'Value {rest[0]} not a number'
-            vals.append(val_n)
-
-    assert varname is not None, 'Variable not defined'
-    assert cond is not None, 'Condition not defined'
-
-    assert len(vals) == 2, 'need 2 values for condition'
-
-    conds[varname] = get_cond(vals, cond, program_data, opts)
-    return conds
-
-
-def print_var_msg(
-    varname: str,
-    line: str,
-    line_num: int,
-    curr_context: VarContext,
-    interpreter_context: InterpreterContext,
-    program_data: ProgramData,
-    opts: 'Opts',
-):
-
-    if varname not in curr_context:
-        raise VariableNotDefinedError(
-            varname,
-            line_num,
-            interpreter_context=interpreter_context,
-            colno=line.find(varname) + 1,
-        )
-    header = c.FAINT(f'{line_num:03}')
-    bounds = calc_bounds(varname, curr_context, program_data, opts)
-
-    if opts.verbose > 0:
-        if opts.verbose > 1:
-            header = c.FAINT(f'{program_data.filename}:{line_num:03}')
-
-        endl = c.FAINT(f'[{line.strip().removesuffix('\n')}]')
-    else:
-        endl = ''
-    if UNICODE_OUT:
-        msg = f'{header} : {c.GREEN(varname)} ∈ {bounds}'
+def check_assignable(varname: str, overwrite: bool, finalize: bool, curr_context: VarContext):
+    if overwrite:
+        assert (
+            varname in curr_context
+        ), f'Variable {
+            varname} not defined, cannot overwerite'
+    elif finalize:
+        assert (
+            varname in curr_context
+        ), f'Variable {varname} not defined, canno finalyze value'
     else:
-        msg = f'{header} : BOUNDS({c.GREEN(varname)}): {bounds}'
-
-    if opts.verbose == 0:
-        msg = f'{msg}{endl}'
-    elif opts.verbose == 1:
-        msg = f'{msg:<70}{endl}'
-    elif opts.verbose >= 2:
-        msg = f'{msg:<100}{endl}'
-
-    print(msg)
-
-def evaluate_func(
-    func: FunctionData,
-    args: list[str],
-    context: VarContext,
-    program_data: ProgramData,
-    opts: 'Opts',
-) -> Bounds | None:
-
-    if func.is_builtin:
-        assert isinstance(func, BuiltinFunction)
-        interval = context_stack[-1][args[0]].bounds
-        assert interval
-
-        res_mixed = [i for i in (func.eval(i) for i in interval.get_bounds()) if i is not None]
-        i = 0
-        if len(res_mixed) == 0:
+        assert (
+            varname not in curr_context
+        ), f'Variable {varname} already defined. Cannot redeclare'
+
+
+class Interpreter:
+    """
+    Runs programs, owning all the state of a run: the context stacks, the
+    defined functions, the counters and the function results cache.
+
+    Instances share nothing mutable, so several of them can run at the same
+    time (e.g. in a thread pool). Output goes to `out` (stdout if None).
+    """
+
+    def __init__(self, opts: 'Opts | None' = None, out: TextIO | None = None) -> None:
+        self.opts = opts or Opts()
+        self.out = out
+        self.context_stack: list[VarContext] = []
+        self.other_context_stack: list[VarContext] = []
+        self.split_cond_stack: list[Conditions] = []
+        # Above 0, queries print nothing (loop iterations before the last one)
+        self.quiet = 0
+        self.functions: dict[str, FunctionData | BuiltinFunction] = {}
+        populate_builtin_fcns(self.functions)
+        self.stats = RunStats()
+        self.fn_cache = FunctionCache(self.opts.fn_cache_size)
+        self.program_data = ProgramData('<none>')
+        # Statement being run, to locate errors
+        self.stmt: Statement | None = None
+
+    def print(self, *args):
+        print(*args, file=self.out)
+
+    def calc_bounds(self, v_name: str, context: VarContext) -> Bounds | None:
+        """Calculate bounds for variable v_name from given context"""
+        assert v_name in context, f'Variable {v_name} not defined'
+        vardata = context[v_name]
+        expr = vardata.expr
+        if vardata.bounds is not None:
+            if expr is None or not vardata.bounds.is_unbounded():
+                return vardata.bounds.copy()
+
+        if expr is None:
+            if WARN_IF_NONE:
+                warn(f'variable {v_name} got None bounds and expression')
             return None
-        res = Bounds.from_interval(res_mixed[0])
-        # if len(res_mixed) > 1:
-        for i in range(1, len(res_mixed)):
-            res.union_interval(res_mixed[i])
-
-        return res
-
-    assert func.body, f'Function {func.name} has no body!'
-
-    func_context: VarContext = {}
-    for f_arg, arg in zip(func.args, args):
-        func_context[f_arg] = context[arg]
-        # NOTE: check if func name needs to be change or
-        #   if retaining the original name could be a feature
-        # func_context[f_arg].name = f_arg
 
-    context_stack.append(func_context)
-    exec_code(func.body, program_data, opts)
-    func_stack = context_stack.pop()
-
-    res_var_name = func_stack['!var_result'].name
-    bds = calc_bounds(res_var_name, func_stack, program_data, opts)
-
-    return bds
-
-
-def get_tokens(line: str):
-
-    # does not work when ops are not separated with spaces
-    #   (like x+y instead of x + y)
-    # TODO: implement custom tokenizer
-    return line.split()
-
-
-def exec_code(code: list[str], program_data: ProgramData, opts: 'Opts'):
+        cached = context.cached_bounds(v_name)
+        if cached is not None:
+            self.stats.bounds_cache_hits += 1
+            return cached.copy()
+        self.stats.bounds_cache_misses += 1
+
+        bds = self.eval_expr(expr, context)
+        if bds is not None:
+            context.cache_bounds(v_name, bds.copy())
+        return bds
+
+    def eval_expr(self, expr: Expr, context: VarContext) -> Bounds | None:
+        """Evaluates an expression tree to its bounds in the given context"""
+        match expr:
+            case Var(name=v_name):
+                return self.calc_bounds(v_name, context)
+            case Num(value=value):
+                return literal_bounds(value).copy()
+            case BinOp(op=op, lhs=lhs, rhs=rhs):
+                lhs_bds = self.eval_expr(lhs, context)
+                if lhs_bds is None:
+                    return None
+                # Shared (hash-consed) operands are only evaluated once
+                rhs_bds = lhs_bds if rhs is lhs else self.eval_expr(rhs, context)
+                if rhs_bds is None:
+                    return None
+                return self.widen(collapse_expr([lhs_bds, rhs_bds], [op]))
+            case Call(name=fn_name, args=args):
+                assert fn_name in self.functions, f'Function {fn_name} not defined'
+                func = self.functions[fn_name]
+                assert len(args) == len(func.args), 'Wrong number of arguments'
+                return self.evaluate_func(func, args, context)
+
+        assert False, f'Expression {expr} not implemented'
+
+    def widen(self, bds: Bounds | None) -> Bounds | None:
+        """Enforces the fragment budget, filling the smallest gaps of the bounds"""
+        max_fragments = self.opts.max_fragments
+        if bds is not None and max_fragments > 0 and bds.limit_fragments(max_fragments):
+            self.stats.widenings += 1
+        return bds
+
+    def print_vars(self, context: VarContext):
+        self.print(c.YELLOW('vars:'))
+        for v in context:
+            self.print(f'\t{context[v]}')
+            # print(vardict)
+
+    def print_fcns(self):
+        self.print(c.YELLOW('funcs:'))
+        for f in self.functions.values():
+
+            body = ['!builtin'] if f.is_builtin else [str(stmt) for stmt in f.body or ()]
+            assert body
+
+            if self.opts.verbose == 0:
+                self.print(f'\t{c.GREEN(f.name)}, args: {f.args}, body_count: {len(body)}')
+            else:
+                self.print(f'   {c.GREEN(f.name)} ({', '.join(f.args)})')
+                # print('  body:')
+                for line in body:
+                    self.print('\t' + line)
+
+    def print_stats(self):
+        self.print(c.YELLOW('stats:'))
+        for line in [*self.stats.report(), *self.fn_cache.report()]:
+            self.print(f'\t{line}')
+
+    def gt(
+        self, x: IntOrFloat | str, y: IntOrFloat | str, eq: bool, curr_context: VarContext
+    ) -> Bounds:
+        assert not (
+            isinstance(x, str) and isinstance(y, str)
+        ), f'Cannot compare vars rn {x} == {y}'
+
+        if isinstance(x, str):
+            assert not isinstance(y, str)
+
+            bds = self.calc_bounds(x, curr_context)
+            assert bds is not None, f'Variable {x} has no bounds'
+            return bds.copy().intersect_interval((IntervalPoint(y, eq), None))
+
+        assert isinstance(y, str) and not isinstance(x, str)
+
+        bds = self.calc_bounds(y, curr_context)
+        assert bds is not None, f'Variable {y} has no bounds'
+        return bds.copy().intersect_interval((None, IntervalPoint(x, eq)))
+
+    def eq(self, x: IntOrFloat | str, y: IntOrFloat | str, curr_context: VarContext) -> Bounds:
+        assert not (
+            isinstance(x, str) and isinstance(y, str)
+        ), f'Operator "==" not implemented for two vars ({x} == {y}) atm'
+
+        if isinstance(x, str):
+            name = x
+            assert not isinstance(y, str)
+            val = IntervalPoint(y, True)
+        else:
+            assert isinstance(y, str)
+            assert not isinstance(x, str)
+            name = y
+            val = IntervalPoint(x, True)
+
+        bds = self.calc_bounds(name, curr_context)
+        assert bds is not None, f'Variable {name} has no bounds'
+        return bds.copy().intersect_interval((val, val))
+
+    def get_cond(
+        self, vals: list[IntOrFloat | str], cond: str, curr_context: VarContext
+    ) -> Bounds:
+        assert len(vals) == 2, f'Need 2 values for condition, got {vals}'
+
+        if cond == '>':
+            return self.gt(vals[0], vals[1], False, curr_context)
+        if cond == '<':
+            return self.gt(vals[1], vals[0], False, curr_context)
+        if cond == '==':
+            return self.eq(vals[0], vals[1], curr_context)
+        if cond == '!=':
+            assert False, 'Operator "!=" not implemented'
+            # return neq(vals[0], vals[1])
+        if cond == '>=':
+            return self.gt(vals[0], vals[1], True, curr_context)
+            # assert False, 'Operator >=" not implemented'
+            # return gte(vals[0], vals[1])
+        if cond == '<=':
+            # assert False, 'Operator <=" not implemented'
+            return self.gt(vals[1], vals[0], True, curr_context)
+        assert False, f'Condition {cond} not implemented'
+
+    def eval_condition(self, condition: Condition, context: VarContext) -> Conditions:
+        """Evaluates a parsed condition to the bounds it imposes on its variable"""
+        varname = condition.varname
+        assert varname in context, f'Variable {varname} not defined'
+        return {varname: self.get_cond(list(condition.vals), condition.cond, context)}
+
+    def split_on(
+        self, condition: Condition, context: VarContext
+    ) -> tuple[Conditions, VarContext, VarContext]:
+        """
+        Splits the context on a condition. Returns the bounds it imposes,
+        the context where it holds and the one where it does not.
+        """
+        lhs, rhs = condition.vals
+        if self.opts.relational or (isinstance(lhs, str) and isinstance(rhs, str)):
+            return self.split_relational(condition, context)
+        cond = self.eval_condition(condition, context)
+        cond_bounds = {v_name: self.calc_bounds(v_name, context) for v_name in cond}
+        return cond, *split_context(context, cond, cond_bounds)
+
+    def split_relational(
+        self, condition: Condition, context: VarContext
+    ) -> tuple[Conditions, VarContext, VarContext]:
+        """
+        Splits the context on a condition through a difference-bound matrix
+        (see `relational`) over its variables and the ones they relate to:
+        aliases like `y = x + 1`, and with `--relational` the differences
+        recorded by the previous splits. The condition variables, and the
+        recorded ones, are narrowed to the bounds projected from the closed
+        matrix in each branch. With `--relational` the branches record the
+        differences they learnt.
+        """
+        lhs, rhs = condition.vals
+        taken_diffs, other_diffs = condition_differences(lhs, condition.cond, rhs)
+        names = [val for val in (lhs, rhs) if isinstance(val, str)]
+        for name in names:
+            assert name in context, f'Variable {name} not defined'
+
+        # Recorded differences, by variable
+        known = context.differences() if self.opts.relational else []
+        recorded: dict[str, list[Difference]] = {}
+        for diff in known:
+            recorded.setdefault(diff.lhs, []).append(diff)
+            recorded.setdefault(diff.rhs, []).append(diff)
+
+        # The variables related to the condition ones, and their differences
+        related = dict.fromkeys(names)
+        diffs: dict[Difference, None] = {}
+        pending = list(names)
+        while pending:
+            name = pending.pop()
+            for diff in recorded.get(name, []) + alias_differences(name, context[name].expr):
+                diffs[diff] = None
+                for other in (diff.lhs, diff.rhs):
+                    if other not in related and other != ZERO and other in context:
+                        related[other] = None
+                        pending.append(other)
+        diffs = {diff: None for diff in diffs if diff.lhs in related and diff.rhs in related}
+
+        cond_bounds = {name: self.calc_bounds(name, context) for name in related}
+        dbm = DBM(related)
+        for name, bds in cond_bounds.items():
+            assert bds is not None, f'Variable {name} has no bounds'
+            dbm.add_bounds(name, bds)
+        for diff in diffs:
+            dbm.add(diff)
+        taken, other = dbm.copy(), dbm
+        for diff in taken_diffs:
+            taken.add(diff)
+        for diff in other_diffs:
+            other.add(diff)
+        taken.close()
+        other.close()
+
+        narrowed = [*names, *(name for name in related if name in recorded and name not in names)]
+        cond = {name: taken.narrow(name, cond_bounds[name]) for name in narrowed}
+        complements = {name: other.narrow(name, cond_bounds[name]) for name in narrowed}
+        if len(names) == 1:
+            # Exact on its own (the complement of `==` is not convex)
+            single = self.eval_condition(condition, context)[names[0]]
+            cond[names[0]].intersect_bounds(single)
+            if len(single) > 0:
+                complements[names[0]].intersect_bounds(single.copy().invert())
+
+        inside, outside = split_context(context, cond, cond_bounds, complements)
+        self.stats.relational_splits += 1
+        if self.opts.relational:
+            kept = [diff for diff in known if diff in diffs]
+            for ctx, learnt in ((inside, taken_diffs), (outside, other_diffs)):
+                for diff in kept + learnt:
+                    if ZERO not in (diff.lhs, diff.rhs):
+                        ctx.relate(diff)
+        return cond, inside, outside
+
+    def print_var_msg(
+        self,
+        varname: str,
+        line: str,
+        line_num: int,
+        colno: int,
+        curr_context: VarContext,
+        interpreter_context: InterpreterContext,
+    ):
+
+        if varname not in curr_context:
+            raise VariableNotDefinedError(
+                varname,
+                line_num,
+                interpreter_context=interpreter_context,
+                colno=colno,
+            )
+        header = c.FAINT(f'{line_num:03}')
+        bounds = self.calc_bounds(varname, curr_context)
+        opts = self.opts
 
-    if len(context_stack) == 0:
-        context_stack.append({})
+        if opts.verbose > 0:
+            if opts.verbose > 1:
+                header = c.FAINT(f'{interpreter_context.program_data.filename}:{line_num:03}')
 
-    interpreter_context = InterpreterContext(program_data, curr_line=None)
+            endl = c.FAINT(f'[{line.strip().removesuffix('\n')}]')
+        else:
+            endl = ''
+        if UNICODE_OUT:
+            msg = f'{header} : {c.GREEN(varname)} ∈ {bounds}'
+        else:
+            msg = f'{header} : BOUNDS({c.GREEN(varname)}): {bounds}'
 
-    curr_context = context_stack[-1]
-    mods = None
-    fn_name = None
-    fn_body = []
-    for line_num, line in enumerate(code, start=1):
-        interpreter_context.set_linedata(line, line_num)
-        tokens = get_tokens(line)
-        # print('tokens:',tokens)
-        varname = None
-        bounds = None
-        size = None
-        rest_line = None
-        for ti, token in enumerate(tokens):
-            (token_type, *rest) = lexer.get_token_type(token)
+        if opts.verbose == 0:
+            msg = f'{msg}{endl}'
+        elif opts.verbose == 1:
+            msg = f'{msg:<70}{endl}'
+        elif opts.verbose >= 2:
+            msg = f'{msg:<100}{endl}'
 
-            if VERBOSE:
-                print('token:', (token, lexer.token_names[token_type], rest))
+        self.print(msg)
 
-            if token_type == lexer.TOKEN_COMMENT:
-                comm_text = ' '.join([*rest, *tokens[ti + 1 :]])
-                if VERBOSE:
-                    print('comment:', comm_text)
-                break
+    def evaluate_func(
+        self, func: FunctionData, args: tuple[Expr, ...], context: VarContext
+    ) -> Bounds | None:
 
-            if fn_name is not None:
-                # Parsing function, either save to function body or end it
-                if token_type == lexer.TOKEN_END:
-                    assert fn_name in functions
-                    assert not functions[fn_name].is_builtin
-                    functions[fn_name].set_body(fn_body)  # type: ignore
-                    fn_name = None
-                    fn_body = []
+        arg_bounds = []
+        for arg in args:
+            bds = self.eval_expr(arg, context)
+            if bds is None:
+                return None
+            arg_bounds.append(bds)
+
+        if func.is_builtin:
+            assert isinstance(func, BuiltinFunction)
+            interval = arg_bounds[0]
+
+            res_mixed = [i for i in (func.eval(i) for i in interval.get_bounds()) if i is not None]
+            return Bounds.union_many(res_mixed)
+
+        assert func.body, f'Function {func.name} has no body!'
+
+        fn_cache = self.fn_cache
+        cache_key = None
+        if fn_cache.maxsize > 0 and func.is_pure(self.functions):
+            cache_key = fn_cache.key(func, arg_bounds)
+            found, res = fn_cache.get(cache_key)
+            if found:
+                return res
+
+        # Arguments are bound by value: the body cannot see (or change) the
+        #   caller's variables, nor resolve their expressions in its own scope.
+        func_context = VarContext()
+        for f_arg, bds in zip(func.args, arg_bounds):
+            func_context[f_arg] = VarData(f_arg, bds)
+
+        call_stmt = self.stmt
+        self.context_stack.append(func_context)
+        self.exec_program(func.body)
+        func_stack = self.context_stack.pop()
+        self.stmt = call_stmt
+
+        assert '!var_result' in func_stack, f'Function {func.name} did not return'
+        res = self.calc_bounds('!var_result', func_stack)
+
+        if cache_key is not None:
+            fn_cache.put(cache_key, res)
+        return res
 
-                fn_body.append(' '.join(tokens))
-                break
+    def exec_while(self, stmt: While, entry: VarContext) -> VarContext:
+        """
+        Runs a loop, returning the context after it.
+
+        The bounds at the loop head hold in every iteration: they are the
+        fixpoint of `head = entry ∪ body(head where the condition holds)`,
+        found by iterating from the entry. The first `widen_delay`
+        iterations join the bounds, the following ones widen them (see
+        `Bounds.widen`, with the literals of the loop as thresholds) so the
+        iteration ends. Up to `narrow_passes` more iterations then narrow
+        the widened bounds. The loop exits where the condition fails.
+
+        Variables first declared in the body are local to each iteration,
+        and keep after the loop the bounds they have in any of them.
+
+        Queries in the body only print in a last pass over the final head,
+        when their bounds hold in every iteration.
+        """
+        opts = self.opts
+        thresholds = sorted(stmt.constants()) if opts.widen_thresholds else []
+        # Names set by the body, in order
+        names: dict[str, None] = {}
+        head = entry
+        iterations = 0
+        narrowings = 0
+        self.quiet += 1
+        try:
+            while True:
+                iterations += 1
+                body, exit_context = self.loop_step(stmt, head, names)
+                if body is None:
+                    break
+                widen = iterations > opts.widen_delay
+                next_head = self.loop_head(entry, head, body, thresholds if widen else None)
+                if next_head is None:
+                    break
+                head = next_head
+
+            while body is not None and narrowings < opts.narrow_passes:
+                narrowed = self.loop_head(entry, head, body, narrow=True)
+                if narrowed is None:
+                    break
+                narrowings += 1
+                head = narrowed
+                body, exit_context = self.loop_step(stmt, head, names)
+        finally:
+            self.quiet -= 1
+        if body is not None and has_output(stmt.body):
+            body, exit_context = self.loop_step(stmt, head, names)
+
+        self.stats.loops += 1
+        self.stats.loop_iterations += iterations
+        self.stats.loop_narrowings += narrowings
+        if opts.verbose > 0:
+            self.print(
+                c.FAINT(
+                    f'{stmt.line_num:03} : loop converged after {iterations} iterations'
+                    f' and {narrowings} narrowing passes'
+                )
+            )
 
-            if token_type == lexer.TOKEN_FN_DEF:
-                assert fn_name is None, 'Nested functions not supported atm'
-                rest = ''.join(tokens[ti + 1 :])
-                fn_name, rest = rest.split('(', 1)
-                args = rest.removesuffix(')').split(',')
-                functions[fn_name] = FunctionData(fn_name, args)
-                break
-            if token_type == lexer.TOKEN_FN_CALL:
-                rest_line = [token]
-                assert isinstance(varname, str)
-                break
-            if token_type == lexer.TOKEN_FN_RET:
-                # Assign return variable with magic name to get it
-                #   from context
-                curr_context['!var_result'] = curr_context[tokens[ti + 1]]
-                return
-
-            if token_type == lexer.TOKEN_VAR:
-                varname = rest[0]
-                mods = rest[1:]
-                if '?' in mods:
-                    print_var_msg(
-                        varname,
-                        line,
-                        line_num,
-                        curr_context,
-                        interpreter_context,
-                        program_data,
-                        opts,
-                    )
+        exit_bds = exit_context[stmt.condition.varname].bounds
+        assert exit_bds is None or len(exit_bds) > 0, f'Loop at line {stmt.line_num} never ends'
+        for name, var in (body or {}).items():
+            if name not in entry:
+                exit_context[name] = var
+        return exit_context.compact()
+
+    def loop_step(
+        self, stmt: While, head: VarContext, names: dict[str, None]
+    ) -> tuple[dict[str, VarData] | None, VarContext]:
+        """
+        Runs the body of a loop once from the head, adding the variables it
+        sets to `names`. Returns their bounds after the body (None if the
+        condition never holds) and the context where the loop exits.
+        """
+        _, inside, exit_context = self.split_on(stmt.condition, head)
+        if inside.unreachable:
+            head.pins -= 1
+            return None, exit_context
+
+        self.context_stack.append(inside)
+        self.exec_program(stmt.body)
+        body_context = self.context_stack.pop()
+        self.stmt = stmt
+
+        # The head is pinned by the split: compacting the body contexts stops there
+        names.update(body_context.changes_since(head))
+        head.pins -= 1
+        body = {
+            name: VarData(name, self.calc_bounds(name, body_context), body_context[name].size)
+            for name in names
+        }
+        return body, exit_context
+
+    def loop_head(
+        self,
+        entry: VarContext,
+        head: VarContext,
+        body: dict[str, VarData],
+        thresholds: list[IntOrFloat] | None = None,
+        narrow: bool = False,
+    ) -> VarContext | None:
+        """
+        Next loop head: the entry bounds joined with the ones after the
+        body, widened from the current head with the thresholds (if given)
+        or narrowing it. None if no bounds changed. Missing bounds are
+        unbounded: the variable could hold anything.
+        """
+        res = entry.child()
+        changed = False
+        for name, var in body.items():
+            if name not in entry:
+                continue
+            entry_bds = self.calc_bounds(name, entry)
+            if entry_bds is None or var.bounds is None:
+                joined = unbounded()
+            else:
+                joined = Bounds.union_many((entry_bds, var.bounds))
+            prev = self.calc_bounds(name, head) or unbounded()
+            if narrow:
+                joined.intersect_bounds(prev)
+            elif thresholds is not None:
+                joined = prev.widen(joined, thresholds)
+            else:
+                joined = self.widen(joined)
+            changed = changed or joined != prev
+            res[name] = VarData(name, joined, var.size)
+        return res if changed else None
+
+    def exec_for(self, stmt: For, entry: VarContext) -> VarContext:
+        """
+        Runs a counted loop, returning the context after it. The cost does
+        not depend on the number of iterations:
+            - loops of at most `unroll_limit` iterations run once for each
+              value of the loop variable, giving exact bounds;
+            - loops only updating accumulators affinely (see `accelerate`)
+              are computed in closed form;
+            - the others are solved like `while` loops (see `exec_while`).
+        After the loop, its variable holds its last value.
+        """
+        first, last = stmt.span()
+        trips = last - first + 1
+        if trips <= 0:
+            return entry
+
+        if trips <= self.opts.unroll_limit:
+            res = self.unroll_for(stmt, entry, first, last)
+            self.stats.loops_unrolled += 1
+            how = 'unrolled'
+        else:
+            res = self.accelerate_for(stmt, entry, first, last)
+            if res is None:
+                return self.solve_for(stmt, entry, first, last)
+            self.stats.loops_accelerated += 1
+            how = 'computed in closed form'
+        self.stats.loops += 1
+        if self.opts.verbose > 0:
+            self.print(c.FAINT(f'{stmt.line_num:03} : loop of {trips} iterations {how}'))
+        res[stmt.var] = VarData(stmt.var, literal_bounds(last).copy())
+        return res.compact()
+
+    def unroll_for(self, stmt: For, entry: VarContext, first: int, last: int) -> VarContext:
+        """Runs the body for each value: variables it declares keep the last one"""
+        state = entry
+        body_vars: dict[str, VarData] = {}
+        for value in range(first, last + 1):
+            inside = state.child()
+            inside[stmt.var] = VarData(stmt.var, literal_bounds(value).copy())
+            # Pinned, so compacting the body contexts stops there
+            state.pins += 1
+            self.context_stack.append(inside)
+            self.exec_program(stmt.body)
+            body_context = self.context_stack.pop()
+            self.stmt = stmt
+            changed = body_context.changes_since(state)
+            state.pins -= 1
+
+            next_state = state.child()
+            for name in changed:
+                if name == stmt.var:
+                    continue
+                var = VarData(name, self.calc_bounds(name, body_context), body_context[name].size)
+                if name in entry:
+                    next_state[name] = var
+                else:
+                    body_vars[name] = var
+            state = next_state.compact()
 
-            elif token_type == lexer.TOKEN_RANGE:
-                assert len(rest) == 4, f'Range {rest} malformed'
-                b_l = numOrNone(rest[0])
-                b_u = numOrNone(rest[1])
-                b_l_in = rest[2] == '.'
-                b_u_in = rest[3] == '.'
-
-                if b_l is not None:
-                    b_l = IntervalPoint(b_l, b_l_in)
-                if b_u is not None:
-                    b_u = IntervalPoint(b_u, b_u_in)
-                rest_line = Interval(b_l, b_u)
-            elif token_type == lexer.TOKEN_ASSIGN:
-                rest_line = tokens[ti + 1 :]
-                assert isinstance(varname, str)
-                if VERBOSE:
-                    print('assign:', rest_line)
-                match_n, rest = lexer.match_token(tokens[ti + 1], lexer.NUM_RE)
-                if match_n and len(rest_line) == 1:
-                    # print('NUM:', tokens[ti+1:])
-                    val = numOrNone(tokens[ti + 1])
-                    if val is not None:
-                        val = IntervalPoint(val)
-                    rest_line = Interval(val, val)
-                    # print(rest_line)
-                    # curr_context[varname].bounds = Bounds(((val, val),))
-                    # curr_context[varname].expr = None
-                break
+        res = state.child()
+        for name, var in body_vars.items():
+            res[name] = var
+        return res
 
-            elif token_type == lexer.TOKEN_QUEST:
-                mod = rest[0]
-                if mod is None:
-                    mod = 'a'
+    def accelerate_for(
+        self, stmt: For, entry: VarContext, first: int, last: int
+    ) -> VarContext | None:
+        """
+        Bounds after the loop in closed form, None if the body cannot be
+        accelerated. Variables the body declares get their bounds in any
+        iteration.
+        """
+        builtins = {name for name, func in self.functions.items() if func.is_builtin}
+        parts = affine_updates(stmt.body, builtins)
+        if parts is None:
+            return None
+        body_stmts, updates = parts
+        if not all(update.name in entry for update in updates):
+            return None
 
-                if mod in ('v', 'a'):
-                    print_vars(curr_context)
-                if mod in ('f', 'a'):
-                    print_fcns(opts)
+        # Any iteration: the loop variable takes any of its values
+        inside = entry.child()
+        inside[stmt.var] = VarData(stmt.var, Bounds.from_num_tuples(((first, last),)))
+        self.context_stack.append(inside)
+        self.exec_program(tuple(body_stmts))
+        inside = self.context_stack.pop()
+        self.stmt = stmt
+
+        trips = last - first + 1
+        res = entry.child()
+        for update in updates:
+            start = self.calc_bounds(update.name, entry)
+            if start is None:
+                return None
+            if update.scale == 1:
+                # Sum of `coef * i + rest` over the iterations: exact in `i`
+                coef, rest = 0, update.rest
+                if rest is not None:
+                    coef, rest = linear_form(rest, stmt.var) or (0, rest)
+                terms = [start, literal_bounds(coef * (trips * (first + last) // 2))]
+                if rest is not None:
+                    rest_bds = self.eval_expr(rest, inside)
+                    if rest_bds is None:
+                        return None
+                    terms.append(scale_bounds(rest_bds, trips))
+            else:
+                try:
+                    evens, odds = power_sums(update.scale, trips)
+                    terms = [scale_bounds(start, power(update.scale, trips))]
+                except OverflowError:
+                    return None
+                if update.rest is not None:
+                    rest_bds = self.eval_expr(update.rest, inside)
+                    if rest_bds is None:
+                        return None
+                    terms += [scale_bounds(rest_bds, evens), scale_bounds(rest_bds, odds)]
+            bds = self.widen(collapse_expr([t.copy() for t in terms], ['+'] * (len(terms) - 1)))
+            res[update.name] = VarData(update.name, bds, entry[update.name].size)
+
+        for body_stmt in body_stmts:
+            name = body_stmt.name
+            res[name] = VarData(name, self.calc_bounds(name, inside), inside[name].size)
+        return res
 
-                break
-            # elif token_type == TOKEN_COND:
-            # if VERBOSE:
-            #     print('COND: ', tokens[ti+1:])
-            # break
-            elif token_type == lexer.TOKEN_IF:
-                if VERBOSE:
-                    print('IF: ', tokens[ti + 1 :])
-
-                cond: Conditions = pase_condition(
-                    tokens[ti + 1 :], curr_context, program_data, opts
-                )
-                # print('cond:', cond)
-                # context_stack.append(curr_context.copy())
-                for v_name in cond:
-                    assert (
-                        v_name in curr_context
-                    ), f'Variable {
-                        v_name} not defined'
-                    curr_context[v_name].bounds = calc_bounds(
-                        v_name, curr_context, program_data, opts
-                    )
-                    curr_context[v_name].expr = None
-                ctx, compl = split_context(curr_context, cond)
-                other_context_stack.append(compl)
-                context_stack.append(ctx)
-                curr_context = ctx
-                split_cond_stack.append(cond)
-                break
-            elif token_type == lexer.TOKEN_ELSE:
-                if VERBOSE:
-                    print('ELSE: ', tokens[ti + 1 :])
-                # Select complementary context
-
-                curr_context = other_context_stack[-1]
-                # for v_name in cond:
-                #     assert v_name in curr_context, f'Variable {
-                #         v_name} not defined'
-                #     curr_context[v_name].bounds = calc_bounds(
-                #         v_name, curr_context)
-                #     curr_context[v_name].expr = None
-                # break
-            elif token_type == lexer.TOKEN_END:
-                if VERBOSE:
-                    print('END.')
-
-                # Merge contexts
-                curr_context = context_stack.pop()
-                comp_context = other_context_stack.pop()
-                split_cond = split_cond_stack.pop()
-
-                for v_name in curr_context:
-                    if curr_context[v_name].bounds is None:
-                        curr_context[v_name].bounds = calc_bounds(
-                            v_name, curr_context, program_data, opts
+    def solve_for(self, stmt: For, entry: VarContext, first: int, last: int) -> VarContext:
+        """Solves the loop as `while var <= last`, the body ending with `var! = var + 1`"""
+        condition = Condition(stmt.var, (stmt.var, last), '<=')
+        step = Assign(stmt.line_num, stmt.line, stmt.var, True, BinOp('+', Var(stmt.var), Num(1)))
+        loop = While(stmt.line_num, stmt.line, condition, (*stmt.body, step))
+
+        start = entry.child()
+        start[stmt.var] = VarData(stmt.var, literal_bounds(first).copy())
+        res = self.exec_while(loop, start)
+        res[stmt.var] = VarData(stmt.var, literal_bounds(last).copy())
+        return res.compact()
+
+    def exec_code(self, code: list[str], program_data: ProgramData):
+        program = parse_program(code)
+        if self.opts.optimize:
+            program = optimize(program)
+        self.exec_program(program, program_data)
+
+    def exec_stream(self, lines: Iterable[str], program_data: ProgramData):
+        """
+        Runs each statement as soon as its lines are read, so queries are
+        answered while the source is still being written. Only the live
+        contexts and the functions are kept, not the program.
+
+        The optimizer needs the whole program, so it is not run.
+        """
+        self.exec_program(iter_statements(lines), program_data)
+
+    def exec_program(
+        self, program: Iterable[Statement], program_data: ProgramData | None = None
+    ):
+        """
+        Runs a program in the current context. `program_data` is kept for
+        the following runs (function bodies run with the caller's).
+        """
+        if program_data is not None:
+            self.program_data = program_data
+        context_stack = self.context_stack
+        other_context_stack = self.other_context_stack
+
+        if len(context_stack) == 0:
+            context_stack.append(VarContext())
+
+        interpreter_context = InterpreterContext(self.program_data, curr_line=None)
+
+        curr_context = context_stack[-1]
+        for stmt in program:
+            self.stmt = stmt
+            interpreter_context.set_linedata(stmt.line, stmt.line_num)
+            if is_skipped(stmt, curr_context):
+                continue
+
+            match stmt:
+                case Assign(name=varname, overwrite=overwrite, expr=expr, size=size):
+                    check_assignable(varname, overwrite, False, curr_context)
+                    if overwrite and varname in expr.free_vars():
+                        # `x! = x + 1` reads the previous `x`: it cannot stay lazy
+                        curr_context[varname] = VarData.auto(
+                            varname, self.eval_expr(expr, curr_context), size
                         )
-                        curr_context[v_name].expr = None
-                for v_name in comp_context:
-                    if comp_context[v_name].bounds is None:
-                        comp_context[v_name].bounds = calc_bounds(
-                            v_name, comp_context, program_data, opts
+                    else:
+                        curr_context[varname] = VarData.auto(varname, expr, size)
+
+                case Declare(name=varname, overwrite=overwrite, range=range_spec, size=size):
+                    check_assignable(varname, overwrite, False, curr_context)
+                    interval = None if range_spec is None else range_spec.to_interval()
+                    curr_context[varname] = VarData.auto(varname, interval, size)
+
+                case Query(name=varname, col=col):
+                    if not self.quiet:
+                        self.print_var_msg(
+                            varname,
+                            stmt.line,
+                            stmt.line_num,
+                            col + 1,
+                            curr_context,
+                            interpreter_context,
                         )
-                        comp_context[v_name].expr = None
-                curr_context = merge_contexts(curr_context, comp_context, split_cond)
-                context_stack[-1] = curr_context
-                break
-            elif token_type == lexer.TOKEN_SIZE:
-                size = rest[0]
-            else:
-                assert (
-                    False
-                ), f'Token "{
-                    token}" ({lexer.token_names[token_type]}) not implemented'
 
-        if varname is None:
-            continue
+                case Finalize(name=varname, size=size):
+                    check_assignable(varname, False, True, curr_context)
+                    bounds = self.calc_bounds(varname, curr_context)
+                    # Same value as before: what depends on it stays cached
+                    curr_context.finalize(varname, VarData.auto(varname, bounds, size))
+
+                case Show(mod=mod):
+                    if self.quiet:
+                        continue
+                    if mod in ('v', 'a'):
+                        self.print_vars(curr_context)
+                    if mod in ('f', 'a'):
+                        self.print_fcns()
+
+                case If(condition=condition):
+                    if curr_context.unreachable:
+                        cond, ctx, compl = {}, curr_context.child(), curr_context.child()
+                        curr_context.pins += 1
+                    else:
+                        cond, ctx, compl = self.split_on(condition, curr_context)
+                    # The active branch is on top of context_stack, the other one
+                    #   on top of other_context_stack.
+                    other_context_stack.append(compl)
+                    context_stack.append(ctx)
+                    curr_context = ctx
+                    self.split_cond_stack.append(cond)
+
+                case Else():
+                    # Select complementary context, parking the finished branch
+                    curr_context, other_context_stack[-1] = other_context_stack[-1], curr_context
+                    context_stack[-1] = curr_context
+
+                case End():
+                    # Merge contexts
+                    comp_context = other_context_stack.pop()
+                    context_stack.pop()
+                    self.split_cond_stack.pop()
+                    parent = context_stack[-1]
+
+                    curr_context = merge_contexts(
+                        curr_context,
+                        comp_context,
+                        parent,
+                        self.calc_bounds,
+                        self.widen,
+                        self.opts.relational,
+                    )
+                    context_stack[-1] = curr_context
 
-        assert mods is not None, 'WTF??'
+                case While():
+                    curr_context = self.exec_while(stmt, curr_context)
+                    context_stack[-1] = curr_context
 
-        if '?' in mods:
-            continue
+                case For():
+                    curr_context = self.exec_for(stmt, curr_context)
+                    context_stack[-1] = curr_context
 
-        if '!' in mods:
-            assert (
-                varname in curr_context
-            ), f'Variable {
-                varname} not defined, cannot overwerite'
-        else:
-            if '.' in mods:
-                assert (
-                    varname in curr_context
-                ), f'Variable {varname} not defined, canno finalyze value'
-            else:
-                assert (
-                    varname not in curr_context
-                ), f'Variable {varname} already defined. Cannot redeclare'
+                case FnDef(name=fn_name, args=args, body=body):
+                    func = FunctionData(fn_name, list(args))
+                    func.set_body(body)
+                    self.functions[fn_name] = func
+                    # Expressions calling a redefined function, even through
+                    #   other functions, must be recomputed
+                    for caller in callers(self.functions, fn_name):
+                        curr_context.invalidate(fn_key(caller))
 
-        if '.' in mods:
-            bounds = calc_bounds(varname, curr_context, program_data, opts)
-            rest_line = bounds
+                case Return(name=varname):
+                    # Assign return variable with magic name to get it
+                    #   from context
+                    curr_context['!var_result'] = curr_context[varname]
+                    return
 
-        curr_context[varname] = VarData.auto(varname, rest_line, size)
+                case _:
+                    assert False, f'Statement {stmt!r} not implemented'
 
 
 def print_usage():
@@ -686,47 +993,172 @@ def print_usage():
     print('  [opts] can be: ')
     print()
     print('    -v | --verbose to enable verbose mode.')
+    print('    -O | --optimize to fold constants, propagate aliases and share subexpressions.')
+    print('    --batch        to analyze all the given files (or glob patterns) in one process.')
+    print('    -j | --jobs N  to use N workers in batch or server mode (default: one per CPU).')
+    print('    --serve        to answer JSON analysis requests, one per line, on stdin/stdout.')
+    print('    --socket PATH  to serve on the PATH unix socket instead.')
+    print('    --lsp          to run the language server on stdin/stdout.')
+    print('    --stats        to print execution counters at exit.')
+    print('    --trace        to print the statements, assignments, branches and calls run.')
+    print('    --profile      to print the time, bounds and memory of each line and function.')
+    print('    --profile-out FILE  to write that profile to FILE as JSON instead (one per batch).')
+    print('    --fn-cache N   to memoize up to N user function results (0 disables).')
+    print('    --max-fragments N  to widen bounds made of more than N intervals (0 disables).')
+    print('    --widen-delay N    to join N loop iterations before widening (default: 3).')
+    print('    --narrow N     to run up to N narrowing iterations after a loop converged.')
+    print('    --no-thresholds    to widen loop bounds to infinity, not to the loop literals.')
+    print('    --unroll N     to run counted loops of up to N iterations once per iteration.')
+    print('    --relational   to keep the differences between variables learnt by conditions.')
     print('    -h | --help    to print this help message.')
     print()
     print('  <arg> can be: ')
     print()
     print('    filename       to be executed.')
+    print('    -              to execute stdin, statement by statement as it is read.')
     print('    file_number    in the examples to be executed.')
     print()
 
 
 class Opts:
     verbose: int = 0
-
-    def parse_option(self, opt: str):
+    stats: bool = False
+    fn_cache_size: int = FN_CACHE_SIZE
+    max_fragments: int = MAX_FRAGMENTS
+    widen_delay: int = WIDEN_DELAY
+    narrow_passes: int = NARROW_PASSES
+    # Widen loop bounds to the literals of the loop first, then to infinity
+    widen_thresholds: bool = True
+    unroll_limit: int = UNROLL_LIMIT
+    relational: bool = False
+    optimize: bool = False
+    trace: bool = False
+    profile: bool = False
+    # JSON file for the profile (printed if None)
+    profile_out: str | None = None
+    batch: bool = False
+    serve: bool = False
+    lsp: bool = False
+    # Unix socket of the server (stdin/stdout if None)
+    socket: str | None = None
+    # Worker processes in batch mode, threads in server mode (0: one per CPU)
+    jobs: int = 0
+
+    def parse_option(self, opt: str, args: list[str]):
         if opt in ['-v', '--verbose']:
             self.verbose = 1
             return True
         if opt in ['-vv', '--vverbose']:
             self.verbose = 2
             return True
+        if opt in ['-O', '--optimize']:
+            self.optimize = True
+            return True
+        if opt == '--trace':
+            self.trace = True
+            return True
+        if opt == '--profile':
+            self.profile = True
+            return True
+        if opt == '--profile-out':
+            self.profile = True
+            self.profile_out = self.pop_value(opt, args)
+            return True
+        if opt == '--batch':
+            self.batch = True
+            return True
+        if opt == '--serve':
+            self.serve = True
+            return True
+        if opt == '--lsp':
+            self.lsp = True
+            return True
+        if opt == '--socket':
+            self.socket = self.pop_value(opt, args)
+            return True
+        if opt in ['-j', '--jobs']:
+            self.jobs = int(self.pop_value(opt, args))
+            return True
+        if opt == '--stats':
+            self.stats = True
+            return True
+        if opt == '--fn-cache':
+            self.fn_cache_size = int(self.pop_value(opt, args))
+            return True
+        if opt == '--max-fragments':
+            self.max_fragments = int(self.pop_value(opt, args))
+            return True
+        if opt == '--widen-delay':
+            self.widen_delay = int(self.pop_value(opt, args))
+            return True
+        if opt == '--narrow':
+            self.narrow_passes = int(self.pop_value(opt, args))
+            return True
+        if opt == '--no-thresholds':
+            self.widen_thresholds = False
+            return True
+        if opt == '--unroll':
+            self.unroll_limit = int(self.pop_value(opt, args))
+            return True
+        if opt == '--relational':
+            self.relational = True
+            return True
 
         return False
 
+    def pop_value(self, opt: str, args: list[str]) -> str:
+        if not args:
+            print(c.RED.get_text(f'ERR: missing value for option: {opt}'))
+            print_usage()
+            sys.exit(1)
+        return args.pop()
+
     def is_help(self, opt: str):
         return opt in ['-h', '--help']
 
     def parse_all_args(self, args, help_fcn: Callable[[], None]):
 
-        while args and args[-1].startswith('-'):
+        # A lone `-` is stdin, not an option
+        while args and args[-1].startswith('-') and args[-1] != '-':
             opt = args.pop()
 
             if self.is_help(opt):
                 help_fcn()
                 sys.exit(0)
 
-            if not self.parse_option(opt):
+            if not self.parse_option(opt, args):
                 # TODO: manage this with python errors
                 print(c.RED.get_text(f'ERR: unknown option: {opt}'))
                 help_fcn()
                 sys.exit(1)
 
 
+def make_interpreter(opts: Opts, out: TextIO | None = None) -> Interpreter:
+    """The plain Interpreter, unless hooks are needed: it runs with none"""
+    observers = []
+    if opts.trace:
+        import hooks  # pylint: disable=import-outside-toplevel
+
+        observers.append(hooks.Tracer(out))
+    if opts.profile:
+        import profiler  # pylint: disable=import-outside-toplevel
+
+        return profiler.ProfilingInterpreter(opts, out, observers)
+    if observers:
+        return hooks.ObservedInterpreter(opts, out, observers)
+    return Interpreter(opts, out)
+
+
+def report_profile(interpreter: Interpreter, opts: Opts):
+    if not opts.profile:
+        return
+    interpreter.stop()
+    if opts.profile_out is not None:
+        interpreter.write_json(opts.profile_out)
+    else:
+        interpreter.print_report()
+
+
 def main():
     import glob
     import re
@@ -742,12 +1174,41 @@ def main():
 
     opts.parse_all_args(args, print_usage)
 
+    if opts.serve:
+        import server  # pylint: disable=import-outside-toplevel
+
+        sys.exit(server.main(opts))
+
+    if opts.lsp:
+        import lsp  # pylint: disable=import-outside-toplevel
+
+        sys.exit(lsp.main(opts))
+
     if len(args) < 1:
         print(c.RED.get_text('Not enough parameters'))
         print_usage()
         sys.exit(1)
 
+    if opts.batch:
+        import batch  # pylint: disable=import-outside-toplevel
+
+        sys.exit(batch.main(list(reversed(args)), opts))
+
     filename_arg = args.pop()
+    if filename_arg == '-':
+        # Answer queries as the lines come in, even when piped
+        sys.stdout.reconfigure(line_buffering=True)
+        interpreter = make_interpreter(opts)
+        try:
+            interpreter.exec_stream(sys.stdin, ProgramData('<stdin>'))
+        except InterpreterError as e:
+            report_profile(interpreter, opts)
+            sys.exit(e.format())
+        if opts.stats:
+            interpreter.print_stats()
+        report_profile(interpreter, opts)
+        sys.exit(0)
+
     filename = filename_arg
     code = []
     try:
@@ -766,9 +1227,16 @@ def main():
     with open(filename, 'r', encoding='utf-8') as f:
         code = f.readlines()
 
-    program_data = ProgramData(filename)
-    populate_builtin_fcns(functions)
-    exec_code(code, program_data, opts)
+    interpreter = make_interpreter(opts)
+    try:
+        interpreter.exec_code(code, ProgramData(filename))
+    except InterpreterError as e:
+        report_profile(interpreter, opts)
+        sys.exit(e.format())
+
+    if opts.stats:
+        interpreter.print_stats()
+    report_profile(interpreter, opts)
 
     sys.exit(0)
 
@@ -0,0 +1,286 @@
+import math
+from dataclasses import dataclass
+from typing import Iterator
+
+from bounds import IntOrFloat, Interval, IntervalPoint
+
+
+@dataclass(frozen=True, slots=True)
+class RangeSpec:
+    """
+    Bounds written in the source, like `.0..10`.
+
+    Kept as plain values so parsed programs can be shared between runs:
+    a fresh Interval is built each time the statement is executed.
+    """
+
+    low: IntOrFloat | None
+    high: IntOrFloat | None
+    low_in: bool = True
+    high_in: bool = True
+
+    def to_interval(self) -> Interval:
+        return Interval(
+            None if self.low is None else IntervalPoint(self.low, self.low_in),
+            None if self.high is None else IntervalPoint(self.high, self.high_in),
+        )
+
+
+# Binding strength of binary operators, higher binds tighter
+PRECEDENCE = {'+': 1, '-': 1, '*': 2, '/': 2}
+
+
+@dataclass(frozen=True, slots=True)
+class Expr:
+    """Base class for expression tree nodes"""
+
+    def free_vars(self) -> frozenset[str]:
+        """Names of the variables the expression reads"""
+        return frozenset()
+
+    def fn_calls(self) -> frozenset[str]:
+        """Names of the functions the expression calls"""
+        return frozenset()
+
+    def constants(self) -> frozenset[IntOrFloat]:
+        """Values of the literals in the expression"""
+        return frozenset()
+
+
+@dataclass(frozen=True, slots=True)
+class Num(Expr):
+    """A numeric literal"""
+
+    value: IntOrFloat
+
+    def constants(self) -> frozenset[IntOrFloat]:
+        return frozenset((self.value,))
+
+    def __str__(self) -> str:
+        return str(self.value)
+
+
+@dataclass(frozen=True, slots=True)
+class Var(Expr):
+    """A reference to a variable"""
+
+    name: str
+
+    def free_vars(self) -> frozenset[str]:
+        return frozenset((self.name,))
+
+    def __str__(self) -> str:
+        return self.name
+
+
+@dataclass(frozen=True, slots=True)
+class BinOp(Expr):
+    """A binary operation, like `x + 2`"""
+
+    op: str
+    lhs: Expr
+    rhs: Expr
+
+    def free_vars(self) -> frozenset[str]:
+        return self.lhs.free_vars() | self.rhs.free_vars()
+
+    def fn_calls(self) -> frozenset[str]:
+        return self.lhs.fn_calls() | self.rhs.fn_calls()
+
+    def constants(self) -> frozenset[IntOrFloat]:
+        return self.lhs.constants() | self.rhs.constants()
+
+    def __str__(self) -> str:
+        prec = PRECEDENCE[self.op]
+        lhs, rhs = str(self.lhs), str(self.rhs)
+        if isinstance(self.lhs, BinOp) and PRECEDENCE[self.lhs.op] < prec:
+            lhs = f'({lhs})'
+        if isinstance(self.rhs, BinOp) and PRECEDENCE[self.rhs.op] <= prec:
+            rhs = f'({rhs})'
+        return f'{lhs} {self.op} {rhs}'
+
+
+@dataclass(frozen=True, slots=True)
+class Call(Expr):
+    """A function call, like `sqrt(x)`"""
+
+    name: str
+    args: tuple[Expr, ...]
+
+    def free_vars(self) -> frozenset[str]:
+        return frozenset().union(*(arg.free_vars() for arg in self.args))
+
+    def fn_calls(self) -> frozenset[str]:
+        return frozenset((self.name,)).union(*(arg.fn_calls() for arg in self.args))
+
+    def constants(self) -> frozenset[IntOrFloat]:
+        return frozenset().union(*(arg.constants() for arg in self.args))
+
+    def __str__(self) -> str:
+        return f'{self.name}({', '.join(map(str, self.args))})'
+
+
+@dataclass(frozen=True, slots=True)
+class Statement:
+    """
+    Base class for a parsed source line.
+
+    Holds the position and text of the line, used for messages.
+    """
+
+    line_num: int
+    line: str
+
+    def __str__(self) -> str:
+        return self.line.strip()
+
+
+@dataclass(frozen=True, slots=True)
+class Declare(Statement):
+    """`x L..U`, `x! L..U` or `x = N`: sets the variable to fixed bounds"""
+
+    name: str
+    overwrite: bool
+    range: RangeSpec | None
+    size: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class Assign(Statement):
+    """`x = expr` or `x! = expr`: binds the variable to an expression"""
+
+    name: str
+    overwrite: bool
+    expr: Expr
+    size: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class Finalize(Statement):
+    """`x.`: replaces the expression of a variable with its bounds"""
+
+    name: str
+    size: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class Query(Statement):
+    """`x?`: prints the bounds of a variable"""
+
+    name: str
+    col: int
+
+
+@dataclass(frozen=True, slots=True)
+class Show(Statement):
+    """`?v`, `?f` or `?`: prints variables and/or functions"""
+
+    mod: str
+
+
+@dataclass(frozen=True, slots=True)
+class Condition:
+    """A parsed condition, like `x > 5`"""
+
+    varname: str
+    vals: tuple[IntOrFloat | str, IntOrFloat | str]
+    cond: str
+
+
+@dataclass(frozen=True, slots=True)
+class If(Statement):
+    """`?? cond`: splits the context on the condition"""
+
+    condition: Condition
+
+
+@dataclass(frozen=True, slots=True)
+class Else(Statement):
+    """`>>`: switches to the complementary context"""
+
+
+@dataclass(frozen=True, slots=True)
+class End(Statement):
+    """`--`: merges the contexts of an if/else block"""
+
+
+@dataclass(frozen=True, slots=True)
+class FnDef(Statement):
+    """`fn name(args) ... --`: defines a function"""
+
+    name: str
+    args: tuple[str, ...]
+    body: 'Program'
+
+
+@dataclass(frozen=True, slots=True)
+class Return(Statement):
+    """`<< x`: returns a variable from a function"""
+
+    name: str
+
+
+@dataclass(frozen=True, slots=True)
+class While(Statement):
+    """`while cond ... --`: runs the body as long as the condition holds"""
+
+    condition: Condition
+    body: 'Program'
+
+    def constants(self) -> frozenset[IntOrFloat]:
+        """Literals of the condition and the body, the widening thresholds"""
+        return frozenset(
+            val for val in self.condition.vals if not isinstance(val, str)
+        ) | program_constants(self.body)
+
+
+@dataclass(frozen=True, slots=True)
+class For(Statement):
+    """`for i L..U ... --`: runs the body once for each integer in the range"""
+
+    var: str
+    range: RangeSpec
+    body: 'Program'
+
+    def span(self) -> tuple[int, int]:
+        """First and last value of the loop variable (first > last if none)"""
+        low, high = self.range.low, self.range.high
+        assert low is not None and high is not None, 'Loop ranges must be bounded'
+        first = math.ceil(low) if self.range.low_in else math.floor(low) + 1
+        last = math.floor(high) if self.range.high_in else math.ceil(high) - 1
+        return first, last
+
+
+type Program = tuple[Statement, ...]
+
+
+def walk(program: Program) -> Iterator[Statement]:
+    """The statements of a program, loop bodies included (function bodies excluded)"""
+    for stmt in program:
+        yield stmt
+        if isinstance(stmt, (While, For)):
+            yield from walk(stmt.body)
+
+
+def has_output(program: Program) -> bool:
+    """Whether running the program prints (`x?`, `?v`...), loop bodies included"""
+    return any(isinstance(stmt, (Query, Show)) for stmt in walk(program))
+
+
+def program_constants(program: Program) -> frozenset[IntOrFloat]:
+    """Values of the literals in a program (function bodies excluded)"""
+    res: set[IntOrFloat] = set()
+    for stmt in program:
+        match stmt:
+            case Assign(expr=expr):
+                res |= expr.constants()
+            case Declare(range=RangeSpec(low=low, high=high)):
+                res.update(val for val in (low, high) if val is not None)
+            case If(condition=condition):
+                res.update(val for val in condition.vals if not isinstance(val, str))
+            case While():
+                res |= stmt.constants()
+            case For(range=RangeSpec(low=low, high=high), body=body):
+                res.update(val for val in (low, high) if val is not None)
+                res |= program_constants(body)
+    return frozenset(res)
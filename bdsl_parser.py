@@ -0,0 +1,304 @@
+from functools import lru_cache
+from typing import Iterable, Iterator
+
+import lexer
+from bdsl_ir import (
+    PRECEDENCE,
+    Assign,
+    BinOp,
+    Call,
+    Condition,
+    Declare,
+    Else,
+    End,
+    Finalize,
+    FnDef,
+    For,
+    Expr,
+    If,
+    Num,
+    Program,
+    Query,
+    RangeSpec,
+    Return,
+    Show,
+    Statement,
+    Var,
+    While,
+)
+from bdsl_types import numOrNone
+from bounds import IntOrFloat
+
+
+def parse_condition(tokens: list[lexer.Token]) -> Condition:
+    """Parses the tokens following `??`"""
+    assert len(tokens) > 0, 'No tokens to parse'
+    assert len(tokens) % 3 == 0, f'Condition {[t.text for t in tokens]} malformed'
+
+    assert len(tokens) == 3, 'Only one condition with 3 tokens supported now.'
+
+    varname = None
+    vals: list[IntOrFloat | str] = []
+    cond = None
+    for token in tokens:
+        (t_type, *rest) = token
+        if t_type == lexer.TOKEN_VAR:
+            varname = rest[0]
+            vals.append(varname)
+        elif t_type == lexer.TOKEN_COND:
+            cond = rest[0]
+        elif t_type == lexer.TOKEN_NUM:
+            val_n = numOrNone(rest[0])
+            assert val_n is not None, f'Value {rest[0]} not a number'
+            vals.append(val_n)
+
+    assert varname is not None, 'Variable not defined'
+    assert cond is not None, 'Condition not defined'
+
+    assert len(vals) == 2, 'need 2 values for condition'
+
+    return Condition(varname, (vals[0], vals[1]), cond)
+
+
+def parse_range(rest: list) -> RangeSpec:
+    assert len(rest) == 4, f'Range {rest} malformed'
+    return RangeSpec(
+        numOrNone(rest[0]),
+        numOrNone(rest[1]),
+        rest[2] == '.',
+        rest[3] == '.',
+    )
+
+
+def parse_operand(token: lexer.Token) -> Expr:
+    (token_type, *rest) = token
+    if token_type == lexer.TOKEN_VAR:
+        assert rest[1] == '', f'Variable {token.text} cannot have modifiers in expression'
+        return Var(rest[0])
+    if token_type == lexer.TOKEN_NUM:
+        val = numOrNone(rest[0])
+        assert val is not None, f'Value {rest[0]} not a number'
+        return Num(val)
+    if token_type == lexer.TOKEN_FN_CALL:
+        fn_name, fn_args = rest
+        args = tuple(parse_expr(code_tokens(arg)) for arg in fn_args.split(',') if arg.strip())
+        return Call(fn_name, args)
+
+    assert False, f'Token "{token.text}" ({token.name}) not valid in expression'
+
+
+def parse_expr(tokens: list[lexer.Token]) -> Expr:
+    """
+    Parses an expression into a tree, honoring operator precedence
+    (`*` and `/` bind tighter than `+` and `-`, all left associative).
+    """
+    assert len(tokens) > 0, 'Empty expression'
+    pos = 0
+
+    def parse_binary(min_prec: int) -> Expr:
+        nonlocal pos
+        assert pos < len(tokens), 'Expression ends with an operator'
+        lhs = parse_operand(tokens[pos])
+        pos += 1
+        while pos < len(tokens):
+            op_token = tokens[pos]
+            assert op_token.type == lexer.TOKEN_OP, f'Expected operator, got "{op_token.text}"'
+            op = op_token.text
+            prec = PRECEDENCE[op]
+            if prec < min_prec:
+                break
+            pos += 1
+            lhs = BinOp(op, lhs, parse_binary(prec + 1))
+        return lhs
+
+    return parse_binary(0)
+
+
+def parse_var_line(tokens: list[lexer.Token], line: str, line_num: int) -> Statement:
+    """Parses a line starting with a variable: declaration, assignment, query..."""
+    varname, mod = tokens[0].groups
+    assert varname is not None
+
+    if mod == '?':
+        return Query(line_num, line, varname, tokens[0].col)
+
+    size = None
+    range_spec = None
+    expr = None
+    for ti, token in enumerate(tokens[1:], start=1):
+        (token_type, *rest) = token
+        if token_type == lexer.TOKEN_RANGE:
+            range_spec = parse_range(rest)
+        elif token_type == lexer.TOKEN_SIZE:
+            size = rest[0]
+        elif token_type == lexer.TOKEN_ASSIGN:
+            expr = parse_expr(tokens[ti + 1 :])
+            if isinstance(expr, Num):
+                range_spec = RangeSpec(expr.value, expr.value)
+                expr = None
+            break
+        elif token_type == lexer.TOKEN_FN_CALL:
+            expr = parse_operand(token)
+            break
+        else:
+            assert (
+                False
+            ), f'Token "{token.text}" ({token.name}) not implemented'
+
+    if mod == '.':
+        return Finalize(line_num, line, varname, size)
+
+    if expr is not None:
+        return Assign(line_num, line, varname, mod == '!', expr, size)
+
+    return Declare(line_num, line, varname, mod == '!', range_spec, size)
+
+
+def parse_line(tokens: list[lexer.Token], line: str, line_num: int) -> Statement:
+    """Parses the (comment-free, non empty) tokens of a single line"""
+    first = tokens[0]
+    (token_type, *rest) = first
+
+    if token_type == lexer.TOKEN_VAR:
+        return parse_var_line(tokens, line, line_num)
+    if token_type == lexer.TOKEN_QUEST:
+        return Show(line_num, line, rest[0] or 'a')
+    if token_type == lexer.TOKEN_IF:
+        return If(line_num, line, parse_condition(tokens[1:]))
+    if token_type == lexer.TOKEN_ELSE:
+        return Else(line_num, line)
+    if token_type == lexer.TOKEN_END:
+        return End(line_num, line)
+    if token_type == lexer.TOKEN_FN_RET:
+        assert (
+            len(tokens) == 2 and tokens[1].type == lexer.TOKEN_VAR
+        ), 'Return needs a variable'
+        return Return(line_num, line, tokens[1].groups[0])
+
+    assert False, f'Token "{first.text}" ({first.name}) not implemented'
+
+
+def code_tokens(line: str) -> list[lexer.Token]:
+    """Tokens of a line, without the trailing comment"""
+    tokens = lexer.tokenize(line)
+    if tokens and tokens[-1].type == lexer.TOKEN_COMMENT:
+        tokens.pop()
+    return tokens
+
+
+def parse_block(lines: Iterator[tuple[int, str]], what: str) -> Program:
+    """
+    Parses the statements of a body (function or loop), up to the `--`
+    closing it. `if` blocks stay flat in the body, loops are parsed into
+    their own body.
+    """
+    body: list[Statement] = []
+    depth = 0
+    for line_num, line in lines:
+        tokens = code_tokens(line)
+        if not tokens:
+            continue
+        first_type = tokens[0].type
+        assert first_type != lexer.TOKEN_FN_DEF, 'Nested functions not supported atm'
+        if first_type in (lexer.TOKEN_WHILE, lexer.TOKEN_FOR):
+            body.append(parse_loop(tokens, line, line_num, lines))
+            continue
+        if first_type == lexer.TOKEN_IF:
+            depth += 1
+        elif first_type == lexer.TOKEN_END:
+            if depth == 0:
+                return tuple(body)
+            depth -= 1
+        body.append(parse_line(tokens, line, line_num))
+
+    assert False, f'{what} is not closed'
+
+
+def parse_fn_def(
+    tokens: list[lexer.Token],
+    line: str,
+    line_num: int,
+    lines: Iterator[tuple[int, str]],
+) -> FnDef:
+    """
+    Parses a function header and its body, up to the closing `--`.
+
+    The body is compiled here, once: calls only bind arguments and run the
+    already parsed statements.
+    """
+    assert (
+        len(tokens) == 2 and tokens[1].type == lexer.TOKEN_FN_CALL
+    ), 'Malformed function definition'
+    fn_name, fn_args = tokens[1].groups
+    assert fn_name is not None and fn_args is not None
+    args = tuple(arg.strip() for arg in fn_args.split(','))
+
+    body = parse_block(lines, f'Function {fn_name}')
+    return FnDef(line_num, line, fn_name, args, body)
+
+
+def parse_loop(
+    tokens: list[lexer.Token],
+    line: str,
+    line_num: int,
+    lines: Iterator[tuple[int, str]],
+) -> While | For:
+    """Parses a loop header (`while` or `for`) and its body, up to the closing `--`"""
+    if tokens[0].type == lexer.TOKEN_WHILE:
+        condition = parse_condition(tokens[1:])
+    else:
+        assert (
+            len(tokens) == 3
+            and tokens[1].type == lexer.TOKEN_VAR
+            and tokens[1].groups[1] == ''
+            and tokens[2].type == lexer.TOKEN_RANGE
+        ), 'Malformed for loop, expected `for var L..U`'
+        range_spec = parse_range(list(tokens[2].groups))
+        assert (
+            range_spec.low is not None and range_spec.high is not None
+        ), 'Loop ranges must be bounded'
+
+    body = parse_block(lines, f'Loop at line {line_num}')
+    assert not any(isinstance(stmt, Return) for stmt in body), 'Cannot return from a loop'
+    if tokens[0].type == lexer.TOKEN_WHILE:
+        return While(line_num, line, condition, body)
+
+    var = tokens[1].groups[0]
+    assert var is not None
+    assert not any(
+        isinstance(stmt, (Assign, Declare, Finalize)) and stmt.name == var for stmt in body
+    ), f'Loop variable {var} cannot be set in the loop'
+    return For(line_num, line, var, range_spec, body)
+
+
+def iter_statements(lines: Iterable[str], start: int = 1) -> Iterator[Statement]:
+    """
+    Parses source lines, yielding one statement per line of code. `start`
+    is the number of the first line.
+    """
+    numbered = enumerate(lines, start=start)
+    for line_num, line in numbered:
+        tokens = code_tokens(line)
+        if not tokens:
+            continue
+        if tokens[0].type == lexer.TOKEN_FN_DEF:
+            yield parse_fn_def(tokens, line, line_num, numbered)
+        elif tokens[0].type in (lexer.TOKEN_WHILE, lexer.TOKEN_FOR):
+            yield parse_loop(tokens, line, line_num, numbered)
+        else:
+            yield parse_line(tokens, line, line_num)
+
+
+@lru_cache(maxsize=64)
+def _parse_cached(lines: tuple[str, ...]) -> Program:
+    return tuple(iter_statements(lines))
+
+
+def parse_program(lines: Iterable[str]) -> Program:
+    """
+    Parses a whole program.
+
+    Results are cached on the source text, so running the same code again
+    skips the front end entirely.
+    """
+    return _parse_cached(tuple(lines))
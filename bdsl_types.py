@@ -1,9 +1,11 @@
 from abc import abstractmethod
 from dataclasses import dataclass
 from math import sqrt
-from typing import Dict
+from typing import Callable, Dict
 
+from bdsl_ir import Assign, Program, has_output, walk
 from bounds import Bounds, IntOrFloat, Interval, IntervalPoint, f_apply, split_interval
+from relational import Difference
 from vardata import VarData
 
 
@@ -18,7 +20,245 @@ def numOrNone(s: str) -> IntOrFloat | None:
     return int(s)
 
 
-type VarContext = Dict[str, VarData]
+class VarContext:
+    """
+    Variables visible in a scope.
+
+    Contexts are persistent overlays: a child context only stores the
+    variables set in it (`local`) and reads everything else through its
+    parent. Splitting on a condition is O(1) and merging only visits the
+    variables changed in either branch. A context must not be written to
+    once it has children.
+
+    Each layer also memoizes the bounds computed for variables holding an
+    expression, falling back to the parent's memo. A reverse dependency
+    graph (name -> variables whose expression reads it) lets an assignment
+    drop (or mask, if inherited) only the cached bounds downstream of it.
+
+    Layers can also record differences between variables (see `relate`),
+    holding as long as neither variable is set again.
+
+    A context is `unreachable` when the conditions leading to it never
+    hold (a variable has empty bounds): its statements are not run.
+    """
+
+    __slots__ = (
+        'parent',
+        'local',
+        'bounds_cache',
+        'masked',
+        'dependents',
+        'pins',
+        'relations',
+        'unreachable',
+    )
+
+    # Merge layers are folded into their parent when it is at most this many
+    #   times bigger, keeping lookup chains logarithmic in the program size.
+    COMPACT_RATIO = 2
+
+    def __init__(
+        self, parent: 'VarContext | None' = None, local: dict[str, VarData] | None = None
+    ) -> None:
+        self.parent = parent
+        self.local: dict[str, VarData] = {}
+        self.bounds_cache: dict[str, Bounds] = {}
+        # Names whose cached bounds in the parents are stale here
+        self.masked: set[str] = set()
+        self.dependents: dict[str, set[str]] = {}
+        # Number of live branches (children) built on this context
+        self.pins = 0
+        # Difference -> the variables it was recorded on
+        self.relations: dict[Difference, tuple[VarData, VarData]] = {}
+        self.unreachable = parent is not None and parent.unreachable
+        for name, var in (local or {}).items():
+            self[name] = var
+
+    def child(self) -> 'VarContext':
+        return VarContext(self)
+
+    def __lookup(self, name: str) -> VarData | None:
+        ctx: VarContext | None = self
+        while ctx is not None:
+            var = ctx.local.get(name)
+            if var is not None:
+                return var
+            ctx = ctx.parent
+        return None
+
+    def __contains__(self, name: str) -> bool:
+        return self.__lookup(name) is not None
+
+    def __getitem__(self, name: str) -> VarData:
+        var = self.__lookup(name)
+        if var is None:
+            raise KeyError(name)
+        return var
+
+    def __setitem__(self, name: str, var: VarData) -> None:
+        self.invalidate(name)
+        self.local[name] = var
+        self.__track(name, var)
+
+    def __iter__(self):
+        """Names, in definition order"""
+        layers = []
+        ctx: VarContext | None = self
+        while ctx is not None:
+            layers.append(ctx)
+            ctx = ctx.parent
+        names: dict[str, None] = {}
+        for layer in reversed(layers):
+            names.update(dict.fromkeys(layer.local))
+        return iter(names)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def items(self):
+        return ((name, self[name]) for name in self)
+
+    def finalize(self, name: str, var: VarData):
+        """
+        Replaces a variable with one holding the same value (e.g. its
+        computed bounds): cached bounds downstream of it stay valid.
+        """
+        self.local[name] = var
+
+    def __track(self, name: str, var: VarData):
+        if var.expr is None:
+            return
+        for dep in var.expr.free_vars():
+            self.dependents.setdefault(dep, set()).add(name)
+        for fn_name in var.expr.fn_calls():
+            self.dependents.setdefault(fn_key(fn_name), set()).add(name)
+
+    def __dependents_of(self, name: str):
+        ctx: VarContext | None = self
+        while ctx is not None:
+            yield from ctx.dependents.get(name, ())
+            ctx = ctx.parent
+
+    def invalidate(self, name: str):
+        """Drops the cached bounds of everything depending on `name`"""
+        pending = [name]
+        seen = set()
+        while pending:
+            dep = pending.pop()
+            if dep in seen:
+                continue
+            seen.add(dep)
+            self.bounds_cache.pop(dep, None)
+            if self.parent is not None:
+                self.masked.add(dep)
+            pending.extend(self.__dependents_of(dep))
+
+    def cached_bounds(self, name: str) -> Bounds | None:
+        ctx: VarContext | None = self
+        while ctx is not None:
+            bds = ctx.bounds_cache.get(name)
+            if bds is not None:
+                return bds
+            if name in ctx.masked:
+                return None
+            ctx = ctx.parent
+        return None
+
+    def cache_bounds(self, name: str, bounds: Bounds):
+        """
+        Caches the bounds in the lowest layer where the variable has the
+        same value: the one setting it, or invalidating it. Parent layers
+        are never changed once they have children, so the entry stays valid
+        for every context built on that layer.
+        """
+        ctx = self
+        while ctx.parent is not None and name not in ctx.local and name not in ctx.masked:
+            ctx = ctx.parent
+        ctx.bounds_cache[name] = bounds
+
+    def relate(self, diff: Difference):
+        """Records a difference between two variables, holding until either is set"""
+        self.relations[diff] = (self[diff.lhs], self[diff.rhs])
+
+    def differences(self) -> list[Difference]:
+        """The recorded differences still holding here"""
+        res: dict[Difference, None] = {}
+        ctx: VarContext | None = self
+        while ctx is not None:
+            for diff, (lhs, rhs) in ctx.relations.items():
+                if self.__lookup(diff.lhs) is lhs and self.__lookup(diff.rhs) is rhs:
+                    res[diff] = None
+            ctx = ctx.parent
+        return list(res)
+
+    def changes_since(self, ancestor: 'VarContext') -> dict[str, None]:
+        """Names set in the layers above `ancestor`, in order"""
+        layers = []
+        ctx: VarContext | None = self
+        while ctx is not ancestor:
+            assert ctx is not None, 'Context is not a descendant of the given one'
+            layers.append(ctx)
+            ctx = ctx.parent
+        names: dict[str, None] = {}
+        for layer in reversed(layers):
+            names.update(dict.fromkeys(layer.local))
+        return names
+
+    def compact(self) -> 'VarContext':
+        """
+        Folds this layer into its parents while they are small compared to
+        it (and not the base of live branches). Returns the resulting layer.
+        """
+        res = self
+        parent = res.parent
+        while (
+            parent is not None
+            and parent.pins == 0
+            and len(parent.local) <= self.COMPACT_RATIO * len(res.local)
+        ):
+            folded = VarContext(parent.parent)
+            folded.local = parent.local | res.local
+            folded.bounds_cache = {
+                name: bds for name, bds in parent.bounds_cache.items() if name not in res.masked
+            } | res.bounds_cache
+            folded.masked = parent.masked | res.masked
+            folded.dependents = {name: deps.copy() for name, deps in parent.dependents.items()}
+            for name, deps in res.dependents.items():
+                folded.dependents.setdefault(name, set()).update(deps)
+            folded.relations = parent.relations | res.relations
+            folded.unreachable = res.unreachable
+            if folded.parent is None:
+                folded.masked.clear()
+            res, parent = folded, folded.parent
+        return res
+
+
+def fn_key(fn_name: str) -> str:
+    """Key of a function in VarContext.dependents"""
+    return f'{fn_name}()'
+
+
+@dataclass
+class RunStats:
+    """Counters collected while running a program"""
+
+    bounds_cache_hits: int = 0
+    bounds_cache_misses: int = 0
+    # Times bounds were widened to fit the fragment budget
+    widenings: int = 0
+    loops: int = 0
+    # Iterations run to find the loop head bounds, then to narrow them
+    loop_iterations: int = 0
+    loop_narrowings: int = 0
+    # Counted loops run once per iteration, or computed in closed form
+    loops_unrolled: int = 0
+    loops_accelerated: int = 0
+    # Conditions split through a difference-bound matrix
+    relational_splits: int = 0
+
+    def report(self) -> list[str]:
+        return [f'{name}: {value}' for name, value in vars(self).items()]
+
 # TODO: Use Bounds instead of Interval for conditions?.
 type Conditions = Dict[str, Bounds]
 
@@ -71,22 +311,52 @@ class FunctionData:
 
     name: str
     args: list[str]
-    body: list[str] | None = None
+    body: Program | None = None
+    # Functions called by the body
+    calls: frozenset[str] = frozenset()
+    # Whether the body prints (`x?`, `?v`...)
+    has_output: bool = False
     _builtin: bool = False
 
     def __init__(self, name: str, args: list[str]) -> None:
         self.name = name
         self.args = args
 
-    def set_body(self, body: list[str]):
+    def set_body(self, body: Program):
         """Sets the body of a function"""
         self.body = body
+        self.calls = frozenset().union(
+            *(stmt.expr.fn_calls() for stmt in walk(body) if isinstance(stmt, Assign))
+        )
+        self.has_output = has_output(body)
+
+    def is_pure(self, functions: dict[str, 'FunctionData']) -> bool:
+        """
+        Whether results only depend on the arguments' bounds, so they can be
+        memoized: the body prints nothing and only calls builtins.
+        """
+        if self.has_output:
+            return False
+        return all(name in functions and functions[name].is_builtin for name in self.calls)
 
     @property
     def is_builtin(self):
         return self._builtin
 
 
+def callers(functions: dict[str, FunctionData], name: str) -> set[str]:
+    """`name` and the functions calling it, directly or through other functions"""
+    res = {name}
+    pending = [name]
+    while pending:
+        callee = pending.pop()
+        for func in functions.values():
+            if callee in func.calls and func.name not in res:
+                res.add(func.name)
+                pending.append(func.name)
+    return res
+
+
 class BuiltinFunction(FunctionData):
     """Builtin functions. evaluates directly"""
 
@@ -110,8 +380,7 @@ class SqrtFunction(BuiltinFunction):
 
         def i_sqrt(x: IntervalPoint) -> IntervalPoint:
             assert x.value >= 0
-            x.value = sqrt(x.value)
-            return x
+            return IntervalPoint(sqrt(x.value), x.is_included)
 
         return f_apply(i_sqrt, sol, False)
 
@@ -120,63 +389,88 @@ builtinFunctions.append(SqrtFunction())
 
 
 def split_context(
-    context: VarContext, conds: Conditions
+    context: VarContext,
+    conds: Conditions,
+    cond_bounds: dict[str, Bounds],
+    complements: Conditions | None = None,
 ) -> tuple[VarContext, VarContext]:
+    """
+    Builds the contexts where the condition holds and where it does not.
+    `cond_bounds` holds the current bounds of each condition variable.
+    `complements` are the bounds where the condition does not hold, by
+    default the complement of each of `conds`.
+    """
 
-    filter_context: VarContext = {}
-    complement_context: VarContext = {}
+    filter_context = context.child()
+    complement_context = context.child()
+    context.pins += 1
 
     for c_var_name, c_interval in conds.items():
-        if c_var_name in context:
-            curr_var = context[c_var_name].copy()
-            curr_var_compl = context[c_var_name].copy()
-            # both 0..10
-            assert curr_var.bounds is not None, 'Variable bounds are None'
-
-            curr_var.bounds.intersect_bounds(c_interval)
-            # curr_var \in c_interval ( 5..10 )
-            assert curr_var_compl.bounds is not None, 'Variable bounds are None'
-
-            # print('c_interval:', c_interval)
-            # print('invert_interval(c_interval):', invert_interval(c_interval))
-            # print('curr_var_compl bounds', curr_var_compl.bounds)
-            curr_var_compl.bounds.intersect_bounds(c_interval.copy().invert())
-            # print('curr_var_compl bounds', curr_var_compl.bounds)
-
-            filter_context[c_var_name] = curr_var
-            complement_context[c_var_name] = curr_var_compl
-    for c_var_name in context:
-        if c_var_name not in filter_context:
-            filter_context[c_var_name] = context[c_var_name]
-            complement_context[c_var_name] = context[c_var_name]
+        curr_var = context[c_var_name]
+        bounds = cond_bounds[c_var_name]
+        assert bounds is not None, 'Variable bounds are None'
+
+        inside = bounds.copy().intersect_bounds(c_interval)
+        filter_context[c_var_name] = VarData(curr_var.name, inside, curr_var.size)
+        # A condition that never holds leaves the bounds to the complement
+        complement = bounds.copy()
+        if complements is not None:
+            complement.intersect_bounds(complements[c_var_name])
+        elif len(c_interval) > 0:
+            complement.intersect_bounds(c_interval.copy().invert())
+        complement_context[c_var_name] = VarData(curr_var.name, complement, curr_var.size)
+        filter_context.unreachable |= len(inside) == 0
+        complement_context.unreachable |= len(complement) == 0
 
     return filter_context, complement_context
 
 
 def merge_contexts(
-    curr_context: VarContext, comp_context: VarContext, split_cond: Conditions
+    curr_context: VarContext,
+    comp_context: VarContext,
+    parent: VarContext,
+    bounds_of: Callable[[str, VarContext], Bounds | None],
+    widen: Callable[[Bounds | None], Bounds | None] = lambda bds: bds,
+    relational: bool = False,
 ) -> VarContext:
-    res = curr_context.copy()
-
-    for c_var_name, _ in split_cond.items():
-        if c_var_name in curr_context:
-            curr_var = res[c_var_name]
-
-            # print('curr_context:', curr_context)
-            assert curr_var.bounds is not None, f'Variable {c_var_name} bounds are None'
-
-            comp_bounds = comp_context[c_var_name].bounds
-            assert (
-                comp_bounds is not None
-            ), f'Variable {c_var_name} bounds are None in compl. bounds'
-
-            # print('curr_var:', curr_var)
-            # print('curr_bounds:', curr_var.bounds)
-            # print('comp_bounds:', comp_bounds)
-
-            curr_var.bounds.union_bounds(comp_bounds)
-
-    return res
+    """
+    Joins the two branches of a split of `parent`.
+
+    Only variables set in either branch are visited: their bounds are
+    computed in each branch (`bounds_of`) and united. A variable set in one
+    branch only keeps the bounds it has there. Joined bounds go through
+    `widen`, to enforce the fragment budget. If `relational`, the recorded
+    differences holding in both branches are kept. An unreachable branch
+    leaves the other one as it is.
+    """
+    parent.pins -= 1
+    if curr_context.unreachable or comp_context.unreachable:
+        live = comp_context if curr_context.unreachable else curr_context
+        return live.compact()
+    changed = curr_context.changes_since(parent) | comp_context.changes_since(parent)
+
+    res = parent.child()
+    for name in changed:
+        branch_vars = [
+            (ctx, ctx[name]) for ctx in (curr_context, comp_context) if name in ctx
+        ]
+        if len(branch_vars) == 2 and branch_vars[0][1] is branch_vars[1][1]:
+            res[name] = branch_vars[0][1]
+            continue
+
+        joined = widen(
+            Bounds.union_many(
+                bds for bds in (bounds_of(name, ctx) for ctx, _ in branch_vars) if bds is not None
+            )
+        )
+        res[name] = VarData(name, joined, branch_vars[0][1].size)
+
+    if relational:
+        kept = set(comp_context.differences())
+        for diff in curr_context.differences():
+            if diff in kept:
+                res.relate(diff)
+    return res.compact()
 
 
 iota_counter = 0  # pylint: disable=invalid-name
@@ -0,0 +1,11 @@
+"""
+Scaling benchmarks.
+
+`micro` times the `Bounds` operations and the evaluation of expressions
+over increasingly fragmented bounds, `programs` times whole analyses of
+synthetic programs (see `generator`) of increasing size. Each benchmark is
+a series of timings over its sizes: `runner` fits how the time grows with
+the size, writes the results as JSON and compares them with a baseline.
+
+Run with `python -m benchmarks` (`--help` for the options).
+"""
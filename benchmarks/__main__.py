@@ -0,0 +1,70 @@
+"""
+Runs the benchmarks, writes the results and compares them with the baseline.
+
+    python -m benchmarks [--quick] [-k PATTERN] [-o results.json]
+                         [--baseline PATH] [--update-baseline]
+                         [--tolerance T] [--slope-tolerance S]
+
+Exits with 1 if any regression against the baseline is found.
+"""
+
+import argparse
+import os
+import sys
+
+from benchmarks import runner
+from benchmarks.micro import MICRO
+from benchmarks.programs import PROGRAMS
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks', description=__doc__.strip().split('\n')[0]
+    )
+    parser.add_argument('--quick', action='store_true', help='fewer runs, smaller sizes')
+    parser.add_argument('-k', dest='pattern', default='', help='only series containing PATTERN')
+    parser.add_argument('-o', '--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', default=BASELINE, help='baseline JSON to compare with')
+    parser.add_argument('--update-baseline', action='store_true', help='save results as baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5)
+    parser.add_argument('--slope-tolerance', type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    repeat, min_time = (3, 0.01) if args.quick else (5, 0.05)
+    suites = [('micro', MICRO), ('program', PROGRAMS)]
+    series = []
+    for prefix, benchmarks in suites:
+        for name, (setup, sizes) in benchmarks.items():
+            full_name = f'{prefix}/{name}'
+            if args.pattern not in full_name:
+                continue
+            if args.quick:
+                sizes = sizes[:3]
+            series.append(runner.run_series(full_name, setup, sizes, repeat, min_time))
+            runner.print_series(series[-1])
+
+    results = runner.results_dict(series)
+    if args.output:
+        runner.save(args.output, results)
+    if args.update_baseline:
+        runner.save(args.baseline, results)
+        print(f'Baseline saved to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}')
+        return 0
+    baseline = runner.load(args.baseline)
+    if baseline['meta'].get('numpy') != results['meta']['numpy']:
+        print('Warning: the baseline was recorded with a different NumPy availability')
+    regressions = runner.compare(baseline, results, args.tolerance, args.slope_tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    print(f'{len(regressions)} regressions against {args.baseline}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,50 @@
+"""Synthetic programs, scaling each feature of the language separately"""
+
+
+def generate_program(
+    variables: int = 10, chain_depth: int = 0, if_depth: int = 0, calls: int = 0
+) -> str:
+    """
+    Builds a valid program with:
+        - `variables` declared variables, `v0 .0..10.` and so on;
+        - an expression chain `e{k} = e{k-1} + v{k}` of `chain_depth` steps;
+        - `if_depth` nested `??` blocks, each branch setting a variable;
+        - `calls` calls to a user function.
+
+    The last value of each part is queried at the end.
+    """
+    assert variables > 0, 'Programs need at least one variable'
+    lines = ['fn step(a)', '    r = a * 2 + 1', '    << r', '--']
+    lines += [f'v{i} .{i % 7}..{i % 7 + 10}.' for i in range(variables)]
+    queries = [f'v{variables - 1}']
+
+    if chain_depth > 0:
+        lines.append('e0 = v0 + 1')
+        for k in range(1, chain_depth):
+            lines.append(f'e{k} = e{k - 1} + v{k % variables}')
+        queries.append(f'e{chain_depth - 1}')
+
+    if if_depth > 0:
+        lines += nested_ifs(if_depth, 0)
+        queries.append('t0')
+
+    for k in range(calls):
+        lines.append(f'f{k} = step(v{k % variables})')
+    if calls > 0:
+        queries.append(f'f{calls - 1}')
+
+    lines += [f'{name}?' for name in queries]
+    return '\n'.join(lines) + '\n'
+
+
+def nested_ifs(depth: int, level: int) -> list[str]:
+    """`??` blocks nested `depth` levels, splitting a fresh variable each"""
+    indent = '    ' * level
+    lines = [f'{indent}g{level} .0..10.', f'{indent}?? g{level} > 5']
+    if depth > 1:
+        lines += nested_ifs(depth - 1, level + 1)
+        lines.append(f'{indent}    t{level} = t{level + 1} + g{level}')
+    else:
+        lines.append(f'{indent}    t{level} = g{level} * 2')
+    lines += [f'{indent}>>', f'{indent}    t{level} = g{level} - 1', f'{indent}--']
+    return lines
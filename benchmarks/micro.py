@@ -0,0 +1,82 @@
+"""
+Microbenchmarks of the bounds operations, over a number of fragments.
+
+Each benchmark takes the size (fragments per operand) and returns the
+callable to time. Operations modifying their operand time a copy of it.
+"""
+
+from typing import Callable
+
+from bdsl import Interpreter, collapse_expr
+from bdsl_ir import BinOp, Num, Var
+from bdsl_types import VarContext
+from bounds import Bounds, IntervalPoint
+from relational import DBM, Difference
+from vardata import VarData
+
+type Benchmark = Callable[[int], Callable[[], object]]
+
+
+def fragmented(n: int, offset: float = 0) -> Bounds:
+    """Bounds of `n` closed unit intervals, one unit apart"""
+    return Bounds(
+        tuple(
+            (IntervalPoint(offset + 2 * k), IntervalPoint(offset + 2 * k + 1)) for k in range(n)
+        )
+    )
+
+
+def union_bounds(n: int):
+    lhs, rhs = fragmented(n), fragmented(n, 0.5)
+    return lambda: lhs.copy().union_bounds(rhs)
+
+
+def intersect_bounds(n: int):
+    lhs, rhs = fragmented(n), fragmented(n, 0.5)
+    return lambda: lhs.copy().intersect_bounds(rhs)
+
+
+def invert(n: int):
+    bounds = fragmented(n)
+    return lambda: bounds.copy().invert()
+
+
+def collapse(n: int):
+    lhs, rhs = fragmented(n), fragmented(n, 0.5)
+    return lambda: collapse_expr([lhs.copy(), rhs.copy()], ['*'])
+
+
+def calc_bounds(n: int):
+    """`z = x * 2 + x`, with `x` made of `n` fragments and no cached bounds"""
+    interpreter = Interpreter()
+    context = VarContext()
+    context['x'] = VarData('x', fragmented(n))
+    expr = BinOp('+', BinOp('*', Var('x'), Num(2)), Var('x'))
+    context['z'] = VarData.auto('z', expr, None)
+
+    def run():
+        context.invalidate('x')
+        return interpreter.calc_bounds('z', context)
+
+    return run
+
+
+def dbm_closure(n: int):
+    """Closure of a chain `v_0 < v_1 < ... < v_n`, `v_0` being bounded"""
+    dbm = DBM(f'v{k}' for k in range(n))
+    dbm.add_bounds('v0', fragmented(1))
+    for k in range(1, n):
+        dbm.add(Difference(f'v{k - 1}', f'v{k}', 0, True))
+    return lambda: dbm.copy().close()
+
+
+# Name -> (benchmark, sizes). Binary operations combine every pair of
+#   fragments, so they get smaller sizes.
+MICRO: dict[str, tuple[Benchmark, list[int]]] = {
+    'union_bounds': (union_bounds, [8, 32, 128, 512]),
+    'intersect_bounds': (intersect_bounds, [8, 32, 128, 512]),
+    'invert': (invert, [8, 32, 128, 512]),
+    'collapse_expr': (collapse, [4, 8, 16, 32]),
+    'calc_bounds': (calc_bounds, [4, 8, 16, 32]),
+    'dbm_closure': (dbm_closure, [8, 32, 128, 256]),
+}
@@ -0,0 +1,29 @@
+"""Benchmarks analyzing whole synthetic programs, scaling one feature each"""
+
+from typing import Callable
+
+from analysis import analyze
+from bdsl_parser import iter_statements
+from benchmarks.generator import generate_program
+
+
+def analysis(**features: int) -> Callable[[], object]:
+    # Parsed programs are cached: after the first run this times the execution
+    source = generate_program(**features)
+    return lambda: analyze(source)
+
+
+def parse(variables: int) -> Callable[[], object]:
+    lines = generate_program(variables=variables, chain_depth=variables).splitlines()
+    return lambda: tuple(iter_statements(lines))
+
+
+PROGRAMS: dict[str, tuple[Callable[[int], Callable[[], object]], list[int]]] = {
+    'variables': (lambda n: analysis(variables=n), [100, 200, 400, 800]),
+    # Lazy chains are evaluated recursively: past ~300 steps Python's
+    #   recursion limit is hit
+    'chain_depth': (lambda n: analysis(chain_depth=n), [25, 50, 100, 200]),
+    'if_depth': (lambda n: analysis(if_depth=n), [4, 8, 16, 32]),
+    'calls': (lambda n: analysis(calls=n), [50, 100, 200, 400]),
+    'parse': (parse, [100, 200, 400, 800]),
+}
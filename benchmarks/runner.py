@@ -0,0 +1,132 @@
+"""Timing, scaling fits, JSON results and baseline comparison"""
+
+import json
+import math
+import platform
+import sys
+import time
+import timeit
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from vectorized import HAS_NUMPY
+
+
+@dataclass
+class Series:
+    """Timings of one benchmark over its sizes"""
+
+    name: str
+    sizes: list[int]
+    # Best time of a single call, for each size
+    seconds: list[float]
+
+    @property
+    def slope(self) -> float:
+        """
+        Growth exponent: the time is about `size ** slope` (least squares fit
+        in log-log scale).
+        """
+        xs = [math.log(size) for size in self.sizes]
+        ys = [math.log(max(sec, 1e-12)) for sec in self.seconds]
+        if len(xs) < 2:
+            return 0.0
+        x_mean, y_mean = sum(xs) / len(xs), sum(ys) / len(ys)
+        var = sum((x - x_mean) ** 2 for x in xs)
+        return sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys)) / var
+
+    def to_dict(self) -> dict[str, Any]:
+        return {'sizes': self.sizes, 'seconds': self.seconds, 'slope': round(self.slope, 3)}
+
+
+def measure(func: Callable[[], object], repeat: int = 5, min_time: float = 0.05) -> float:
+    """Best time of one call, over `repeat` runs of at least `min_time` seconds"""
+    timer = timeit.Timer(func)
+    func()  # Warm up the caches
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time:
+            break
+        number *= 2
+    return min(timer.repeat(repeat, number)) / number
+
+
+def run_series(
+    name: str,
+    setup: Callable[[int], Callable[[], object]],
+    sizes: list[int],
+    repeat: int = 5,
+    min_time: float = 0.05,
+) -> Series:
+    return Series(name, sizes, [measure(setup(size), repeat, min_time) for size in sizes])
+
+
+def results_dict(series: list[Series]) -> dict[str, Any]:
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': HAS_NUMPY,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'series': {s.name: s.to_dict() for s in series},
+    }
+
+
+def load(path: str) -> dict[str, Any]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save(path: str, results: dict[str, Any]):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+        f.write('\n')
+
+
+def compare(
+    baseline: dict[str, Any],
+    results: dict[str, Any],
+    tolerance: float = 0.5,
+    slope_tolerance: float = 0.25,
+) -> list[str]:
+    """
+    Regressions of the results against the baseline: sizes slower by more
+    than `tolerance` (a fraction of the baseline time) and series whose
+    growth exponent rose by more than `slope_tolerance`.
+
+    Absolute times depend on the machine, while exponents mostly do not:
+    compare times against a baseline recorded on the same machine.
+    """
+    regressions = []
+    for name, series in results['series'].items():
+        base = baseline['series'].get(name)
+        if base is None:
+            continue
+        base_times = dict(zip(base['sizes'], base['seconds']))
+        for size, sec in zip(series['sizes'], series['seconds']):
+            base_sec = base_times.get(size)
+            if base_sec is not None and sec > base_sec * (1 + tolerance):
+                ratio = sec / base_sec
+                regressions.append(
+                    f'{name}[{size}]: {fmt_time(sec)} vs {fmt_time(base_sec)} ({ratio:.2f}x)'
+                )
+        if series['slope'] > base['slope'] + slope_tolerance:
+            regressions.append(
+                f'{name}: scales as size^{series["slope"]:.2f} vs size^{base["slope"]:.2f}'
+            )
+    return regressions
+
+
+def fmt_time(sec: float) -> str:
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if sec >= scale:
+            return f'{sec / scale:.3g}{unit}'
+    return f'{sec / 1e-9:.3g}ns'
+
+
+def print_series(series: Series, file=sys.stdout):
+    times = '  '.join(
+        f'{size}: {fmt_time(sec)}' for size, sec in zip(series.sizes, series.seconds)
+    )
+    print(f'{series.name:<28} size^{series.slope:<5.2f} {times}', file=file)
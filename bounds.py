@@ -1,5 +1,7 @@
+from array import array
+from math import inf
 from configuration import UNICODE_OUT
-from typing import Callable, Literal, Tuple, Self
+from typing import Callable, Iterable, Literal, Tuple, Self
 
 # TODO: move this into types
 type IntOrFloat = int | float
@@ -7,6 +9,8 @@ type IntOrFloat = int | float
 
 class IntervalPoint:
 
+    __slots__ = ('value', 'is_included')
+
     def __init__(self, value: IntOrFloat, is_included: bool = True) -> None:
         self.value = value
         self.is_included = is_included
@@ -80,6 +84,42 @@ def tup2interval(
     return Interval(v1, v2)
 
 
+# Endpoints of an interval, as (low, low included, low is int, high, ...).
+#   Unbounded ends are -inf/+inf.
+type Ends = tuple[float, bool, bool, float, bool, bool]
+
+
+def _interval_ends(
+    interval: Interval | tuple[IntervalPoint | None, IntervalPoint | None]
+) -> Ends:
+    lo, hi = interval
+    return (
+        -inf if lo is None else lo.value,
+        lo is not None and lo.is_included,
+        lo is not None and isinstance(lo.value, int),
+        inf if hi is None else hi.value,
+        hi is not None and hi.is_included,
+        hi is not None and isinstance(hi.value, int),
+    )
+
+
+def _pack_ends(ends: list) -> tuple[array, int, int]:
+    """Packs sorted, disjoint interval ends into the `Bounds` storage"""
+    vals = array('d')
+    incl = 0
+    ints = 0
+    for i, (lo, lo_in, lo_int, hi, hi_in, hi_int) in enumerate(ends):
+        vals.append(lo)
+        vals.append(hi)
+        if lo != -inf:
+            incl |= lo_in << (2 * i)
+            ints |= lo_int << (2 * i)
+        if hi != inf:
+            incl |= hi_in << (2 * i + 1)
+            ints |= hi_int << (2 * i + 1)
+    return vals, incl, ints
+
+
 def f_intersect(
     f: Callable[[IntervalPoint, IntervalPoint], IntervalPoint],
     x: IntervalPoint | None,
@@ -165,7 +205,20 @@ def nInInterval(n: IntervalPoint, interval: Interval) -> bool:
 
 
 class Bounds:
-    __list: list[IntervalPoint | None]
+    """
+    A union of disjoint, sorted intervals.
+
+    Stored compactly: the endpoints of all intervals are kept, in order, in
+    an `array('d')`, with `-inf`/`+inf` marking an unbounded end. Per
+    endpoint flags (included, integer valued) are bits of two ints.
+    """
+
+    __slots__ = ('__vals', '__incl', '__ints', '__view')
+
+    __vals: array
+    __incl: int
+    __ints: int
+    __view: Tuple[Interval, ...] | None
 
     def __init__(
         self,
@@ -179,21 +232,28 @@ class Bounds:
         # Redundant?
         assert all(len(interval) == 2 for interval in bounds), 'Invalid bounds'
 
-        _bounds = [b if isinstance(b, Interval) else Interval(*b) for b in bounds]
-        self.__set_list(_bounds)
+        self.__set_points([p for interval in bounds for p in interval])
 
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, Bounds):
             return NotImplemented
 
-        if len(self.__list) != len(other.__list):
-            return False
+        return self.__vals == other.__vals and self.__incl == other.__incl
 
-        for self_point, other_point in zip(self.__list, other.__list):
-            if self_point != other_point:
-                return False
+    def __len__(self) -> int:
+        """Number of intervals"""
+        return len(self.__vals) // 2
 
-        return True
+    def key(self) -> tuple[tuple[IntOrFloat, bool] | None, ...]:
+        """Canonical hashable form of the bounds, usable as a dict key"""
+        return tuple(
+            None if p is None else (p.value, p.is_included) for p in self.__points()
+        )
+
+    def is_unbounded(self) -> bool:
+        """Whether the bounds are the whole real line"""
+        vals = self.__vals
+        return len(vals) == 2 and vals[0] == -inf and vals[1] == inf
 
     @classmethod
     def from_list(cls, interval: list[Interval]):
@@ -223,39 +283,115 @@ class Bounds:
             interval = Interval(*interval)
         return cls((interval,))
 
+    @classmethod
+    def from_packed(cls, vals: array, incl: int, ints: int):
+        """
+        Builds bounds from their packed form (see `packed`). The endpoints
+        must already be sorted and disjoint.
+        """
+        assert len(vals) > 0 and len(vals) % 2 == 0, 'Invalid packed bounds'
+        res = cls.__new__(cls)
+        res.__vals = vals
+        res.__incl = incl
+        res.__ints = ints
+        res.__view = None
+        return res
+
+    def packed(self) -> tuple[array, int, int]:
+        """
+        The endpoint values (`-inf`/`+inf` when unbounded) and the bitmasks
+        of included and integer valued endpoints. The array must not be
+        mutated.
+        """
+        return self.__vals, self.__incl, self.__ints
+
     def copy(self):
-        return Bounds(self.get_bounds())
+        res = Bounds.__new__(Bounds)
+        res.__vals = array('d', self.__vals)
+        res.__incl = self.__incl
+        res.__ints = self.__ints
+        # Intervals in the view are never mutated, so they can be shared
+        res.__view = self.__view
+        return res
+
+    def __set_points(self, points: list[IntervalPoint | None]):
+        """Packs a flat list of endpoints, `None` meaning unbounded"""
+        assert len(points) % 2 == 0, f'Invalid bounds: {points}'
+        last = len(points) - 1
+        vals = array('d')
+        incl = 0
+        ints = 0
+        for i, p in enumerate(points):
+            if p is None:
+                assert i in (0, last), f'Unbounded point inside bounds: {points}'
+                vals.append(-inf if i == 0 else inf)
+                continue
+            vals.append(p.value)
+            if p.is_included:
+                incl |= 1 << i
+            if isinstance(p.value, int):
+                ints |= 1 << i
+        self.__vals = vals
+        self.__incl = incl
+        self.__ints = ints
+        self.__view = None
+        return self
 
-    def __set_list(self, bounds: tuple[Interval, ...] | list[Interval]):
-        self.__list = []
-        for interval in bounds:
-            self.__list.extend(interval)
+    def __point(self, i: int) -> IntervalPoint | None:
+        v = self.__vals[i]
+        if v == inf or v == -inf:
+            return None
+        return IntervalPoint(
+            int(v) if (self.__ints >> i) & 1 else v, bool((self.__incl >> i) & 1)
+        )
 
-        return self
+    def __points(self) -> list[IntervalPoint | None]:
+        """Unpacks the endpoints into new (freely mutable) points"""
+        return [self.__point(i) for i in range(len(self.__vals))]
 
     def get_bounds(self) -> Tuple[Interval, ...]:
-        """Returns a tuple of intervals"""
-        try:
-            return tuple(
-                Interval(self.__list[i], self.__list[i + 1])
-                for i in range(0, len(self.__list), 2)
+        """
+        Returns a tuple of intervals.
+
+        The tuple is built once and reused until the bounds change: callers
+        must not mutate the returned points.
+        """
+        if self.__view is None:
+            points = self.__points()
+            self.__view = tuple(
+                Interval(points[i], points[i + 1]) for i in range(0, len(points), 2)
             )
-        except IndexError:
-            assert False, f'Invalid bounds: {self.__list}'
+        return self.__view
 
     def invert(self):
-        """Inverts the bounds"""
-        assert len(self.__list) > 0, 'Empty bounds'
-        assert len(self.__list) % 2 == 0, 'Odd number of bounds'
-
-        if self.__list[0] is None:
-            self.__list.pop(0)
+        """Inverts the bounds (complement on the real line)"""
+        vals = self.__vals
+        assert len(vals) > 0, 'Empty bounds'
+
+        if vals[0] == -inf:
+            vals.pop(0)
+            self.__incl >>= 1
+            self.__ints >>= 1
         else:
-            self.__list.insert(0, None)
-        if self.__list[-1] is None:
-            self.__list.pop(-1)
+            vals.insert(0, -inf)
+            self.__incl <<= 1
+            self.__ints <<= 1
+        if vals[-1] == inf:
+            vals.pop()
+            self.__incl &= ~(1 << len(vals))
+            self.__ints &= ~(1 << len(vals))
         else:
-            self.__list.append(None)
+            vals.append(inf)
+
+        # Endpoints change side: excluded points are now included and
+        #   vice versa (unbounded ends have no flag)
+        bounded = (1 << len(vals)) - 1
+        if vals[0] == -inf:
+            bounded &= ~1
+        if vals[-1] == inf:
+            bounded &= ~(1 << (len(vals) - 1))
+        self.__incl = ~self.__incl & bounded
+        self.__view = None
         return self
 
     def union_interval(self, interval: Interval):
@@ -266,227 +402,136 @@ class Bounds:
         return self.union_bounds(Bounds.from_interval(interval))
 
     def union_bounds(self, bounds: 'Bounds'):
+        """Perform a union of the bounds with other bounds, in place"""
 
-        bds_1 = self.__list.copy()
-        bds_2 = bounds.__list.copy()
-        new_bds: list[IntervalPoint | None] = []
-
-        tracing_1, tracing_2 = (bds_1[0] is None, bds_2[0] is None)
-
-        # remove Initial Nones
-        if tracing_1 or tracing_2:
-            new_bds.append(None)
-            if tracing_1:
-                bds_1.pop(0)
-            if tracing_2:
-                bds_2.pop(0)
-
-        # tracing = f_1 or f_2
+        res = Bounds.union_many((self, bounds))
+        assert res is not None, 'Empty bounds'
+        self.__vals, self.__incl, self.__ints = res.packed()
+        self.__view = None
+        return self
 
-        i_1, i_2 = 0, 0
+    def __ends(self) -> list[Ends]:
+        vals, incl, ints = self.__vals, self.__incl, self.__ints
+        return [
+            (
+                vals[i],
+                bool((incl >> i) & 1),
+                bool((ints >> i) & 1),
+                vals[i + 1],
+                bool((incl >> (i + 1)) & 1),
+                bool((ints >> (i + 1)) & 1),
+            )
+            for i in range(0, len(vals), 2)
+        ]
 
-        # done_1, done_2 = False, False
-
-        while i_1 < len(bds_1) and i_2 < len(bds_2):
-
-            b_1 = bds_1[i_1]
-            b_2 = bds_2[i_2]
-            # print(f'new_bds {i_1}-{i_2}:', new_bds)
-            # print(f'-- {i_1} {i_2}')
-            # print(
-            #     'bds_1: ',
-            #     '--' if tracing_1 else ' ',
-            #     b_1,
-            #     ')' if not b_1.is_included else ']',
-            # )
-            # print(
-            #     'bds_2: ',
-            #     '--' if tracing_2 else ' ',
-            #     b_2,
-            #     ')' if not b_2.is_included else ']',
-            # )
-
-            if b_1 is None or b_2 is None:
-                new_bds.append(None)
-                break
-            assert b_1 is not None and b_2 is not None, 'Unreachable'
-
-            # print('test: ', b_1, b_1.is_included, b_2, b_2.is_included, '->', b_1 <= b_2)
-            if b_1 <= b_2:
-                i_1 += 1
+    @classmethod
+    def union_many(cls, items: Iterable['Bounds | Interval']) -> 'Bounds | None':
+        """
+        Union of any number of bounds and intervals.
 
-                if not tracing_2:
-                    # Add point if not between two intervals
-                    b_1.is_included = (
-                        b_1.is_included or b_1.is_included != b_2.is_included
-                    )
-                    new_bds.append(b_1)
-                tracing_1 = not tracing_1
+        The result is in canonical form: sorted, disjoint intervals, with
+        overlapping or touching ones merged and empty ones dropped. Among
+        equal ends, integer ones are kept (`13` over `13.0`). Returns None if
+        the union is empty. Runs in O(k log k) for k intervals.
+        """
+        ends: list[Ends] = []
+        for item in items:
+            if isinstance(item, Bounds):
+                ends.extend(item.__ends())
             else:
-                i_2 += 1
-                if not tracing_1:
-                    # Add point if not between two intervals
-                    b_2.is_included = (
-                        b_2.is_included or b_1.is_included != b_2.is_included
-                    )
-
-                    new_bds.append(b_2)
-                tracing_2 = not tracing_2
-
-            # print('new_bds:', new_bds)
-
-            # print(
-            #     'new_bds:',
-            #     [f'{b} {')' if not b.is_included else ']'}' for b in new_bds],
-            # )
-        if len(new_bds) == 1 or new_bds[-1] is not None:
-            if i_1 < len(bds_1):
-                new_bds.extend(bds_1[i_1:])
-            elif i_2 < len(bds_2):
-                new_bds.extend(bds_2[i_2:])
-
-        # print(
-        #     'new_bds pre_sanit:',
-        #     [f'{b} {')' if not b.is_included else ']'}' for b in new_bds],
-        # )
-        # Sanitize - remove overlapping bounds
-        i = len(new_bds) - 2
-        while i > 0:
-
-            b1, b2 = new_bds[i], new_bds[i + 1]
-
-            # if isinstance(b1, IntervalPoint):
-            #     b1d = ')' if not b1.is_included else ']'
-            # else:
-            #     b1d = ';'
-            # if isinstance(b2, IntervalPoint):
-            #     b2d = ')' if not b2.is_included else ']'
-            # else:
-            #     b2d = ';'
-
-            # print(
-            #     'test_eq: ',
-            #     b1,
-            #     b1d,
-            #     # ')' if not b1.is_included else ']',
-            #     b2,
-            #     b2d,
-            #     # ')' if not b2.is_included else ']',
-            #     b1 == b2,
-            # )
-
-            def pop(i, b_prev: IntervalPoint | None = None):
-                if (
-                    b_prev
-                    # i > 1
-                    # and b1 is not None
-                    # and new_bds[i - 1] is not None
-                    and isinstance(b1, IntervalPoint)
-                    and b_prev.value == b1.value
-                    and (b1.is_included != b_prev.is_included)
-                ):
-                    new_bds[i - 1].is_included = True
-                new_bds.pop(i + 1)
-                new_bds.pop(i)
-
-            if b1 == b2:
-                if b1 is None and b2 is None:
-                    pop(i)
-                    i -= 1
-                else:
-                    assert b1 is not None and b2 is not None
-                    assert isinstance(b1, IntervalPoint)
-                    if b1.is_included and b2.is_included:
-                        if i > 1:
-                            b_prev = new_bds[i - 1]
-                            assert isinstance(b_prev, IntervalPoint)
-                            if (
-                                b_prev is not None
-                                and b_prev.value == b1.value
-                                and (b1.is_included == b_prev.is_included)
-                            ):
-                                pop(i, b_prev)
-                                i -= 1
-                        elif i < len(new_bds) - 2:
-                            # print('i:', i, len(new_bds))
-                            pop(i)
-                            i -= 1
-
-            # print(
-            #     'new_bds after_check:',
-            #     [f'{b}{')' if not b.is_included else ']'}' for b in new_bds],
-            # )
-            i -= 1
-
-        # print('new_bds fin:', new_bds)
-        self.__list = new_bds
-        return self
-
-    def intersect_bounds(self, bounds: 'Bounds'):
-
-        bds_1 = self.__list.copy()
-        bds_2 = bounds.__list.copy()
-        new_bds: list[IntervalPoint | None] = []
+                ends.append(_interval_ends(item))
+
+        ends.sort(key=lambda e: (e[0], not e[1], not e[2]))
+        merged: list[list] = []
+        for lo, lo_in, lo_int, hi, hi_in, hi_int in ends:
+            if lo > hi or (lo == hi and not (lo_in and hi_in)):
+                continue
+            if merged:
+                last = merged[-1]
+                if lo < last[3] or (lo == last[3] and (lo_in or last[4])):
+                    if hi > last[3] or (hi == last[3] and (hi_in, hi_int) > tuple(last[4:])):
+                        last[3:] = hi, hi_in, hi_int
+                    continue
+            merged.append([lo, lo_in, lo_int, hi, hi_in, hi_int])
+
+        if not merged:
+            return None
+        return cls.from_packed(*_pack_ends(merged))
+
+    def normalize(self):
+        """Brings the bounds to canonical form (see `union_many`), in place"""
+        return self.union_bounds(self)
+
+    def limit_fragments(self, max_fragments: int) -> bool:
+        """
+        Widens the bounds to at most `max_fragments` intervals, in place,
+        by filling the smallest gaps (each pair of intervals around one is
+        replaced by their hull). Returns whether the bounds changed.
+        """
+        assert max_fragments > 0, 'Bounds need at least one interval'
+        n = len(self)
+        if n <= max_fragments:
+            return False
 
-        tracing_1, tracing_2 = (bds_1[0] is None, bds_2[0] is None)
+        vals, incl, ints = self.__vals, self.__incl, self.__ints
+        # Gap i lies between the upper end of interval i and the lower one of i + 1
+        gaps = sorted(range(n - 1), key=lambda i: vals[2 * i + 2] - vals[2 * i + 1])
+        dropped = set()
+        for i in gaps[: n - max_fragments]:
+            dropped.update((2 * i + 1, 2 * i + 2))
+
+        kept = [j for j in range(len(vals)) if j not in dropped]
+        self.__vals = array('d', (vals[j] for j in kept))
+        self.__incl = sum(((incl >> j) & 1) << k for k, j in enumerate(kept))
+        self.__ints = sum(((ints >> j) & 1) << k for k, j in enumerate(kept))
+        self.__view = None
+        return True
 
-        # remove Initial Nones
-        if tracing_1 and tracing_2:
-            new_bds.append(None)
-        if tracing_1:
-            bds_1.pop(0)
-        if tracing_2:
-            bds_2.pop(0)
+    def widen(self, bounds: 'Bounds', thresholds: Iterable[IntOrFloat] = ()) -> 'Bounds':
+        """
+        Widening of the bounds by newer ones, for fixpoint iterations:
+        returns (new) bounds containing both. If `bounds` are already
+        contained these bounds are returned, else their hull, with each end
+        `bounds` go past moved out to the nearest threshold (or unbounded).
+        Ends can only take threshold values, so repeated widening reaches a
+        fixed point in a finite number of steps.
+        """
+        union = Bounds.union_many((self, bounds))
+        if union is None or union == self:
+            return self.copy()
+        if len(self) == 0:
+            return union
+
+        lo, hi = union.get_bounds()[0][0], union.get_bounds()[-1][1]
+        if lo is not None and lo != self.get_bounds()[0][0]:
+            t_lo = max((t for t in thresholds if t <= lo.value), default=None)
+            lo = None if t_lo is None else IntervalPoint(t_lo, True)
+        if hi is not None and hi != self.get_bounds()[-1][1]:
+            t_hi = min((t for t in thresholds if t >= hi.value), default=None)
+            hi = None if t_hi is None else IntervalPoint(t_hi, True)
+        return Bounds.from_interval(Interval(lo, hi))
 
-        # tracing = f_1 or f_2
+    def intersect_bounds(self, bounds: 'Bounds'):
+        """Perform an intersection of the bounds with other bounds, in place"""
 
+        ends_1, ends_2 = self.__ends(), bounds.__ends()
+        res: list[Ends] = []
         i_1, i_2 = 0, 0
-
-        # done_1, done_2 = False, False
-        b_1, b_2 = None, None
-        while i_1 < len(bds_1) and i_2 < len(bds_2):
-
-            b_1 = bds_1[i_1]
-            b_2 = bds_2[i_2]
-            # print(f'new_bds {i_1}-{i_2}:', new_bds)
-            # print(f'-- {i_1} {i_2}')
-            # print('bds_1: ', '-' if tracing_1 else ' ', b_1)
-            # print('bds_2: ', '-' if tracing_2 else ' ', b_2)
-
-            if b_1 is None and b_2 is None:
-                new_bds.append(None)
-                break
-            # assert b_1 is not None and b_2 is not None, 'Unreachable'
-            if b_1 is None or b_2 is None:
-                break
-            if b_1 <= b_2:
-                # print('b_1 < b_2')
+        while i_1 < len(ends_1) and i_2 < len(ends_2):
+            e_1, e_2 = ends_1[i_1], ends_2[i_2]
+            # The higher lower end and the lower upper end (at equal values
+            #   the excluded one is the stricter)
+            lo = max(e_1, e_2, key=lambda e: (e[0], not e[1]))
+            hi = min(e_1, e_2, key=lambda e: (e[3], e[4]))
+            if lo[0] < hi[3] or (lo[0] == hi[3] and lo[1] and hi[4]):
+                res.append((*lo[:3], *hi[3:]))
+            if hi is e_1:
                 i_1 += 1
-
-                if tracing_2:
-                    # Add point if not between two intervals
-                    new_bds.append(b_1)
-
-                tracing_1 = not tracing_1
             else:
-                # print('b_2 >= b_2')
                 i_2 += 1
-                if tracing_1:
-                    # Add point if not between two intervals
-                    new_bds.append(b_2)
-                tracing_2 = not tracing_2
-
-            # print('new_bds:', new_bds)
-
-        if i_1 < len(bds_1) or i_2 < len(bds_2):
-            if b_1 is None or b_2 is None:
-                if i_1 < len(bds_1) and b_2 is None:
-                    new_bds.extend(bds_1[i_1:])
-                elif i_2 < len(bds_2) and b_1 is None:
-                    new_bds.extend(bds_2[i_2:])
-
-        # print('new_bds:', new_bds)
-        self.__list = new_bds
+
+        self.__vals, self.__incl, self.__ints = _pack_ends(res)
+        self.__view = None
         return self
 
     def intersect_interval(
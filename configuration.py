@@ -1,9 +1,31 @@
-VERBOSE = False
-# VERBOSE = True
-
-
 # UNICODE_OUT = False
 UNICODE_OUT = True
 
 # Emits a warning if a variable with None bounds and expression is encountered.
 WARN_IF_NONE = False
+
+# Default max number of user function results memoized (0 disables).
+FN_CACHE_SIZE = 256
+
+# Binary operations between operands with at least this many pairs of
+#   intervals are computed with NumPy, when it is installed.
+VECTORIZE_MIN_PAIRS = 16
+
+# Difference-bound matrices over at least this many variables are closed
+#   with NumPy, when it is installed.
+DBM_NUMPY_MIN_VARS = 32
+
+# Default max number of intervals a variable's bounds can be made of: past
+#   it, the smallest gaps are filled (0 disables).
+MAX_FRAGMENTS = 64
+
+# Iterations of a loop joined as they are before widening the bounds at its
+#   head, so that they stop growing.
+WIDEN_DELAY = 3
+
+# Iterations run after a loop converged, to narrow the widened bounds.
+NARROW_PASSES = 2
+
+# Counted loops of at most this many iterations are run once per iteration,
+#   the longer ones are computed in closed form or solved like while loops.
+UNROLL_LIMIT = 16
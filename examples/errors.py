@@ -1,4 +1,3 @@
-import sys
 from colors import c
 from bdsl_types import InterpreterContext
 
@@ -24,23 +23,32 @@ class InterpreterError(Exception):
             program_data: The ProgramData where the error occurred(optional).
             cols: The colums number where the error occurred(optional).
         '''
+        self.message = message
         self.lineno = lineno
         self.cols = cols
-        self.filename = interpreter_context
+        self.filename = None
+        if interpreter_context is not None:
+            self.filename = interpreter_context.program_data.filename
+
+        super().__init__(self.format(color=False))
+
+    def get_message(self, color: bool = True) -> str:
+        '''The error message, without the location'''
+        return self.message
 
-        numcol = c.MAGENTA.get_text
+    def format(self, color: bool = True) -> str:
+        '''The error message with its location, ANSI colored if `color`'''
+        numcol = c.MAGENTA.get_text if color else str
 
         # Format the error message with location information
         location = ''
-        if interpreter_context is not None:
-            location += f'at {numcol(interpreter_context.program_data.filename)}, '
-        location += f'line {numcol(lineno)}'
-        if cols is not None:
-            location += f', column {numcol(cols[0])}'
-
-        full_message = f'{message} ({location})'
+        if self.filename is not None:
+            location += f'at {numcol(self.filename)}, '
+        location += f'line {numcol(self.lineno)}'
+        if self.cols is not None:
+            location += f', column {numcol(self.cols[0])}'
 
-        sys.exit(full_message)
+        return f'{self.get_message(color)} ({location})'
 
 
 class VarMessageException(InterpreterError):
@@ -58,7 +66,8 @@ class VarMessageException(InterpreterError):
         interpreter_context: InterpreterContext | None = None,
         colno: int | None = None,
     ) -> None:
-        message = self.get_message_format().format(varname=varname)
+        self.varname = varname
+        message = self.get_message_format(color=False).format(varname=varname)
 
         if colno:
             cols = (colno, colno + len(varname))
@@ -66,7 +75,12 @@ class VarMessageException(InterpreterError):
             cols = None
         super().__init__(message, lineno, interpreter_context, cols)
 
-    def get_message_format(self):
+    def get_message(self, color: bool = True) -> str:
+        return self.get_message_format(color).format(varname=self.varname)
+
+    def get_message_format(self, color: bool = True):
+        if not color:
+            return f'{self.__class__.__name__}: {{varname}}'
         return f'{c.FAIL.get_text(self.__class__.__name__)}: {c.CYAN.get_text('{varname}')}'
 
 
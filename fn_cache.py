@@ -0,0 +1,66 @@
+from collections import OrderedDict
+
+from bdsl_types import FunctionData
+from bounds import Bounds
+
+type CacheKey = tuple[FunctionData, tuple]
+
+_MISSING = object()
+
+
+class FunctionCache:
+    """
+    LRU memo of user function results.
+
+    Entries are keyed on the function object (a redefinition never hits the
+    results of the old body) and the canonical form of each argument's
+    Bounds. A maxsize of 0 disables the cache.
+    """
+
+    def __init__(self, maxsize: int = 256) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__entries: OrderedDict[CacheKey, Bounds | None] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    @staticmethod
+    def key(func: FunctionData, args: list[Bounds]) -> CacheKey:
+        return func, tuple(arg.key() for arg in args)
+
+    def get(self, key: CacheKey) -> tuple[bool, Bounds | None]:
+        """Returns (found, result). Results are copies, safe to modify"""
+        res = self.__entries.get(key, _MISSING)
+        if res is _MISSING:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        self.__entries.move_to_end(key)
+        assert res is None or isinstance(res, Bounds)
+        return True, None if res is None else res.copy()
+
+    def put(self, key: CacheKey, res: Bounds | None):
+        if self.maxsize <= 0:
+            return
+        self.__entries[key] = None if res is None else res.copy()
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.maxsize:
+            self.__entries.popitem(last=False)
+            self.evictions += 1
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def report(self) -> list[str]:
+        return [
+            f'fn_cache_size: {len(self)}/{self.maxsize}',
+            f'fn_cache_hits: {self.hits}',
+            f'fn_cache_misses: {self.misses}',
+            f'fn_cache_evictions: {self.evictions}',
+            f'fn_cache_hit_rate: {self.hit_rate:.1%}',
+        ]
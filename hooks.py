@@ -0,0 +1,149 @@
+"""
+Observer hooks: callbacks on the events of a run, for tracers, metrics
+exporters or debuggers.
+
+Subclass `Observer`, overriding the events of interest, and run the program
+with an `ObservedInterpreter`:
+
+    interpreter = ObservedInterpreter(opts, observers=[MyObserver()])
+
+The plain `Interpreter` has no hooks at all: programs run without observers
+pay nothing for them (`make_interpreter` only picks `ObservedInterpreter`
+when some are given).
+"""
+
+from typing import Iterable, TextIO
+
+from bdsl import Interpreter, Opts, is_skipped
+from bdsl_ir import Assign, Declare, End, Expr, Finalize, If, Return, Statement
+from bdsl_types import (
+    BuiltinFunction,
+    Conditions,
+    FunctionData,
+    ProgramData,
+    VarContext,
+    VarData,
+)
+from bounds import Bounds
+from colors import c
+
+
+class Observer:
+    """Callbacks on the events of a run. The defaults do nothing"""
+
+    def on_statement(self, stmt: Statement, context: VarContext):
+        """Before a statement runs, in the context it runs in"""
+
+    def on_assign(self, name: str, var: VarData, context: VarContext):
+        """After a variable is set (declared, assigned or finalized)"""
+
+    def on_branch_split(self, cond: Conditions, taken: VarContext, other: VarContext):
+        """After a `??` splits the context in the branch taken and the other one"""
+
+    def on_branch_merge(self, context: VarContext):
+        """After a `--` merges the two branches back"""
+
+    def on_call_enter(self, func: FunctionData | BuiltinFunction, args: tuple[Expr, ...]):
+        """Before a function call evaluates its arguments"""
+
+    def on_call_exit(self, func: FunctionData | BuiltinFunction, result: Bounds | None):
+        """After a function call, with its result"""
+
+    def on_bounds_computed(self, name: str, bounds: Bounds | None, context: VarContext):
+        """After the bounds of a variable are computed (or taken from the cache)"""
+
+
+class ObservedInterpreter(Interpreter):
+    """Interpreter notifying its observers of the events of a run"""
+
+    def __init__(
+        self,
+        opts: Opts | None = None,
+        out: TextIO | None = None,
+        observers: Iterable[Observer] = (),
+    ) -> None:
+        super().__init__(opts, out)
+        self.observers: list[Observer] = list(observers)
+
+    def calc_bounds(self, v_name: str, context: VarContext) -> Bounds | None:
+        bds = super().calc_bounds(v_name, context)
+        for observer in self.observers:
+            observer.on_bounds_computed(v_name, bds, context)
+        return bds
+
+    def evaluate_func(
+        self, func: FunctionData, args: tuple[Expr, ...], context: VarContext
+    ) -> Bounds | None:
+        for observer in self.observers:
+            observer.on_call_enter(func, args)
+        res = super().evaluate_func(func, args, context)
+        for observer in self.observers:
+            observer.on_call_exit(func, res)
+        return res
+
+    def exec_program(
+        self, program: Iterable[Statement], program_data: ProgramData | None = None
+    ):
+        for stmt in program:
+            if not self.context_stack:
+                self.context_stack.append(VarContext())
+            if is_skipped(stmt, self.context_stack[-1]):
+                continue
+            for observer in self.observers:
+                observer.on_statement(stmt, self.context_stack[-1])
+
+            super().exec_program((stmt,), program_data)
+            if isinstance(stmt, Return):
+                return
+            self.notify(stmt)
+
+    def notify(self, stmt: Statement):
+        """Notifies the effects of a statement that just ran"""
+        context = self.context_stack[-1]
+        match stmt:
+            case Assign(name=name) | Declare(name=name) | Finalize(name=name):
+                for observer in self.observers:
+                    observer.on_assign(name, context[name], context)
+            case If():
+                cond, other = self.split_cond_stack[-1], self.other_context_stack[-1]
+                for observer in self.observers:
+                    observer.on_branch_split(cond, context, other)
+            case End():
+                for observer in self.observers:
+                    observer.on_branch_merge(context)
+
+
+class Tracer(Observer):
+    """Prints the events of a run (`--trace`)"""
+
+    def __init__(self, out: TextIO | None = None) -> None:
+        self.out = out
+        self.depth = 0
+
+    def trace(self, event: str, msg: str):
+        print(f'{c.FAINT('trace:')}{'  ' * self.depth} {c.BLUE(event)} {msg}', file=self.out)
+
+    def on_statement(self, stmt: Statement, context: VarContext):
+        self.trace('stmt', f'{stmt.line_num:03} {stmt}')
+
+    def on_assign(self, name: str, var: VarData, context: VarContext):
+        self.trace('assign', str(var))
+
+    def on_branch_split(self, cond: Conditions, taken: VarContext, other: VarContext):
+        conds = ', '.join(f'{c.GREEN(name)} ∈ {bds}' for name, bds in cond.items())
+        self.trace('split', conds)
+
+    def on_branch_merge(self, context: VarContext):
+        self.trace('merge', f'{len(context)} vars')
+
+    def on_call_enter(self, func: FunctionData | BuiltinFunction, args: tuple[Expr, ...]):
+        self.trace('call', f'{c.GREEN(func.name)}({', '.join(str(arg) for arg in args)})')
+        self.depth += 1
+
+    def on_call_exit(self, func: FunctionData | BuiltinFunction, result: Bounds | None):
+        self.depth -= 1
+        self.trace('return', f'{c.GREEN(func.name)} -> {result}')
+
+    def on_bounds_computed(self, name: str, bounds: Bounds | None, context: VarContext):
+        self.trace('bounds', f'{c.GREEN(name)} ∈ {bounds}')
+
@@ -0,0 +1,217 @@
+"""
+Incremental analysis: re-analyzes an edited program from the last state
+that the edit cannot have changed.
+
+While running, `IncrementalAnalyzer` takes a snapshot of the interpreter
+state before every top level statement (outside any `??` block): the top
+context and the function table. Contexts are persistent overlays, so a
+snapshot only keeps a reference to the current layer and the following
+statements write to a child of it; the function table is copied when a
+function is (re)defined. Given a new version of the source, the analyzer
+restores the last snapshot before the first changed line and only runs
+the statements from there on.
+
+Statements run one at a time, so the optimizer (which needs the whole
+program) is not used.
+"""
+
+import bisect
+import threading
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+from analysis import (
+    AnalysisResult,
+    CollectingInterpreter,
+    Diagnostic,
+    final_bounds,
+    to_diagnostic,
+)
+from bdsl import Opts
+from bdsl_ir import FnDef
+from bdsl_parser import iter_statements
+from bdsl_types import (
+    BuiltinFunction,
+    FunctionData,
+    ProgramData,
+    VarContext,
+    builtinFunctions,
+)
+from bounds import Bounds
+
+
+@dataclass(frozen=True, slots=True)
+class Snapshot:
+    """Interpreter state before the top level statement starting at `line`"""
+
+    line: int
+    context: VarContext
+    functions: dict[str, FunctionData | BuiltinFunction]
+    # Number of query results recorded before the statement
+    queries: int
+
+
+def first_changed_line(old: tuple[str, ...], new: tuple[str, ...]) -> int | None:
+    """First line (from 1) that differs between two versions, None if equal"""
+    for line_num, (old_line, new_line) in enumerate(zip(old, new), start=1):
+        if old_line != new_line:
+            return line_num
+    if len(old) == len(new):
+        return None
+    return min(len(old), len(new)) + 1
+
+
+class IncrementalAnalyzer:
+    """
+    Analyzes successive versions of a program. Each `update` costs about the
+    statements after the first changed line, not the size of the program.
+    """
+
+    def __init__(self, opts: Opts | None = None, filename: str = '<input>') -> None:
+        self.interpreter = CollectingInterpreter(opts)
+        self.program_data = ProgramData(filename)
+        self.lines: tuple[str, ...] = ()
+        self.snapshots: list[Snapshot] = [
+            Snapshot(1, VarContext(), self.interpreter.functions, 0)
+        ]
+        self.result = AnalysisResult()
+        self.builtins = {f.name for f in builtinFunctions}
+        # Statements run by the last update
+        self.executed = 0
+        # Whether the whole source ran without errors
+        self.complete = True
+
+    def update(
+        self, source: str | Iterable[str], cancel: threading.Event | None = None
+    ) -> AnalysisResult | None:
+        """
+        Analyzes the new version of the source. Setting `cancel` (from
+        another thread) stops the analysis before its next statement and
+        returns None: the following update resumes from where it stopped.
+        """
+        if isinstance(source, str):
+            source = source.splitlines(keepends=True)
+        lines = tuple(source)
+        first_changed = first_changed_line(self.lines, lines)
+        self.lines = lines
+        self.executed = 0
+        if first_changed is None:
+            return self.result
+
+        # Last snapshot taken before any changed line was read
+        pos = bisect.bisect_right(self.snapshots, first_changed, key=lambda snap: snap.line)
+        snapshot = self.snapshots[pos - 1]
+        del self.snapshots[pos:]
+        self.restore(snapshot)
+
+        diagnostics = self.run(snapshot.line, cancel)
+        if diagnostics is None:
+            # Only the lines before the last snapshot were analyzed
+            self.lines = lines[: self.snapshots[-1].line - 1]
+            self.complete = False
+            return None
+        self.complete = not diagnostics
+        interpreter = self.interpreter
+        self.result = AnalysisResult(
+            final_bounds(interpreter), list(interpreter.queries), diagnostics
+        )
+        return self.result
+
+    def bounds_at(self, name: str, line: int) -> Bounds | None:
+        """
+        Bounds of a variable after the top level statement at `line` (after
+        the whole block for lines in a `??` block). None if the variable is
+        not defined there, or the line was not analyzed.
+        """
+        pos = bisect.bisect_right(self.snapshots, line, key=lambda snap: snap.line)
+        if pos < len(self.snapshots):
+            context, functions = self.snapshots[pos].context, self.snapshots[pos].functions
+        elif self.complete and len(self.interpreter.context_stack) == 1:
+            context, functions = self.interpreter.context_stack[0], self.interpreter.functions
+        else:
+            return None
+        if name not in context:
+            return None
+
+        # Keeps the analyzer interpreter out of it: calls could record queries
+        interpreter = CollectingInterpreter(self.interpreter.opts)
+        interpreter.functions = functions
+        try:
+            return interpreter.calc_bounds(name, context)
+        except Exception:  # pylint: disable=broad-exception-caught
+            return None
+
+    def restore(self, snapshot: Snapshot):
+        """Puts the interpreter back in the state of the snapshot"""
+        interpreter = self.interpreter
+        interpreter.context_stack = [snapshot.context.child()]
+        interpreter.other_context_stack = []
+        interpreter.split_cond_stack = []
+        interpreter.functions = snapshot.functions
+        del interpreter.queries[snapshot.queries :]
+
+    def take_snapshot(self, line: int):
+        """Records the current state, moving the following writes to a new layer"""
+        context_stack = self.interpreter.context_stack
+        top = context_stack[0]
+        if top.local or top.parent is None:
+            self.warm_up(top)
+            top = top.compact()
+            context_stack[0] = top.child()
+        else:
+            # Nothing set since the last snapshot: only cached bounds differ
+            top = top.parent
+        if top is self.snapshots[-1].context:
+            return
+        self.snapshots.append(
+            Snapshot(line, top, self.interpreter.functions, len(self.interpreter.queries))
+        )
+
+    def warm_up(self, layer: VarContext):
+        """
+        Computes the bounds of the variables set in the layer, caching them
+        there. Compacting drops older layers from the live context, so the
+        bounds would otherwise not be cached in the snapshots.
+
+        Calls to user functions are left lazy, since they can record queries.
+        """
+        for name, var in layer.local.items():
+            if var.expr is None or not var.expr.fn_calls() <= self.builtins:
+                continue
+            try:
+                self.interpreter.calc_bounds(name, layer)
+            except Exception:  # pylint: disable=broad-exception-caught
+                # Reported when (and if) the variable is used
+                pass
+
+    def run(self, start: int, cancel: threading.Event | None = None) -> list[Diagnostic] | None:
+        """Runs the statements from line `start`, returning the errors (None if cancelled)"""
+        interpreter = self.interpreter
+        last_read = start
+
+        def numbered() -> Iterator[str]:
+            nonlocal last_read
+            for last_read, line in enumerate(self.lines[start - 1 :], start=start):
+                yield line
+
+        statements = iter_statements(numbered(), start)
+        while True:
+            try:
+                stmt = next(statements, None)
+            except AssertionError as e:
+                return [to_diagnostic(e, last_read)]
+            if stmt is None:
+                return []
+
+            if len(interpreter.context_stack) == 1:
+                self.take_snapshot(stmt.line_num)
+                if cancel is not None and cancel.is_set():
+                    return None
+            if isinstance(stmt, FnDef):
+                # Snapshots keep the table they were taken with
+                interpreter.functions = dict(interpreter.functions)
+            self.executed += 1
+            try:
+                interpreter.exec_program((stmt,), self.program_data)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                return [to_diagnostic(e, interpreter.stmt.line_num)]
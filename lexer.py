@@ -1,4 +1,6 @@
 import re
+from dataclasses import dataclass
+from typing import Iterator
 
 from bdsl_types import iota
 
@@ -18,6 +20,8 @@ TOKEN_END = iota()
 TOKEN_FN_DEF = iota()
 TOKEN_FN_RET = iota()
 TOKEN_FN_CALL = iota()
+TOKEN_WHILE = iota()
+TOKEN_FOR = iota()
 # Other ops ...
 
 # Leave as last, used for assertions
@@ -40,6 +44,8 @@ token_names = [
     'FN_DEF',
     'FN_RET',
     'FN_CALL',
+    'WHILE',
+    'FOR',
 ]
 
 assert (
@@ -76,90 +82,146 @@ FN_RET_RE = r'^<<$'
 FN_CALL_RE = r'^(?P<fn_name>[A-z]\w*)\((?P<fn_args>.*)\)$'
 
 
-assert TOKEN_MAX == 15, f'Implementation not done for {TOKEN_MAX} tokens'
-
-
-def get_token_type(tok: str):
-    # if VERBOSE:
-    #     print(f'get_token_type: "{tok}"')
-
-    comm_match = re.match(COMMENT_RE, tok)
-    if comm_match:
-        comm_text = comm_match.groupdict()['comment']
-        return (TOKEN_COMMENT, comm_text)
-
-    if tok == '=':
-        return (TOKEN_ASSIGN, tok)
-
-    quest_match = re.match(QUEST_RE, tok)
-    if quest_match:
-        return (TOKEN_QUEST, quest_match.groups()[0])
-
-    fn_match = re.match(FN_RE, tok)
-    if fn_match:
-        return (TOKEN_FN_DEF, tok)
-
-    var_match = re.match(VAR_RE, tok)
-    if var_match:
-        return (TOKEN_VAR, var_match.groups()[0], var_match.groups()[1])
-
-    op_match = re.match(OP_RE, tok)
-
-    if op_match:
-        return (TOKEN_OP,)
-
-    range_match = re.match(RANGE_RE, tok)
-
-    if range_match:
-        groups = range_match.groupdict()
-        r_min = groups['min']
-        r_max = groups['max']
-        r_min_in = groups['min_in']
-        r_max_in = groups['max_in']
-        return (TOKEN_RANGE, r_min, r_max, r_min_in, r_max_in)
-
-    size_match = re.match(SIZE_RE, tok)
-    if size_match:
-        groups = size_match.groupdict()
-        size = groups['size']
-        return (TOKEN_SIZE, size)
-
-    cond_match = re.match(COND_RE, tok)
-    if cond_match:
-        return (TOKEN_COND, tok)
-
-    num_mark = re.match(NUM_RE, tok)
-    if num_mark:
-        return (TOKEN_NUM, num_mark.groups()[0])
+assert TOKEN_MAX == 17, f'Implementation not done for {TOKEN_MAX} tokens'
+
+
+# Single master scanner: one named alternative per token kind, tried in order
+# at each position. Order matters: longer/ambiguous forms come first (`??`
+# before `?`, `>>`/`--`/`<<` before conditions and operators, ranges before
+# numbers, fn calls before plain variables).
+_NUM = r'-?[0-9]*(?:\.[0-9]+)?'
+SCANNER_RE = re.compile(
+    '|'.join(
+        [
+            r'(?P<comment>;;[ ]?(?P<comment_text>.*))',
+            rf'(?P<range>(?P<min_in>\.?)(?P<min>{_NUM})\.\.(?P<max>{_NUM})(?P<max_in>\.?))',
+            r'(?P<cmd>\?\?|>>|--|<<)',
+            r'(?P<quest>\?(?P<quest_mod>[fva])?)(?!\w)',
+            r'(?P<fn_def>fn)(?!\w)',
+            r'(?P<while>while)(?!\w)',
+            r'(?P<for>for)(?!\w)',
+            r'(?P<fn_call>(?P<fn_name>[A-Za-z]\w*)\((?P<fn_args>[^()]*)\))',
+            rf'(?P<var>(?P<var_name>[_A-Za-z]\w*)(?P<var_mod>[{MODS_RE}]?))',
+            r'(?P<num>-?[0-9]+(?:\.[0-9]+)?)',
+            r'(?P<cond>==|!=|>=|<=|>|<)',
+            r'(?P<assign>=)',
+            rf'(?P<op>[{OPS_RE}])',
+            r'(?P<size>\((?P<size_val>[0-9,]*)\))',
+            r'(?P<ws>\s+)',
+            r'(?P<mismatch>.)',
+        ]
+    )
+)
 
-    cmd_match = re.match(CMD_RE, tok)
-    if cmd_match:
-        tok_match = cmd_match.groups()[0]
-        if tok_match == '??':
-            return (TOKEN_IF, tok)
-        if tok_match == '>>':
-            return (TOKEN_ELSE, tok)
-        if tok_match == '--':
-            return (TOKEN_END, tok)
+_CMD_TOKENS = {
+    '??': TOKEN_IF,
+    '>>': TOKEN_ELSE,
+    '--': TOKEN_END,
+    '<<': TOKEN_FN_RET,
+}
+
+# Token kinds that can end an operand: a `-` right after one of these is a
+# binary minus, not the sign of a number literal.
+_OPERAND_TOKENS = (TOKEN_VAR, TOKEN_NUM, TOKEN_FN_CALL)
+
+
+@dataclass(frozen=True, slots=True)
+class Token:
+    """A lexed token with its column offset (0-based) in the source line.
+
+    Iterating a token yields `(type, *groups)`, the same shape returned by
+    `get_token_type`.
+    """
+
+    type: int
+    text: str
+    col: int
+    groups: tuple[str | None, ...] = ()
+
+    @property
+    def name(self) -> str:
+        return token_names[self.type]
+
+    def __iter__(self) -> Iterator[int | str | None]:
+        yield self.type
+        yield from self.groups
+
+
+def iter_tokens(line: str) -> Iterator[Token]:
+    """Scans a line once, yielding its tokens. Whitespace is skipped."""
+    prev_type = None
+    for m in SCANNER_RE.finditer(line):
+        kind = m.lastgroup
+        text = m.group()
+        col = m.start()
+
+        if kind == 'ws':
+            continue
+        if kind == 'comment':
+            tok = Token(TOKEN_COMMENT, text, col, (m.group('comment_text'),))
+        elif kind == 'range':
+            groups = (m.group('min'), m.group('max'), m.group('min_in'), m.group('max_in'))
+            tok = Token(TOKEN_RANGE, text, col, groups)
+        elif kind == 'cmd':
+            tok = Token(_CMD_TOKENS[text], text, col, (text,))
+        elif kind == 'quest':
+            tok = Token(TOKEN_QUEST, text, col, (m.group('quest_mod'),))
+        elif kind == 'fn_def':
+            tok = Token(TOKEN_FN_DEF, text, col, (text,))
+        elif kind == 'while':
+            tok = Token(TOKEN_WHILE, text, col, (text,))
+        elif kind == 'for':
+            tok = Token(TOKEN_FOR, text, col, (text,))
+        elif kind == 'fn_call':
+            groups = (m.group('fn_name'), m.group('fn_args'))
+            tok = Token(TOKEN_FN_CALL, text, col, groups)
+        elif kind == 'var':
+            groups = (m.group('var_name'), m.group('var_mod'))
+            tok = Token(TOKEN_VAR, text, col, groups)
+        elif kind == 'num':
+            if text[0] == '-' and prev_type in _OPERAND_TOKENS:
+                # `x-1`: the minus is an operator, not the literal sign
+                yield Token(TOKEN_OP, '-', col, ('-',))
+                text, col = text[1:], col + 1
+            tok = Token(TOKEN_NUM, text, col, (text,))
+        elif kind == 'cond':
+            tok = Token(TOKEN_COND, text, col, (text,))
+        elif kind == 'assign':
+            tok = Token(TOKEN_ASSIGN, text, col, (text,))
+        elif kind == 'op':
+            tok = Token(TOKEN_OP, text, col, (text,))
+        elif kind == 'size':
+            tok = Token(TOKEN_SIZE, text, col, (m.group('size_val'),))
+        else:
+            assert False, f'Token "{line[col:].split()[0]}" not matched (column {col + 1})'
+
+        prev_type = tok.type
+        yield tok
+        if tok.type == TOKEN_COMMENT:
+            return
+
+
+def tokenize(line: str) -> list[Token]:
+    """Returns all tokens of a line."""
+    return list(iter_tokens(line))
 
-    fn_ret_match = re.match(FN_RET_RE, tok)
-    if fn_ret_match:
-        return (TOKEN_FN_RET, tok)
 
-    fn_call_match = re.match(FN_CALL_RE, tok)
-    if fn_call_match:
-        groups = fn_call_match.groupdict()
-        fn_name = groups['fn_name']
-        fn_args = groups['fn_args']
+def get_token_type(tok: str):
+    """Classifies a single token string, returning `(type, *groups)`."""
+    toks = tokenize(tok)
+    assert len(toks) == 1, f'Token "{tok}" not matched'
+    return tuple(toks[0])
 
-        return (TOKEN_FN_CALL, fn_name, fn_args)
 
-    assert False, f'Token "{tok}" not matched'
+_compiled: dict[str, re.Pattern[str]] = {}
 
 
 def match_token(tok: str, tok_re: str):
 
-    re_match = re.match(tok_re, tok)
+    pattern = _compiled.get(tok_re)
+    if pattern is None:
+        pattern = _compiled[tok_re] = re.compile(tok_re)
+    re_match = pattern.match(tok)
 
     if re_match is None:
         return False, None
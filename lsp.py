@@ -0,0 +1,319 @@
+"""
+Language server for bdsl, over stdio (`bdsl.py --lsp`).
+
+Provides:
+    - diagnostics, from the errors found running the program;
+    - hover on a variable, showing its bounds after that line;
+    - document symbols for the `fn` definitions.
+
+Each open document keeps an `IncrementalAnalyzer`, so an edit only
+re-runs the program from the first changed line. Analyses run on a worker
+thread, `DEBOUNCE` seconds after the last edit: a new edit cancels the
+pending analysis, and stops the running one at its next statement.
+"""
+
+import asyncio
+import json
+import re
+import sys
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+import lexer
+from analysis import AnalysisResult, Diagnostic, to_diagnostic
+from bdsl import Opts
+from bdsl_parser import code_tokens
+from incremental import IncrementalAnalyzer
+
+# Seconds without edits before analyzing
+DEBOUNCE = 0.2
+
+# LSP constants
+TEXT_SYNC_FULL = 1
+SEVERITY_ERROR = 1
+SYMBOL_FUNCTION = 12
+METHOD_NOT_FOUND = -32601
+INTERNAL_ERROR = -32603
+
+WORD_RE = re.compile(r'[_A-Za-z][_A-Za-z0-9]*')
+
+type Sender = Callable[[dict[str, Any]], Awaitable[None]]
+
+
+@dataclass
+class Document:
+    """An open document and its analysis state"""
+
+    uri: str
+    text: str
+    analyzer: IncrementalAnalyzer
+    # Held by the thread using the analyzer
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    task: asyncio.Task | None = None
+    cancel: threading.Event | None = None
+
+
+def word_at(line: str, character: int) -> str | None:
+    for match in WORD_RE.finditer(line):
+        if match.start() <= character <= match.end():
+            return match.group()
+    return None
+
+
+def function_symbols(lines: list[str]) -> list[dict[str, Any]]:
+    """Document symbols of the `fn` definitions, spanning up to their `--`"""
+    symbols = []
+    current = None
+    depth = 0
+    for line_num, line in enumerate(lines):
+        try:
+            tokens = code_tokens(line)
+        except AssertionError:
+            continue
+        if not tokens:
+            continue
+        first = tokens[0].type
+        if current is None:
+            if first == lexer.TOKEN_FN_DEF and len(tokens) == 2:
+                fn_name, fn_args = tokens[1].groups
+                current = {'name': fn_name, 'detail': f'({fn_args})', 'start': line_num}
+                depth = 0
+            continue
+        if first in (lexer.TOKEN_IF, lexer.TOKEN_WHILE, lexer.TOKEN_FOR):
+            depth += 1
+        elif first == lexer.TOKEN_END:
+            if depth == 0:
+                symbols.append(symbol(current, line_num, len(line.rstrip('\n'))))
+                current = None
+            else:
+                depth -= 1
+    if current is not None:
+        symbols.append(symbol(current, len(lines) - 1, len(lines[-1].rstrip('\n'))))
+    return symbols
+
+
+def symbol(fn: dict[str, Any], end_line: int, end_char: int) -> dict[str, Any]:
+    start = {'line': fn['start'], 'character': 0}
+    return {
+        'name': fn['name'],
+        'detail': fn['detail'],
+        'kind': SYMBOL_FUNCTION,
+        'range': {'start': start, 'end': {'line': end_line, 'character': end_char}},
+        'selectionRange': {'start': start, 'end': start},
+    }
+
+
+def lsp_diagnostic(diag: Diagnostic, lines: list[str]) -> dict[str, Any]:
+    line = max((diag.line or 1) - 1, 0)
+    text = lines[line] if line < len(lines) else ''
+    if diag.cols is not None:
+        start, end = diag.cols[0] - 1, diag.cols[1] - 1
+    else:
+        start, end = len(text) - len(text.lstrip()), len(text.rstrip())
+    return {
+        'range': {
+            'start': {'line': line, 'character': start},
+            'end': {'line': line, 'character': end},
+        },
+        'severity': SEVERITY_ERROR,
+        'source': 'bdsl',
+        'code': diag.kind,
+        'message': diag.message,
+    }
+
+
+class LanguageServer:
+    """Handles the JSON-RPC messages of one client"""
+
+    def __init__(self, send: Sender, opts: Opts | None = None, debounce: float = DEBOUNCE):
+        self.send = send
+        self.opts = opts or Opts()
+        self.debounce = debounce
+        self.documents: dict[str, Document] = {}
+        self.running = True
+
+    async def handle(self, message: dict[str, Any]):
+        method = message.get('method')
+        params = message.get('params', {})
+        handler = getattr(self, 'on_' + str(method).replace('/', '_').replace('$', '_'), None)
+
+        if 'id' not in message:
+            # Notification: unknown ones are ignored
+            if handler is None:
+                return
+            try:
+                await handler(params)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                # No reply to send: log it, and keep serving the next messages
+                print(f'bdsl lsp: {method} failed: {type(e).__name__}: {e}', file=sys.stderr)
+            return
+        if handler is None:
+            error = {'code': METHOD_NOT_FOUND, 'message': f'Unknown method: {method}'}
+            await self.send({'jsonrpc': '2.0', 'id': message['id'], 'error': error})
+            return
+        try:
+            result = await handler(params)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # The request must still get its reply, or the client waits forever
+            error = {'code': INTERNAL_ERROR, 'message': f'{type(e).__name__}: {e}'}
+            await self.send({'jsonrpc': '2.0', 'id': message['id'], 'error': error})
+            return
+        await self.send({'jsonrpc': '2.0', 'id': message['id'], 'result': result})
+
+    async def on_initialize(self, params):
+        return {
+            'capabilities': {
+                'textDocumentSync': TEXT_SYNC_FULL,
+                'hoverProvider': True,
+                'documentSymbolProvider': True,
+            },
+            'serverInfo': {'name': 'bdsl'},
+        }
+
+    async def on_initialized(self, params):
+        pass
+
+    async def on_shutdown(self, params):
+        for doc in self.documents.values():
+            self.cancel(doc)
+        return None
+
+    async def on_exit(self, params):
+        self.running = False
+
+    async def on_textDocument_didOpen(self, params):
+        item = params['textDocument']
+        analyzer = IncrementalAnalyzer(self.opts, filename=item['uri'])
+        doc = Document(item['uri'], item['text'], analyzer)
+        self.documents[doc.uri] = doc
+        self.schedule(doc)
+
+    async def on_textDocument_didChange(self, params):
+        doc = self.documents.get(params['textDocument']['uri'])
+        if doc is None:
+            return
+        # Full sync: the last change holds the whole text
+        doc.text = params['contentChanges'][-1]['text']
+        self.schedule(doc)
+
+    async def on_textDocument_didClose(self, params):
+        doc = self.documents.pop(params['textDocument']['uri'], None)
+        if doc is not None:
+            self.cancel(doc)
+
+    async def on_textDocument_hover(self, params):
+        doc = self.documents.get(params['textDocument']['uri'])
+        if doc is None:
+            return None
+        line_num = params['position']['line']
+        lines = doc.text.splitlines()
+        if line_num >= len(lines):
+            return None
+        name = word_at(lines[line_num], params['position']['character'])
+        if name is None:
+            return None
+
+        def bounds():
+            with doc.lock:
+                return doc.analyzer.bounds_at(name, line_num + 1)
+
+        bds = await asyncio.get_running_loop().run_in_executor(None, bounds)
+        if bds is None:
+            return None
+        return {'contents': {'kind': 'markdown', 'value': f'`{name}` ∈ `{bds}`'}}
+
+    async def on_textDocument_documentSymbol(self, params):
+        doc = self.documents.get(params['textDocument']['uri'])
+        if doc is None:
+            return []
+        return function_symbols(doc.text.splitlines())
+
+    def cancel(self, doc: Document):
+        if doc.task is not None:
+            doc.task.cancel()
+        if doc.cancel is not None:
+            doc.cancel.set()
+
+    def schedule(self, doc: Document):
+        """(Re)starts the debounced analysis of the document"""
+        self.cancel(doc)
+        doc.cancel = threading.Event()
+        doc.task = asyncio.create_task(self.analyze(doc, doc.text, doc.cancel))
+
+    async def analyze(self, doc: Document, text: str, cancel: threading.Event):
+        await asyncio.sleep(self.debounce)
+
+        def run() -> AnalysisResult | None:
+            with doc.lock:
+                if cancel.is_set():
+                    return None
+                return doc.analyzer.update(text, cancel)
+
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(None, run)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # Published like the other errors, replacing the stale ones
+            result = AnalysisResult(diagnostics=[to_diagnostic(e, None)])
+        if result is None:
+            return
+        lines = text.splitlines()
+        diagnostics = [lsp_diagnostic(diag, lines) for diag in result.diagnostics]
+        await self.send(
+            {
+                'jsonrpc': '2.0',
+                'method': 'textDocument/publishDiagnostics',
+                'params': {'uri': doc.uri, 'diagnostics': diagnostics},
+            }
+        )
+
+
+async def read_message(reader: asyncio.StreamReader) -> dict[str, Any] | None:
+    """Reads a `Content-Length` framed message, None at the end of the input"""
+    length = None
+    while True:
+        header = await reader.readline()
+        if not header:
+            return None
+        header = header.strip()
+        if not header:
+            break
+        name, _, value = header.decode('ascii').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    assert length is not None, 'Message without Content-Length'
+    return json.loads(await reader.readexactly(length))
+
+
+def encode_message(message: dict[str, Any]) -> bytes:
+    body = json.dumps(message).encode()
+    return f'Content-Length: {len(body)}\r\n\r\n'.encode('ascii') + body
+
+
+async def serve_stdio(opts: Opts):
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+    async def send(message: dict[str, Any]):
+        sys.stdout.buffer.write(encode_message(message))
+        sys.stdout.buffer.flush()
+
+    server = LanguageServer(send, opts)
+    requests: set[asyncio.Task] = set()
+    while server.running and (message := await read_message(reader)) is not None:
+        if 'id' in message:
+            # Requests (like hovers) can wait for an analysis: keep reading edits
+            task = asyncio.create_task(server.handle(message))
+            requests.add(task)
+            task.add_done_callback(requests.discard)
+        else:
+            # Notifications are handled in order, so edits are never reordered
+            await server.handle(message)
+    if requests:
+        await asyncio.wait(requests)
+
+
+def main(opts: Opts) -> int:
+    asyncio.run(serve_stdio(opts))
+    return 0
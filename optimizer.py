@@ -0,0 +1,158 @@
+"""
+Optimization passes over parsed programs.
+
+`optimize` rewrites a program into one giving the same bounds to every
+variable, and runs between parsing and execution when `Opts.optimize` is
+set. It folds operations between literals, makes uses of aliases (`z = x`)
+read the aliased variable, and shares identical expression trees
+(hash-consing), replacing the ones already held by a variable with it.
+
+Variables are all lazy, so an expression can be replaced by a variable
+holding it as long as that variable never changes: only variables defined
+once, at the top level, and never overwritten, finalized or narrowed by a
+condition are used.
+"""
+
+from functools import lru_cache
+
+from bdsl_ir import (
+    Assign,
+    BinOp,
+    Call,
+    Declare,
+    End,
+    Expr,
+    Finalize,
+    FnDef,
+    For,
+    If,
+    Num,
+    Program,
+    RangeSpec,
+    Statement,
+    Var,
+    While,
+)
+from bdsl_types import builtinFunctions
+
+_OPS = {
+    '+': lambda x, y: x + y,
+    '-': lambda x, y: x - y,
+    '*': lambda x, y: x * y,
+    '/': lambda x, y: x / y,
+}
+
+
+def fold(op: str, lhs: Expr, rhs: Expr) -> Expr:
+    """Builds `lhs op rhs`, computing it if both sides are literals"""
+    if isinstance(lhs, Num) and isinstance(rhs, Num):
+        if not (op == '/' and rhs.value == 0):
+            return Num(_OPS[op](lhs.value, rhs.value))
+    return BinOp(op, lhs, rhs)
+
+
+def stable_vars(program: Program) -> set[str]:
+    """
+    Variables defined once, at the top level, that are never overwritten,
+    finalized or used in a condition (loop bodies included).
+    """
+    definitions: dict[str, int] = {}
+    unstable: set[str] = set()
+
+    def scan(program: Program, depth: int):
+        for stmt in program:
+            match stmt:
+                case Assign(name=name, overwrite=overwrite) | Declare(
+                    name=name, overwrite=overwrite
+                ):
+                    definitions[name] = definitions.get(name, 0) + 1
+                    if overwrite or depth > 0:
+                        unstable.add(name)
+                case Finalize(name=name):
+                    unstable.add(name)
+                case If(condition=condition):
+                    depth += 1
+                    unstable.update(val for val in condition.vals if isinstance(val, str))
+                case End():
+                    depth -= 1
+                case While(condition=condition, body=body):
+                    unstable.update(val for val in condition.vals if isinstance(val, str))
+                    scan(body, depth + 1)
+                case For(var=var, body=body):
+                    unstable.add(var)
+                    scan(body, depth + 1)
+
+    scan(program, 0)
+    return {name for name, count in definitions.items() if count == 1} - unstable
+
+
+class _Rewriter:
+    """State of the forward pass over one scope (the program or a function body)"""
+
+    def __init__(self, program: Program) -> None:
+        self.stable = stable_vars(program)
+        # Stable alias -> variable it reads
+        self.aliases: dict[str, str] = {}
+        # Expression -> stable variable holding it
+        self.holders: dict[Expr, str] = {}
+        # Hash-consing table: one shared node per distinct expression
+        self.nodes: dict[Expr, Expr] = {}
+        self.builtins = {f.name for f in builtinFunctions}
+
+    def intern(self, expr: Expr) -> Expr:
+        return self.nodes.setdefault(expr, expr)
+
+    def rewrite(self, expr: Expr, assigned: str | None = None) -> Expr:
+        """
+        Propagates aliases, reuses held subexpressions and interns nodes.
+        Aliases and holders reading `assigned` are left out: the overwrite
+        `x! = x + 2` must read `x` itself, to be evaluated eagerly (a lazy
+        `x! = y`, with `y = x + 2`, would read its own value).
+        """
+        match expr:
+            case Var(name=name):
+                target = self.aliases.get(name, name)
+                return self.intern(Var(name if target == assigned else target))
+            case BinOp(op=op, lhs=lhs, rhs=rhs):
+                expr = fold(op, self.rewrite(lhs, assigned), self.rewrite(rhs, assigned))
+            case Call(name=name, args=args):
+                expr = Call(name, tuple(self.rewrite(arg, assigned) for arg in args))
+        holder = self.holders.get(expr)
+        if holder is not None and assigned not in expr.free_vars():
+            return self.intern(Var(holder))
+        return self.intern(expr)
+
+    def is_shareable(self, expr: Expr) -> bool:
+        # Calls to user functions may print: evaluating them once less is visible
+        return not isinstance(expr, (Var, Num)) and expr.fn_calls() <= self.builtins
+
+    def statement(self, stmt: Statement) -> Statement:
+        match stmt:
+            case Assign(name=name, overwrite=overwrite, expr=expr, size=size):
+                expr = self.rewrite(expr, name if overwrite else None)
+                if isinstance(expr, Num):
+                    range_spec = RangeSpec(expr.value, expr.value)
+                    return Declare(stmt.line_num, stmt.line, name, overwrite, range_spec, size)
+                if name in self.stable:
+                    if isinstance(expr, Var):
+                        self.aliases[name] = expr.name
+                    elif self.is_shareable(expr):
+                        self.holders.setdefault(expr, name)
+                return Assign(stmt.line_num, stmt.line, name, overwrite, expr, size)
+            case FnDef(name=name, args=args, body=body):
+                return FnDef(stmt.line_num, stmt.line, name, args, optimize(body))
+            case While(condition=condition, body=body):
+                body = tuple(self.statement(body_stmt) for body_stmt in body)
+                return While(stmt.line_num, stmt.line, condition, body)
+            case For(var=var, range=range_spec, body=body):
+                body = tuple(self.statement(body_stmt) for body_stmt in body)
+                return For(stmt.line_num, stmt.line, var, range_spec, body)
+        return stmt
+
+
+@lru_cache(maxsize=64)
+def optimize(program: Program) -> Program:
+    """Runs the optimization passes on a program (and its function bodies)"""
+    rewriter = _Rewriter(program)
+    return tuple(rewriter.statement(stmt) for stmt in program)
+
@@ -0,0 +1,208 @@
+"""
+Profiling mode (`--profile`): where the time of an analysis goes.
+
+`ProfilingInterpreter` runs statements one at a time, recording for every
+source line and every user function:
+    - the number of runs (calls, for functions);
+    - the wall time;
+    - the number of `calc_bounds` calls;
+    - the most intervals in the bounds computed;
+    - the memory allocated (net, and peak above the starting point), traced
+      with tracemalloc.
+
+Figures are inclusive: a line calling a function also counts the work done
+in the function body. Since variables are lazy, most of the work shows up
+on the lines querying them. Without `--profile` the plain `Interpreter`
+runs, so profiling costs nothing.
+"""
+
+import json
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Iterable, TextIO
+
+from bdsl import Opts, is_skipped
+from bdsl_ir import Expr, Return, Statement
+from bdsl_types import FunctionData, ProgramData, VarContext
+from bounds import Bounds
+from colors import c
+from hooks import ObservedInterpreter, Observer
+
+# Rows printed for each table
+REPORT_ROWS = 20
+
+
+@dataclass
+class ProfileStats:
+    """Figures of a line or a function"""
+
+    runs: int = 0
+    seconds: float = 0.0
+    calc_bounds: int = 0
+    peak_intervals: int = 0
+    alloc_bytes: int = 0
+    peak_bytes: int = 0
+
+
+class _Frame:
+    """A line or function being run"""
+
+    __slots__ = ('stats', 'outermost', 'start', 'start_mem', 'peak_mem')
+
+    def __init__(self, stats: ProfileStats, outermost: bool, start_mem: int) -> None:
+        self.stats = stats
+        # False for recursive runs, already timed by the outer one
+        self.outermost = outermost
+        self.start = time.perf_counter()
+        self.start_mem = start_mem
+        self.peak_mem = start_mem
+
+
+class ProfilingInterpreter(ObservedInterpreter):
+    """Interpreter recording `ProfileStats` for each line and user function"""
+
+    def __init__(
+        self,
+        opts: Opts | None = None,
+        out: TextIO | None = None,
+        observers: Iterable[Observer] = (),
+    ) -> None:
+        super().__init__(opts, out, observers)
+        # (line number, source text) -> stats
+        self.lines: dict[tuple[int, str], ProfileStats] = {}
+        self.fn_stats: dict[str, ProfileStats] = {}
+        self.frames: list[_Frame] = []
+        self.active: set[int] = set()
+        self.tracing = not tracemalloc.is_tracing()
+        if self.tracing:
+            tracemalloc.start()
+
+    def stop(self):
+        """Stops tracing the memory, if this interpreter started it"""
+        if self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+
+    def enter(self, stats: ProfileStats):
+        stats.runs += 1
+        current, peak = tracemalloc.get_traced_memory()
+        if self.frames:
+            # The peak is reset for this frame: keep the one of the parent
+            parent = self.frames[-1]
+            parent.peak_mem = max(parent.peak_mem, peak)
+        tracemalloc.reset_peak()
+        outermost = id(stats) not in self.active
+        self.active.add(id(stats))
+        self.frames.append(_Frame(stats, outermost, current))
+
+    def exit(self):
+        frame = self.frames.pop()
+        current, peak = tracemalloc.get_traced_memory()
+        frame.peak_mem = max(frame.peak_mem, peak)
+        if self.frames:
+            parent = self.frames[-1]
+            parent.peak_mem = max(parent.peak_mem, frame.peak_mem)
+        if not frame.outermost:
+            return
+        self.active.discard(id(frame.stats))
+        stats = frame.stats
+        stats.seconds += time.perf_counter() - frame.start
+        stats.alloc_bytes += current - frame.start_mem
+        stats.peak_bytes = max(stats.peak_bytes, frame.peak_mem - frame.start_mem)
+
+    def record(self, bds: Bounds | None, calc_bounds: bool):
+        size = 0 if bds is None else len(bds)
+        seen = set()
+        for frame in self.frames:
+            if id(frame.stats) in seen:
+                continue
+            seen.add(id(frame.stats))
+            frame.stats.calc_bounds += calc_bounds
+            frame.stats.peak_intervals = max(frame.stats.peak_intervals, size)
+
+    def calc_bounds(self, v_name: str, context: VarContext) -> Bounds | None:
+        bds = super().calc_bounds(v_name, context)
+        self.record(bds, True)
+        return bds
+
+    def eval_expr(self, expr: Expr, context: VarContext) -> Bounds | None:
+        bds = super().eval_expr(expr, context)
+        self.record(bds, False)
+        return bds
+
+    def evaluate_func(
+        self, func: FunctionData, args: tuple[Expr, ...], context: VarContext
+    ) -> Bounds | None:
+        if func.is_builtin:
+            return super().evaluate_func(func, args, context)
+        self.enter(self.fn_stats.setdefault(func.name, ProfileStats()))
+        try:
+            return super().evaluate_func(func, args, context)
+        finally:
+            self.exit()
+
+    def exec_program(
+        self, program: Iterable[Statement], program_data: ProgramData | None = None
+    ):
+        for stmt in program:
+            if self.context_stack and is_skipped(stmt, self.context_stack[-1]):
+                continue
+            self.enter(self.lines.setdefault((stmt.line_num, str(stmt)), ProfileStats()))
+            try:
+                super().exec_program((stmt,), program_data)
+            finally:
+                self.exit()
+            if isinstance(stmt, Return):
+                return
+
+    def to_dict(self) -> dict:
+        return {
+            'lines': [
+                {'line': line_num, 'source': source, **asdict(stats)}
+                for (line_num, source), stats in sorted(self.lines.items())
+            ],
+            'functions': [
+                {'name': name, **asdict(stats)} for name, stats in self.fn_stats.items()
+            ],
+        }
+
+    def write_json(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+            f.write('\n')
+
+    def print_report(self, rows: int = REPORT_ROWS):
+        """Prints the lines and the functions taking the most time"""
+        header = (
+            f'{"time":>10} {"runs":>6} {"calc_bds":>9} {"max_itv":>8} {"alloc":>9} {"peak":>9}'
+        )
+
+        self.print(c.YELLOW('profile, lines (inclusive):'))
+        self.print(f'{header}  line')
+        hot_lines = sorted(self.lines.items(), key=lambda item: -item[1].seconds)[:rows]
+        for (line_num, source), stats in hot_lines:
+            self.print(f'{format_stats(stats)}  {line_num:03} {c.FAINT(source)}')
+
+        if self.fn_stats:
+            self.print(c.YELLOW('profile, functions (inclusive):'))
+            self.print(f'{header}  function')
+            hot_fns = sorted(self.fn_stats.items(), key=lambda item: -item[1].seconds)[:rows]
+            for name, stats in hot_fns:
+                self.print(f'{format_stats(stats)}  {c.GREEN(name)}')
+
+
+def format_bytes(size: int) -> str:
+    for unit in ('B', 'KiB', 'MiB'):
+        if abs(size) < 1024:
+            return f'{size:.0f}{unit}' if unit == 'B' else f'{size:.1f}{unit}'
+        size /= 1024
+    return f'{size:.1f}GiB'
+
+
+def format_stats(stats: ProfileStats) -> str:
+    return (
+        f'{stats.seconds * 1000:>8.3f}ms {stats.runs:>6} {stats.calc_bounds:>9} '
+        f'{stats.peak_intervals:>8} {format_bytes(stats.alloc_bytes):>9} '
+        f'{format_bytes(stats.peak_bytes):>9}'
+    )
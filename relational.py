@@ -0,0 +1,216 @@
+"""
+Relational domain: difference-bound matrices (DBMs).
+
+Bounds alone forget how variables relate: after `?? x > y` each of them is
+narrowed, but not the fact that `x` is the bigger one. A DBM over the
+variables `v_1..v_n` (`v_0` standing for the constant 0) holds an upper
+bound of each difference `v_i - v_j`, strict or not. Conditions between
+variables or with a number are single entries; the shortest-path closure
+(Floyd–Warshall) derives all the others, and the bounds of each variable are
+read back from its entries with `v_0`.
+
+DBMs are built from the bounds of the variables when a condition splits the
+context, and only project back to `Bounds`: these stay the state of every
+variable. The closure runs with NumPy when it is installed and the matrix is
+large enough, in pure Python otherwise.
+"""
+
+from dataclasses import dataclass
+from math import inf
+from typing import Iterable
+
+from bdsl_ir import BinOp, Expr, Num, Var
+from bounds import Bounds, IntervalPoint, IntOrFloat
+from configuration import DBM_NUMPY_MIN_VARS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # pylint: disable=invalid-name
+
+HAS_NUMPY = np is not None
+
+# Name of `v_0`, the constant 0 (not a valid variable name)
+ZERO = ''
+
+
+@dataclass(frozen=True, slots=True)
+class Difference:
+    """`lhs - rhs <= bound` (`<` if strict). `ZERO` stands for the constant 0"""
+
+    lhs: str
+    rhs: str
+    bound: IntOrFloat
+    strict: bool = False
+
+    def __str__(self) -> str:
+        return f'{self.lhs or 0} - {self.rhs or 0} {'<' if self.strict else '<='} {self.bound}'
+
+
+def less(lhs: IntOrFloat | str, rhs: IntOrFloat | str, strict: bool) -> Difference:
+    """`lhs < rhs` (or `<=`), each side being a variable or a number"""
+    lhs_name, lhs_val = (lhs, 0) if isinstance(lhs, str) else (ZERO, lhs)
+    rhs_name, rhs_val = (rhs, 0) if isinstance(rhs, str) else (ZERO, rhs)
+    return Difference(lhs_name, rhs_name, rhs_val - lhs_val, strict)
+
+
+def condition_differences(
+    lhs: IntOrFloat | str, cond: str, rhs: IntOrFloat | str
+) -> tuple[list[Difference], list[Difference]]:
+    """
+    Differences holding where `lhs cond rhs` holds and where it does not.
+    The complement of `==` is not convex: nothing is known there.
+    """
+    match cond:
+        case '<':
+            return [less(lhs, rhs, True)], [less(rhs, lhs, False)]
+        case '<=':
+            return [less(lhs, rhs, False)], [less(rhs, lhs, True)]
+        case '>':
+            return [less(rhs, lhs, True)], [less(lhs, rhs, False)]
+        case '>=':
+            return [less(rhs, lhs, False)], [less(lhs, rhs, True)]
+        case '==':
+            return [less(lhs, rhs, False), less(rhs, lhs, False)], []
+    assert False, f'Operator "{cond}" not implemented'
+
+
+def alias_differences(name: str, expr: Expr | None) -> list[Difference]:
+    """
+    Differences a variable holding `y`, `y + c` or `y - c` keeps with `y`
+    (expressions are lazy: they hold whatever `y` becomes).
+    """
+    match expr:
+        case Var(name=other):
+            offset = 0
+        case BinOp(op='+', lhs=Var(name=other), rhs=Num(value=offset)) | BinOp(
+            op='+', lhs=Num(value=offset), rhs=Var(name=other)
+        ):
+            pass
+        case BinOp(op='-', lhs=Var(name=other), rhs=Num(value=value)):
+            offset = -value
+        case _:
+            return []
+    return [Difference(name, other, offset), Difference(other, name, -offset)]
+
+
+class DBM:
+    """
+    Upper bounds of the differences between variables: `weights[i][j]`
+    bounds `v_i - v_j` (`inf` if unknown), strictly if `strict[i][j]`.
+    """
+
+    __slots__ = ('index', 'weights', 'strict')
+
+    def __init__(self, names: Iterable[str]) -> None:
+        self.index = {ZERO: 0}
+        for name in names:
+            self.index.setdefault(name, len(self.index))
+        size = len(self.index)
+        self.weights: list[list[IntOrFloat]] = [
+            [0 if i == j else inf for j in range(size)] for i in range(size)
+        ]
+        self.strict: list[list[bool]] = [[False] * size for _ in range(size)]
+
+    def __len__(self) -> int:
+        """Number of variables"""
+        return len(self.index) - 1
+
+    def copy(self) -> 'DBM':
+        res = DBM.__new__(DBM)
+        res.index = self.index
+        res.weights = [row.copy() for row in self.weights]
+        res.strict = [row.copy() for row in self.strict]
+        return res
+
+    def add(self, diff: Difference) -> 'DBM':
+        """Adds a constraint, in place"""
+        i, j = self.index[diff.lhs], self.index[diff.rhs]
+        weight = self.weights[i][j]
+        if diff.bound < weight or (diff.bound == weight and diff.strict):
+            self.weights[i][j] = diff.bound
+            self.strict[i][j] = diff.strict
+        return self
+
+    def add_bounds(self, name: str, bounds: Bounds) -> 'DBM':
+        """Adds the hull of a variable's bounds, in place"""
+        if len(bounds) == 0:
+            # No value: `v - v < 0`, a negative cycle
+            return self.add(Difference(name, name, 0, True))
+        intervals = bounds.get_bounds()
+        lo, hi = intervals[0][0], intervals[-1][1]
+        if lo is not None:
+            self.add(less(lo.value, name, not lo.is_included))
+        if hi is not None:
+            self.add(less(name, hi.value, not hi.is_included))
+        return self
+
+    def close(self) -> 'DBM':
+        """Shortest-path closure, in place: every bound is as tight as the others allow"""
+        if HAS_NUMPY and len(self) >= DBM_NUMPY_MIN_VARS:
+            self.weights, self.strict = _close_numpy(self.weights, self.strict)
+        else:
+            _close_python(self.weights, self.strict)
+        return self
+
+    def is_empty(self) -> bool:
+        """Whether the constraints contradict each other (a closed DBM has a negative cycle)"""
+        return any(
+            self.weights[i][i] < 0 or (self.weights[i][i] == 0 and self.strict[i][i])
+            for i in range(len(self.index))
+        )
+
+    def narrow(self, name: str, bounds: Bounds) -> Bounds:
+        """The bounds of a variable, narrowed to the ones of the (closed) DBM"""
+        i = self.index[name]
+        hi, hi_strict = self.weights[i][0], self.strict[i][0]
+        lo, lo_strict = self.weights[0][i], self.strict[0][i]
+        if self.is_empty():
+            # Empty: `(0, 0)` has no points
+            lo, lo_strict, hi, hi_strict = 0, True, 0, True
+        return bounds.copy().intersect_interval(
+            (
+                None if lo == inf else IntervalPoint(_exact(-lo), not lo_strict),
+                None if hi == inf else IntervalPoint(_exact(hi), not hi_strict),
+            )
+        )
+
+
+def _exact(value: IntOrFloat) -> IntOrFloat:
+    """Back to an int, for the values the NumPy closure made floats"""
+    if isinstance(value, float) and value.is_integer() and abs(value) < 2**53:
+        return int(value)
+    return value
+
+
+def _close_python(weights: list[list[IntOrFloat]], strict: list[list[bool]]):
+    size = len(weights)
+    for k in range(size):
+        row_k, strict_k = weights[k], strict[k]
+        for i in range(size):
+            w_ik = weights[i][k]
+            if w_ik == inf:
+                continue
+            row_i, strict_i, s_ik = weights[i], strict[i], strict[i][k]
+            for j in range(size):
+                weight = w_ik + row_k[j]
+                if weight < row_i[j] or (
+                    weight == row_i[j] < inf and (s_ik or strict_k[j]) and not strict_i[j]
+                ):
+                    row_i[j] = weight
+                    strict_i[j] = s_ik or strict_k[j]
+
+
+def _close_numpy(
+    weights: list[list[IntOrFloat]], strict: list[list[bool]]
+) -> tuple[list[list[IntOrFloat]], list[list[bool]]]:
+    """Floyd–Warshall over whole rows: one vectorized relaxation per intermediate variable"""
+    w = np.array(weights, dtype=np.float64)
+    s = np.array(strict, dtype=bool)
+    for k in range(len(w)):
+        cand = w[:, k, None] + w[None, k, :]
+        cand_s = s[:, k, None] | s[None, k, :]
+        better = (cand < w) | ((cand == w) & (cand < np.inf) & cand_s & ~s)
+        np.copyto(w, cand, where=better)
+        np.copyto(s, cand_s, where=better)
+    return [[_exact(val) for val in row] for row in w.tolist()], s.tolist()
@@ -0,0 +1,186 @@
+"""
+Analysis server: answers many analyses from one long-running process.
+
+Listens on a Unix socket (`--socket PATH`) or on stdin/stdout, speaking
+newline delimited JSON. Each request is one object on one line:
+
+    {"id": 1, "source": "x 0..10\\nx?\\n", "options": {"optimize": true},
+     "libraries": ["math"]}
+    {"id": 2, "op": "register", "library": "math", "source": "fn f(a)\\n..."}
+
+and gets one reply line with the same `id`: the `AnalysisResult` fields
+for analyses (see `analysis.AnalysisResult.to_dict`), `{"ok": true}` for
+registrations, or `{"ok": false, "error": ...}` for malformed requests (or
+unexpected failures).
+
+Registered libraries hold function definitions, parsed once and shared by
+all clients: an analysis listing them runs them before its source.
+Analyses run on a pool of worker threads (`-j`), so replies can come out
+of order, and slow analyses do not hold back the fast ones.
+"""
+
+import asyncio
+import copy
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable
+
+from analysis import analyze
+from bdsl import Opts
+from bdsl_ir import FnDef, Program
+from bdsl_parser import parse_program
+
+# Options a request can set, over the ones the server was started with
+REQUEST_OPTIONS = {'optimize': bool, 'max_fragments': int, 'fn_cache_size': int}
+# Longest request line, sources included
+MAX_REQUEST_SIZE = 64 * 1024 * 1024
+
+type Writer = Callable[[bytes], Awaitable[None]]
+
+
+class RequestError(Exception):
+    """A request that cannot be served"""
+
+
+class AnalysisServer:
+    """Serves analysis requests, keeping the registered libraries"""
+
+    def __init__(self, opts: Opts, jobs: int) -> None:
+        self.opts = opts
+        self.libraries: dict[str, Program] = {}
+        self.executor = ThreadPoolExecutor(max_workers=jobs)
+
+    def request_opts(self, options: dict[str, Any]) -> Opts:
+        opts = copy.copy(self.opts)
+        for name, value in options.items():
+            if name not in REQUEST_OPTIONS:
+                raise RequestError(f'Unknown option: {name}')
+            # bool is an int, but not a valid count
+            if type(value) is not REQUEST_OPTIONS[name]:
+                raise RequestError(f'Option {name} must be {REQUEST_OPTIONS[name].__name__}')
+            setattr(opts, name, value)
+        return opts
+
+    def register(self, request: dict[str, Any]) -> dict[str, Any]:
+        name = request.get('library')
+        if not isinstance(name, str):
+            raise RequestError('Missing library name')
+        try:
+            program = parse_program(str(request.get('source', '')).splitlines(keepends=True))
+        except AssertionError as e:
+            raise RequestError(f'Library {name}: {e}') from e
+        if not all(isinstance(stmt, FnDef) for stmt in program):
+            raise RequestError(f'Library {name} must only define functions')
+        self.libraries[name] = program
+        return {'ok': True}
+
+    async def analyze(self, request: dict[str, Any]) -> dict[str, Any]:
+        source = request.get('source')
+        if not isinstance(source, str):
+            raise RequestError('Missing source')
+        options = request.get('options', {})
+        if not isinstance(options, dict):
+            raise RequestError('Options must be an object')
+        opts = self.request_opts(options)
+        names = request.get('libraries', [])
+        if not isinstance(names, list):
+            raise RequestError('Libraries must be a list of names')
+        missing = [str(name) for name in names if name not in self.libraries]
+        if missing:
+            raise RequestError(f'Unknown libraries: {', '.join(missing)}')
+        prelude = [self.libraries[name] for name in names]
+
+        loop = asyncio.get_running_loop()
+        filename = request.get('filename', '<request>')
+        result = await loop.run_in_executor(
+            self.executor, analyze, source, opts, filename, prelude
+        )
+        return result.to_dict()
+
+    async def handle(self, line: bytes) -> dict[str, Any]:
+        """Reply to one request line"""
+        request_id = None
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                raise RequestError(f'Invalid JSON: {e}') from e
+            if not isinstance(request, dict):
+                raise RequestError('Requests must be objects')
+            request_id = request.get('id')
+            match request.get('op', 'analyze'):
+                case 'analyze':
+                    reply = await self.analyze(request)
+                case 'register':
+                    reply = self.register(request)
+                case op:
+                    raise RequestError(f'Unknown op: {op}')
+        except RequestError as e:
+            reply = {'ok': False, 'error': str(e)}
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # The request must still get its reply, or its client waits forever
+            reply = {'ok': False, 'error': f'{type(e).__name__}: {e}'}
+        return {'id': request_id, **reply}
+
+    async def serve_stream(self, reader: asyncio.StreamReader, write: Writer):
+        """Serves the requests of one client until it closes its side"""
+        pending: set[asyncio.Task] = set()
+
+        async def reply(line: bytes):
+            response = await self.handle(line)
+            await write(json.dumps(response).encode() + b'\n')
+
+        while line := await reader.readline():
+            if not line.strip():
+                continue
+            task = asyncio.create_task(reply(line))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.wait(pending)
+
+    async def serve_unix(self, path: str):
+        async def client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            async def write(data: bytes):
+                writer.write(data)
+                await writer.drain()
+
+            try:
+                await self.serve_stream(reader, write)
+            finally:
+                writer.close()
+
+        server = await asyncio.start_unix_server(client, path=path, limit=MAX_REQUEST_SIZE)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            os.unlink(path)
+
+    async def serve_stdio(self):
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=MAX_REQUEST_SIZE)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+        async def write(data: bytes):
+            sys.stdout.buffer.write(data)
+            sys.stdout.buffer.flush()
+
+        await self.serve_stream(reader, write)
+
+
+def main(opts: Opts) -> int:
+    """Runs the server until stdin is closed (or forever on a socket)"""
+    server = AnalysisServer(opts, opts.jobs or os.cpu_count() or 1)
+    try:
+        if opts.socket is not None:
+            asyncio.run(server.serve_unix(opts.socket))
+        else:
+            asyncio.run(server.serve_stdio())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.executor.shutdown(cancel_futures=True)
+    return 0
@@ -0,0 +1,56 @@
+from accelerate import Update, affine_updates, linear_form, power_sums, scale_bounds
+from bdsl_ir import BinOp, Num, Var
+from bdsl_parser import parse_expr, parse_program
+from bounds import Bounds
+from lexer import tokenize
+
+
+def expr(code: str):
+    return parse_expr(tokenize(code))
+
+
+def body(code: str):
+    return parse_program(code.splitlines(keepends=True))
+
+
+def test_linear_form():
+    """Test expressions are split in `a * name + rest`"""
+    assert linear_form(expr('s'), 's') == (1, None)
+    assert linear_form(expr('s * 2 + 1'), 's') == (2, Num(1))
+    assert linear_form(expr('3 - s / 2'), 's') == (-0.5, Num(3))
+    assert linear_form(expr('s * 2 + x * 2'), 's') == (2, BinOp('*', Var('x'), Num(2)))
+    assert linear_form(expr('x + 1'), 's') == (0, expr('x + 1'))
+    assert linear_form(expr('s * s'), 's') is None
+    assert linear_form(expr('sqrt(s)'), 's') is None
+
+
+def test_affine_updates():
+    """Test loop bodies split in per-iteration variables and affine updates"""
+    stmts, updates = affine_updates(body('d = i * 2\ns! = s + d\np! = p * 3\n'), set())
+
+    assert [stmt.name for stmt in stmts] == ['d']
+    # `d` is replaced by its expression of the loop variable
+    assert updates == [Update('s', 1, BinOp('*', Var('i'), Num(2))), Update('p', 3, None)]
+
+    assert affine_updates(body('s! = s * s\n'), set()) is None
+    # Accumulators cannot read each other
+    assert affine_updates(body('s! = s + p\np! = p + 1\n'), set()) is None
+    assert affine_updates(body('s! = s + 1\ns?\n'), set()) is None
+    assert affine_updates(body('s! = s + f(i)\n'), set()) is None
+    assert affine_updates(body('s! = s + sqrt(i)\n'), {'sqrt'}) is not None
+
+
+def test_power_sums():
+    assert power_sums(2, 4) == (1 + 4, 2 + 8)
+    assert power_sums(-1, 5) == (3, -2)
+    assert power_sums(0.5, 3) == (1.25, 0.5)
+
+
+def test_scale_bounds():
+    """Test negative factors swap the ends, unbounded ones included"""
+    bds = Bounds.from_num_tuples(((0, 10),))
+    assert str(scale_bounds(bds, -2)) == '[-20, 0]'
+    assert str(scale_bounds(bds, 0)) == '[0, 0]'
+
+    bds = Bounds.from_num_tuples(((1, None),))
+    assert str(scale_bounds(bds, -1)) == '(None, -1]'
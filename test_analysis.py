@@ -0,0 +1,63 @@
+import json
+
+from analysis import analyze
+
+
+def test_analyze_bounds_and_queries(capsys):
+    """Test results are returned as data, with nothing printed"""
+    result = analyze('x .0..10.\ny = x + 1\ny?\n?v\n')
+
+    assert result.ok
+    assert {name: str(bds) for name, bds in result.bounds.items()} == {
+        'x': '[0, 10]',
+        'y': '[1, 11]',
+    }
+    assert [(q.line, q.varname, str(q.bounds)) for q in result.queries] == [(3, 'y', '[1, 11]')]
+    assert capsys.readouterr().out == ''
+
+
+def test_analyze_diagnostics():
+    """Test errors become diagnostics, keeping the results before them"""
+    result = analyze('x 0..1\nx?\nz?\ny 0..1\n')
+
+    assert not result.ok
+    [diag] = result.diagnostics
+    assert (diag.kind, diag.message, diag.line, diag.cols) == (
+        'VariableNotDefinedError',
+        'VariableNotDefinedError: z',
+        3,
+        (1, 2),
+    )
+    assert '\033' not in diag.message
+    assert [q.varname for q in result.queries] == ['x']
+    assert list(result.bounds) == ['x']
+
+
+def test_analyze_assertion_diagnostics():
+    """Test failed checks and parse errors are located on their line"""
+    redeclared = analyze('x 0..1\n\nx 0..2\n')
+    assert [(d.kind, d.line) for d in redeclared.diagnostics] == [('AssertionError', 3)]
+
+    unclosed = analyze('x 0..1\nfn f(a)\n    << a\n')
+    assert [(d.kind, d.line) for d in unclosed.diagnostics] == [('AssertionError', 3)]
+
+
+def test_analyze_unexpected_errors():
+    """Test any error raised while running becomes a diagnostic on its line"""
+    cases = [
+        # Raised in the function body, on its line
+        ('fn f(a)\n    << b\n--\nx 0..1\ny = f(x)\ny?\n', 'KeyError', 2),
+        ('x 0..1\n>>\n', 'IndexError', 2),
+    ]
+    for source, kind, line in cases:
+        result = analyze(source)
+        assert [(d.kind, d.line) for d in result.diagnostics] == [(kind, line)]
+
+
+def test_analysis_result_json():
+    """Test results serialize to JSON"""
+    data = json.loads(json.dumps(analyze('x 0..10\ny = x * 2\ny?\n').to_dict()))
+
+    assert data['ok']
+    assert data['bounds']['y'] == {'text': '(0, 20)', 'intervals': [[0, False, 20, False]]}
+    assert data['queries'] == [{'line': 3, 'var': 'y', 'bounds': data['bounds']['y']}]
@@ -0,0 +1,485 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import bdsl
+from bdsl_types import ProgramData
+
+
+@pytest.fixture
+def interp():
+    return bdsl.Interpreter()
+
+
+def run(interp: bdsl.Interpreter, code: str):
+    interp.exec_code(code.splitlines(keepends=True), ProgramData('<test>'))
+    return interp.context_stack[-1]
+
+
+def bounds_of(interp: bdsl.Interpreter, name: str):
+    return interp.calc_bounds(name, interp.context_stack[-1])
+
+
+def test_bounds_cache(interp):
+    """Test repeated lookups hit the cache and reassignments invalidate downstream"""
+
+    ctx = run(interp, 'x .0..10.\ny = x + 1\nz = y * 2\nw = x - 1\n')
+
+    assert str(bounds_of(interp, 'z')) == '[2, 22]'
+    assert interp.stats.bounds_cache_misses == 2
+    assert str(bounds_of(interp, 'z')) == '[2, 22]'
+    assert interp.stats.bounds_cache_hits == 1
+
+    bounds_of(interp, 'w')
+    assert set(ctx.bounds_cache) == {'y', 'z', 'w'}
+
+    run(interp, 'y! = x - 1\n')
+    assert set(ctx.bounds_cache) == {'w'}
+    assert str(bounds_of(interp, 'z')) == '[-2, 18]'
+
+
+def test_function_cache(interp, capsys):
+    """Test user function results are memoized only for pure bodies"""
+
+    run(interp, 
+        """
+fn twice(a)
+    r = a * 2
+    << r
+--
+fn noisy(a)
+    a?
+    << a
+--
+x 0..10
+y 0..10
+a = twice(x)
+b = twice(y)
+c = noisy(x)
+d = noisy(y)
+"""
+    )
+    for name in 'abcd':
+        bounds_of(interp, name)
+
+    assert interp.fn_cache.hits == 1
+    assert interp.fn_cache.misses == 1
+    assert len(interp.fn_cache) == 1
+    # noisy is never memoized: both calls print
+    assert len(capsys.readouterr().out.splitlines()) == 2
+
+
+def test_function_cache_loop_bodies(interp):
+    """Test functions printing or calling user functions in a loop are not memoized"""
+    code = """
+fn noisy(a)
+    i .0..0.
+    while i < 2
+        i! = i + 1
+        i?
+    --
+    << a
+--
+fn twice(a)
+    r = a
+    for i .0..1
+        r! = g(r)
+    --
+    << r
+--
+"""
+    run(interp, code)
+    assert not interp.functions['noisy'].is_pure(interp.functions)
+    assert interp.functions['twice'].calls == {'g'}
+    assert not interp.functions['twice'].is_pure(interp.functions)
+
+
+def test_redefined_function_called_indirectly():
+    """Test redefining a function recomputes the expressions calling it through others"""
+    for size in (0, 128):
+        opts = bdsl.Opts()
+        opts.fn_cache_size = size
+        out = io.StringIO()
+        interp = bdsl.Interpreter(opts, out=out)
+        run(
+            interp,
+            """
+fn g(a)
+    b = a * 2
+    << b
+--
+fn f(a)
+    c = g(a)
+    << c
+--
+x .0..10.
+y = f(x)
+y?
+fn g(a)
+    b = a * 3
+    << b
+--
+y?
+""",
+        )
+        lines = out.getvalue().splitlines()
+        assert lines[0].endswith('[0, 20]') and lines[1].endswith('[0, 30]')
+
+
+def test_function_cache_eviction():
+    """Test least recently used results are evicted"""
+
+    opts = bdsl.Opts()
+    opts.fn_cache_size = 2
+    interp = bdsl.Interpreter(opts)
+    run(interp, 'fn inc(a)\n    r = a + 1\n    << r\n--\n')
+    for lo in range(4):
+        run(interp, f'x{lo} {lo}..10\ny{lo} = inc(x{lo})\n')
+        bounds_of(interp, f'y{lo}')
+
+    assert len(interp.fn_cache) == 2
+    assert interp.fn_cache.evictions == 2
+
+
+def test_branches_are_overlays(interp):
+    """Test if/else only store and merge the variables they change"""
+
+    decls = ''.join(f'v{i} {i}..{i + 1}\n' for i in range(100))
+    run(interp, decls + 'x .0..10.\n?? x > 5\n    y = 1\n>>\n    y = 2\n')
+
+    then_ctx = interp.other_context_stack[-1]
+    else_ctx = interp.context_stack[-1]
+    assert set(then_ctx.local) == {'x', 'y'}
+    assert set(else_ctx.local) == {'x', 'y'}
+    assert then_ctx.parent is else_ctx.parent
+
+    ctx = run(interp, '--\n')
+    assert ctx.parent is not None
+    assert str(bounds_of(interp, 'y')) == '[1, 1] ∪ [2, 2]'
+    assert str(bounds_of(interp, 'v3')) == '(3, 4)'
+
+
+def test_nested_if_in_else(interp):
+    """Test merging an if block nested in an else branch"""
+
+    run(interp, 
+        """
+x .0..10.
+?? x >= 5
+    w = 3
+>>
+    ?? x >= 2
+        w = 4
+    >>
+        w = 5
+    --
+--
+"""
+    )
+    assert str(bounds_of(interp, 'w')) == '[3, 3] ∪ [4, 4] ∪ [5, 5]'
+
+
+def test_unreachable_branch():
+    """Test a branch whose condition never holds is not run, nested conditions included"""
+    out = io.StringIO()
+    interp = bdsl.Interpreter(out=out)
+    code = """
+x .0..5.
+y = x + 1
+?? x > 10
+    x?
+    y?
+    z = 3
+    ?? y > 3
+        w = 1
+    --
+>>
+    z = 4
+--
+"""
+    run(interp, code)
+
+    assert out.getvalue() == ''
+    assert str(bounds_of(interp, 'x')) == '[0, 5]'
+    assert str(bounds_of(interp, 'z')) == '[4, 4]'
+    assert 'w' not in interp.context_stack[-1]
+
+
+def test_fragment_budget(interp):
+    """Test bounds past the fragment budget are widened on their smallest gaps"""
+    code = """
+x .0..1. ;; [0, 1]
+?? x > 0.5
+    a = 10
+>>
+    a = 20
+--
+b = a + a
+c = b * a
+"""
+    run(interp, code)
+    assert str(bounds_of(interp, 'c')) == '[200, 200] ∪ [300, 300] ∪ [400, 400] ∪ [600, 600] ∪ [800, 800]'
+    assert interp.stats.widenings == 0
+
+    opts = bdsl.Opts()
+    opts.max_fragments = 3
+    interp = bdsl.Interpreter(opts)
+    run(interp, code)
+    assert str(bounds_of(interp, 'c')) == '[200, 400] ∪ [600, 600] ∪ [800, 800]'
+    assert interp.stats.widenings == 1
+
+
+def test_optimized_run_matches():
+    """Test the optimizer does not change any bounds"""
+    code = """
+x 0..10
+y -2..3
+a = x + y
+b = a
+c = x + y - 2 * 3
+d = c * b + c * b
+?? x > 5
+    e = b + 1
+>>
+    e = x + y
+--
+f = e - a
+"""
+    results = []
+    for optimize in (False, True):
+        opts = bdsl.Opts()
+        opts.optimize = optimize
+        interp = bdsl.Interpreter(opts)
+        ctx = run(interp, code)
+        results.append({name: str(bounds_of(interp, name)) for name in ctx})
+    assert results[0] == results[1]
+
+
+def test_concurrent_interpreters():
+    """Test interpreters running in a thread pool do not share any state"""
+
+    def analyze(n: int) -> str:
+        out = io.StringIO()
+        interp = bdsl.Interpreter(out=out)
+        code = f"""
+fn scale(a)
+    r = a * {n}
+    << r
+--
+x .0..{n}.
+?? x > 1
+    y = scale(x)
+>>
+    y = x - {n}
+--
+y?
+"""
+        run(interp, code)
+        return out.getvalue()
+
+    expected = [analyze(n) for n in range(2, 34)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert list(executor.map(analyze, range(2, 34))) == expected
+    assert len(set(expected)) == len(expected)
+
+
+def test_stream_answers_queries_as_lines_arrive():
+    """Test streamed statements run before the following lines are read"""
+    out = io.StringIO()
+    interp = bdsl.Interpreter(out=out)
+
+    def lines():
+        yield 'x .0..10.\n'
+        yield 'x?\n'
+        assert '[0, 10]' in out.getvalue()
+        yield '?? x > 5\n'
+        yield '    y = 1\n'
+        yield '>>\n'
+        yield '    y = 2\n'
+        yield '--\n'
+        yield 'y?\n'
+
+    interp.exec_stream(lines(), ProgramData('<stream>'))
+    assert out.getvalue().splitlines()[-1].endswith('[1, 1] ∪ [2, 2]')
+    assert len(interp.context_stack) == 1
+
+
+def test_self_referencing_overwrite(interp):
+    """Test `x! = x + 1` reads the previous value of `x`"""
+    run(interp, 'x .0..1.\ny = x * 2\nx! = x + 1\nx! = x * 10\n')
+
+    assert str(bounds_of(interp, 'x')) == '[10, 20]'
+    assert str(bounds_of(interp, 'y')) == '[20, 40]'
+
+
+def test_division_by_range_with_zero(interp):
+    """Test dividing by a range reaching 0 leaves the quotient unbounded"""
+    run(interp, 'j .-21..19.\nd = 100 / j\nk .0..5.\ne = 100 / k\nf = j / 0\n')
+
+    for name in ('d', 'e', 'f'):
+        assert str(bounds_of(interp, name)) == '(None, None)'
+    run(interp, 'k! 2..4\ng = 100 / k\n')
+    assert str(bounds_of(interp, 'g')) == '(25.0, 50.0)'
+
+
+def test_while_widening_and_narrowing(interp):
+    """Test loops converge, widening to the loop literals then narrowing"""
+    run(interp, 'x .0..0.\nwhile x < 100\n    x! = x + 1\n--\n')
+
+    assert str(bounds_of(interp, 'x')) == '[100, 101)'
+    assert interp.stats.loops == 1
+    assert interp.stats.loop_iterations == 6
+    assert interp.stats.loop_narrowings == 2
+
+    opts = bdsl.Opts()
+    opts.widen_thresholds = False
+    opts.narrow_passes = 0
+    interp = bdsl.Interpreter(opts)
+    run(interp, 'x .0..0.\nwhile x < 100\n    x! = x + 1\n--\n')
+    assert str(bounds_of(interp, 'x')) == '[100, None)'
+
+
+
+def test_while_body_scope(interp):
+    """Test loop bodies can declare variables, kept with their bounds after the loop"""
+    # Single points are kept apart: the bounds stay exact
+    run(
+        interp,
+        """
+x .0..0.
+while x < 3
+    d = x * 2
+    x! = x + 1
+--
+""",
+    )
+
+    assert str(bounds_of(interp, 'x')) == '[3, 3]'
+    # `d` is lazy: it reads the `x` of the end of the body
+    assert str(bounds_of(interp, 'd')) == '[2, 2] ∪ [4, 4] ∪ [6, 6]'
+
+
+def test_while_widened_to_unbounded():
+    """Test bounds widened to the whole line are kept, and body queries print once"""
+    out = io.StringIO()
+    interp = bdsl.Interpreter(out=out)
+    code = """
+y .0..0.
+z .0..0.
+while y < 100
+    y! = y + 1
+    ?? y > 30
+        z! = z - 1
+    >>
+        z! = z + 1
+    --
+    z?
+--
+"""
+    run(interp, code)
+
+    assert str(bounds_of(interp, 'z')) == '(None, None)'
+    assert out.getvalue().count('z') == 1
+    assert 'None, None' in out.getvalue()
+
+
+def test_while_never_ends(interp):
+    with pytest.raises(AssertionError, match='Loop at line 2 never ends'):
+        run(interp, 'x .0..1.\nwhile x < 5\n    x! = x * 1\n--\n')
+
+
+def test_for_unrolled(interp):
+    """Test short counted loops run once per iteration, exactly"""
+    run(interp, 's .0..0.\nfor i .0..10\n    d = i * i\n    s! = s + d\n--\n')
+
+    assert str(bounds_of(interp, 's')) == '[285, 285]'
+    assert str(bounds_of(interp, 'd')) == '[81, 81]'
+    assert str(bounds_of(interp, 'i')) == '[9, 9]'
+    assert interp.stats.loops_unrolled == 1
+
+
+def test_for_closed_form():
+    """Test affine accumulators are computed in closed form, in a time not depending on N"""
+    code = """
+s .0..0.
+q .0..1.
+for i .1..{n}.
+    d = i * 2
+    s! = s + d + 1
+    q! = q * -1 + 1
+--
+"""
+    misses = []
+    for n in (30, 10**9):
+        interp = bdsl.Interpreter()
+        run(interp, code.format(n=n))
+        assert interp.stats.loops_accelerated == 1
+        assert str(bounds_of(interp, 's')) == f'[{n * n + 2 * n}, {n * n + 2 * n}]'
+        assert str(bounds_of(interp, 'q')) == '[0, 1]'
+        assert str(bounds_of(interp, 'd')) == f'[2, {2 * n}]'
+        misses.append(interp.stats.bounds_cache_misses)
+
+    assert str(bounds_of(interp, 'i')) == '[1000000000, 1000000000]'
+    assert misses[0] == misses[1]
+
+    interp = bdsl.Interpreter()
+    run(interp, 'p .1..1.\nfor i .0..30\n    p! = p * 2\n--\n')
+    assert str(bounds_of(interp, 'p')) == '[1073741824, 1073741824]'
+    # 2^N does not fit a float: solved as a while loop instead
+    run(interp, 'for i .0..2000\n    p! = p * 2\n--\n')
+    assert interp.stats.loops_accelerated == 1
+    assert str(bounds_of(interp, 'p')).endswith(' ∪ [4294967296, None)')
+
+
+def test_for_fallback(interp):
+    """Test other loop bodies are solved like while loops"""
+    run(interp, 'u .0..0.\nfor i .0..100\n    ?? u < 50\n        u! = u + 1\n    --\n--\n')
+
+    assert interp.stats.loops_accelerated == 0
+    assert interp.stats.loops_unrolled == 0
+    assert str(bounds_of(interp, 'u')) == '[0, 0] ∪ [1, 1] ∪ [2, 99]'
+    assert str(bounds_of(interp, 'i')) == '[99, 99]'
+
+
+def test_compare_vars(interp):
+    """Test conditions between two variables narrow both, in each branch"""
+    run(interp, 'x .0..10.\ny .5..8.\n?? x > y\n')
+    assert str(bounds_of(interp, 'x')) == '(5, 10]'
+    assert str(bounds_of(interp, 'y')) == '[5, 8]'
+    run(interp, '>>\n')
+    assert str(bounds_of(interp, 'x')) == '[0, 8]'
+    run(interp, '--\n')
+
+    # `d` always exceeds `c`: the other branch never runs
+    run(interp, 'c .0..10.\nd = c + 2\n?? d > c\n>>\n')
+    assert len(bounds_of(interp, 'c')) == 0
+    run(interp, '--\n')
+
+    run(interp, 'i .0..0.\nn .5..20.\nwhile i < n\n    i! = i + 1\n--\n')
+    assert str(bounds_of(interp, 'i')) == '[5, 21)'
+
+
+def test_relational():
+    """Test `--relational` keeps the differences learnt, across merges"""
+    code = """
+a .0..10.
+b .0..10.
+?? a > b
+    ?? a > 3
+    --
+    ?? b > 5
+"""
+    interp = bdsl.Interpreter()
+    run(interp, code)
+    assert str(bounds_of(interp, 'a')) == '(0, 10]'
+
+    opts = bdsl.Opts()
+    opts.relational = True
+    interp = bdsl.Interpreter(opts)
+    run(interp, code)
+    assert str(bounds_of(interp, 'a')) == '(5, 10]'
+
+    # Setting a variable again drops its differences
+    run(interp, '--\nb! = b - 5\n?? b > 4\n')
+    assert str(bounds_of(interp, 'a')) == '(0, 10]'
@@ -0,0 +1,44 @@
+import pytest
+
+from analysis import analyze
+from benchmarks.generator import generate_program
+from benchmarks.runner import Series, compare
+
+
+@pytest.mark.parametrize(
+    'features',
+    [
+        {'variables': 1},
+        {'variables': 3, 'chain_depth': 20},
+        {'variables': 2, 'if_depth': 6},
+        {'variables': 4, 'calls': 9},
+        {'variables': 5, 'chain_depth': 5, 'if_depth': 3, 'calls': 5},
+    ],
+)
+def test_generated_programs_run(features):
+    """Test every generated program runs, answering all its queries"""
+    result = analyze(generate_program(**features))
+
+    assert result.ok, result.diagnostics
+    assert all(query.bounds is not None for query in result.queries)
+    parts = ('chain_depth', 'if_depth', 'calls')
+    assert len(result.queries) == 1 + sum(features.get(part, 0) > 0 for part in parts)
+
+
+def test_series_slope():
+    assert Series('linear', [10, 20, 40], [1.0, 2.0, 4.0]).slope == pytest.approx(1)
+    assert Series('square', [10, 20, 40], [1.0, 4.0, 16.0]).slope == pytest.approx(2)
+
+
+def test_compare_finds_regressions():
+    baseline = {'series': {'a': Series('a', [10, 20], [1.0, 2.0]).to_dict()}}
+    same = {'series': {'a': Series('a', [10, 20], [1.1, 2.1]).to_dict()}}
+    slower = {'series': {'a': Series('a', [10, 20], [1.0, 4.0]).to_dict()}}
+    new = {'series': {'b': Series('b', [10, 20], [9.0, 99.0]).to_dict()}}
+
+    assert not compare(baseline, same)
+    assert compare(baseline, slower) == [
+        'a[20]: 4s vs 2s (2.00x)',
+        'a: scales as size^2.00 vs size^1.00',
+    ]
+    assert not compare(baseline, new)
@@ -253,3 +253,94 @@ def test_union_with_points():
     ).union_interval(
         I(IP(0, False), IP(5))
     ) == Bounds(((IP(0), IP(5)),))
+
+
+def test_copy_is_independent():
+    b = Bounds.from_num_tuples(((None, 1), (2, 3)))
+    c = b.copy()
+    c.union_interval(tup2interval((1, 2)))
+
+    assert b.get_bounds() == ((None, 1), (2, 3))
+    assert c.get_bounds() == ((None, 3),)
+
+
+def test_invert_flips_points():
+    b = Bounds((I(IP(0), IP(1, False)), I(IP(2.5, False), IP(3))))
+    assert b.copy().invert() == Bounds(
+        (I(None, IP(0, False)), I(IP(1), IP(2.5)), I(IP(3, False), None))
+    )
+    assert b.copy().invert().invert() == b
+
+    assert str(Bounds.from_num_tuples(((1, 2),))) == '[1, 2]'
+    assert str(Bounds.from_num_tuples(((1.0, 2.5),))) == '[1.0, 2.5]'
+    assert Bounds.from_num_tuples(((None, None),)).is_unbounded()
+
+
+def test_union_many():
+    """Test k-way union gives the canonical form"""
+    res = Bounds.union_many(
+        [
+            I(IP(5), IP(6, False)),
+            Bounds.from_num_tuples(((None, 0), (1, 2)), False),
+            I(IP(2), IP(3)),
+            I(IP(0, False), IP(0, False)),
+            I(IP(6), IP(6)),
+            I(IP(-1), IP(-0.5)),
+        ]
+    )
+    assert res == Bounds(
+        (
+            I(None, IP(0, False)),
+            I(IP(1, False), IP(3)),
+            I(IP(5), IP(6)),
+        )
+    )
+    assert str(res) == '(None, 0) ∪ (1, 3] ∪ [5, 6]'
+
+    # Mixed endpoints keep their inclusion
+    assert str(
+        Bounds.union_many([I(IP(-205, False), IP(-20, False)), I(IP(-1), IP(-1))])
+    ) == '(-205, -20) ∪ [-1, -1]'
+
+    assert Bounds.union_many([I(IP(2, False), IP(2))]) is None
+    assert Bounds.union_many([]) is None
+
+
+def test_normalize():
+    b = Bounds((I(IP(0), IP(2)), I(IP(2, False), IP(3)), I(IP(4), None)))
+    assert b.normalize() == Bounds((I(IP(0), IP(3)), I(IP(4), None)))
+
+
+def test_intersection_inclusion():
+    """Test intersections at shared endpoints keep the stricter inclusion"""
+    b = Bounds.from_num_tuples(((0, 10),), False)
+
+    assert str(b.copy().intersect_interval(I(IP(5), None))) == '[5, 10)'
+    assert str(b.copy().intersect_interval(I(None, IP(5, False)))) == '(0, 5)'
+    assert str(
+        Bounds.from_num_tuples(((0, 5),)).intersect_interval(I(IP(5), IP(8)))
+    ) == '[5, 5]'
+    assert len(b.copy().intersect_interval(I(IP(10), None))) == 0
+
+
+def test_limit_fragments():
+    b = Bounds.from_num_tuples(((None, 0), (1, 2), (10, 11), (11.5, 12), (20, None)), False)
+
+    assert not b.limit_fragments(5)
+    assert b.limit_fragments(3)
+    assert str(b) == '(None, 2) ∪ (10, 12) ∪ (20, None)'
+    assert b.limit_fragments(1)
+    assert b.is_unbounded()
+
+
+def test_widen():
+    b = Bounds.from_num_tuples(((0, 1),))
+
+    assert b.widen(Bounds.from_num_tuples(((0.5, 1),))) == b
+    # Gaps are filled, ends past the old ones go to the thresholds
+    assert str(b.widen(Bounds.from_num_tuples(((3, 4),)))) == '[0, None)'
+    assert str(b.widen(Bounds.from_num_tuples(((3, 4),)), (-1, 10, 100))) == '[0, 10]'
+    assert str(b.widen(Bounds.from_num_tuples(((-2, 0),)), (-1, 10))) == '(None, 1]'
+    # Ends already at a threshold stay
+    w = b.widen(Bounds.from_num_tuples(((1, 12),)), (10, 100))
+    assert w.widen(Bounds.from_num_tuples(((50, 60),)), (10, 100)) == w
@@ -1,8 +1,12 @@
 import os
 import subprocess
 import glob
+import json
 import pytest
 
+import batch
+import bdsl
+
 
 def pytest_generate_tests(metafunc):
 
@@ -26,9 +30,16 @@ def pytest_generate_tests(metafunc):
         )
 
 
-def test_bdsl_example(bdsl_file):
+@pytest.fixture(scope='module')
+def batch_results():
+    """All the examples, analyzed in this process"""
+    bdsl_files = sorted(glob.glob(os.path.join(os.path.dirname(__file__), 'examples', '*.bdsl')))
+    results = batch.run_batch(bdsl_files, bdsl.Opts(), jobs=1)
+    return {res.filename: res for res in results}
+
+
+def test_bdsl_example(bdsl_file, batch_results):
     """Tests a .bdsl file."""
-    bounds_script = os.path.join(os.path.dirname(__file__), 'bdsl.py')
     print(f'Processing {os.path.basename(bdsl_file)}...')
     # Read first line of file
     with open(bdsl_file, 'r') as f:
@@ -38,26 +49,95 @@ def test_bdsl_example(bdsl_file):
     if first_line.startswith(';; !!!RAISES '):
         expected_exception = first_line.split('!!!RAISES ')[1]
 
-    try:
-        result = subprocess.run(
-            ['python', bounds_script, bdsl_file],
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        print(result.stdout)
+    result = batch_results[bdsl_file]
+    print(result.output)
 
+    if result.ok:
         # Fail test if exception was expected but none raised
         if expected_exception:
             pytest.fail(f'Expected {expected_exception} but script succeeded')
+        return
+
+    if not expected_exception:
+        pytest.fail(f'Unexpected error occurred: {result.error}')  # No exception expected but failed
+
+    # Verify expected exception in the error
+    assert (
+        expected_exception in result.error
+    ), f'Expected {expected_exception} not found in error output:\n{result.error}'
+
+
+def test_batch_cli():
+    """Tests all the examples in a single `bdsl.py --batch` run."""
+    bounds_script = os.path.join(os.path.dirname(__file__), 'bdsl.py')
+    examples = os.path.join(os.path.dirname(__file__), 'examples', '*.bdsl')
+    result = subprocess.run(
+        ['python', bounds_script, '--batch', '-j', '2', examples],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+    # 03_exception_example raises on purpose
+    assert result.returncode == 1
+    assert result.stdout.count('==> ') == len(glob.glob(examples))
+    assert 'VariableNotDefinedError' in result.stdout
+    assert '(1 failed)' in result.stdout
 
-    except subprocess.CalledProcessError as e:
-        if not expected_exception:
-            pytest.fail(
-                f'Unexpected error occurred: {e.stderr}'
-            )  # No exception expected but failed
 
-        # Verify expected exception in stderr
-        assert (
-            expected_exception in e.stderr
-        ), f'Expected {expected_exception} not found in error output:\n{e.stderr}'
+def test_batch_run_file(tmp_path, monkeypatch):
+    """Tests batch files run with the hooks of the options, and any error is kept per file"""
+    program = tmp_path / 'program.bdsl'
+    program.write_text('x .0..10.\ny = x * 2\ny?\n', encoding='utf-8')
+
+    opts = bdsl.Opts()
+    opts.trace = True
+    traced = batch.run_file(str(program), opts)
+    assert traced.ok
+    assert 'trace:' in traced.output and '[0, 20]' in traced.output
+
+    def fail(*_):
+        raise KeyError('x')
+
+    monkeypatch.setattr(bdsl.Interpreter, 'exec_code', fail)
+    results = batch.run_batch([str(program), str(tmp_path / 'missing.bdsl')], bdsl.Opts(), jobs=1)
+    assert [res.error for res in results] == [
+        "KeyError: 'x'",
+        f"FileNotFoundError: [Errno 2] No such file or directory: '{tmp_path / 'missing.bdsl'}'",
+    ]
+
+
+def test_batch_profile_out(tmp_path, capsys):
+    """Tests the profiles of all the batch files are written to the one JSON file"""
+    programs = []
+    for name in ('first', 'second'):
+        program = tmp_path / f'{name}.bdsl'
+        program.write_text(f'{name} .0..10.\n{name}?\n', encoding='utf-8')
+        programs.append(str(program))
+
+    opts = bdsl.Opts()
+    opts.profile = True
+    opts.profile_out = str(tmp_path / 'profile.json')
+    opts.jobs = 2
+    assert batch.main(programs, opts) == 0
+    assert '[0, 10]' in capsys.readouterr().out
+
+    with open(opts.profile_out, encoding='utf-8') as f:
+        files = json.load(f)['files']
+    assert [entry['filename'] for entry in files] == programs
+    assert [entry['lines'][0]['source'] for entry in files] == ['first .0..10.', 'second .0..10.']
+
+
+def test_stdin_cli():
+    """Tests running a program piped to `bdsl.py -`."""
+    bounds_script = os.path.join(os.path.dirname(__file__), 'bdsl.py')
+    result = subprocess.run(
+        ['python', bounds_script, '-'],
+        input='x .0..10.\ny = x * 2\ny?\n',
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+    assert result.returncode == 0
+    assert '[0, 20]' in result.stdout
@@ -0,0 +1,135 @@
+import io
+
+import bdsl
+from bdsl_types import ProgramData
+from hooks import ObservedInterpreter, Observer, Tracer
+
+CODE = """fn grow(a)
+    r = a * 2
+    << r
+--
+x .0..10.
+?? x > 5
+    y = grow(x)
+>>
+    y = 0
+--
+y?
+"""
+
+
+class Recorder(Observer):
+    def __init__(self) -> None:
+        self.events = []
+
+    def on_statement(self, stmt, context):
+        self.events.append(('stmt', stmt.line_num))
+
+    def on_assign(self, name, var, context):
+        self.events.append(('assign', name))
+
+    def on_branch_split(self, cond, taken, other):
+        self.events.append(('split', str(cond['x']), str(other['x'].bounds)))
+
+    def on_branch_merge(self, context):
+        self.events.append(('merge', 'y' in context))
+
+    def on_call_enter(self, func, args):
+        self.events.append(('enter', func.name, tuple(str(arg) for arg in args)))
+
+    def on_call_exit(self, func, result):
+        self.events.append(('exit', func.name, str(result)))
+
+    def on_bounds_computed(self, name, bounds, context):
+        self.events.append(('bounds', name, str(bounds)))
+
+
+def run(interp: bdsl.Interpreter, code: str):
+    interp.exec_code(code.splitlines(keepends=True), ProgramData('<test>'))
+
+
+def test_observer_events():
+    """Test the events of a run reach every observer, in order"""
+    recorders = [Recorder(), Recorder()]
+    interp = ObservedInterpreter(out=io.StringIO(), observers=recorders)
+    run(interp, CODE)
+
+    events = recorders[0].events
+    assert events == recorders[1].events
+    assert [e for e in events if e[0] in ('stmt', 'assign')] == [
+        ('stmt', 1),
+        ('stmt', 5),
+        ('assign', 'x'),
+        ('stmt', 6),
+        ('stmt', 7),
+        ('assign', 'y'),
+        ('stmt', 8),
+        ('stmt', 9),
+        ('assign', 'y'),
+        ('stmt', 10),
+        # Merging the branches computes the bounds of `y`, calling the function
+        ('stmt', 2),
+        ('assign', 'r'),
+        ('stmt', 3),
+        ('stmt', 11),
+    ]
+    assert ('merge', True) in events
+    enter = events.index(('enter', 'grow', ('x',)))
+    assert events[enter:].index(('exit', 'grow', '(10, 20]')) > 0
+    assert ('bounds', 'y', '[0, 0] ∪ (10, 20]') in events
+    assert interp.out.getvalue().strip().endswith('[0, 0] ∪ (10, 20]')
+
+
+def test_same_output_without_observers():
+    plain, observed = bdsl.Interpreter(out=io.StringIO()), ObservedInterpreter(out=io.StringIO())
+    run(plain, CODE)
+    run(observed, CODE)
+
+    assert plain.out.getvalue() == observed.out.getvalue()
+
+
+def test_same_output_with_unreachable_branch():
+    """Test traced and profiled runs skip the branches that never run, like plain ones"""
+    code = """fn f(a)
+    ?? a > 100
+        b = 1
+        << b
+    --
+    c = a * 2
+    << c
+--
+x .0..10.
+y = f(x)
+y?
+"""
+    outputs = []
+    for trace, profile in ((False, False), (True, False), (False, True)):
+        opts = bdsl.Opts()
+        opts.trace, opts.profile = trace, profile
+        interp = bdsl.make_interpreter(opts, io.StringIO())
+        run(interp, code)
+        outputs.append([line for line in interp.out.getvalue().splitlines() if 'trace:' not in line])
+
+    assert outputs[0] == outputs[1] == outputs[2]
+    assert outputs[0][0].endswith('[0, 20]')
+
+
+def test_make_interpreter_hook_free():
+    """Test the plain interpreter runs unless hooks are asked for"""
+    opts = bdsl.Opts()
+    assert type(bdsl.make_interpreter(opts)) is bdsl.Interpreter
+
+    opts.trace = True
+    interp = bdsl.make_interpreter(opts)
+    assert isinstance(interp, ObservedInterpreter)
+    assert [type(observer) for observer in interp.observers] == [Tracer]
+
+
+def test_tracer():
+    out = io.StringIO()
+    run(ObservedInterpreter(out=io.StringIO(), observers=[Tracer(out)]), CODE)
+    trace = out.getvalue()
+
+    assert '001 fn grow(a)' in trace
+    assert 'grow' in trace and '(10, 20]' in trace
+    assert trace.count('\n') > 20
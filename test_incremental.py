@@ -0,0 +1,100 @@
+import glob
+import os
+
+import pytest
+
+from analysis import analyze
+from bdsl_parser import parse_program
+from incremental import IncrementalAnalyzer, first_changed_line
+
+
+def summary(result):
+    return (
+        {name: str(bds) for name, bds in result.bounds.items()},
+        [(q.line, q.varname, str(q.bounds)) for q in result.queries],
+        [(d.kind, d.line) for d in result.diagnostics],
+    )
+
+
+def test_first_changed_line():
+    assert first_changed_line(('a', 'b'), ('a', 'b')) is None
+    assert first_changed_line(('a', 'b'), ('a', 'c')) == 2
+    assert first_changed_line(('a',), ('a', 'b')) == 2
+    assert first_changed_line(('a', 'b'), ()) == 1
+
+
+def test_update_resumes_after_unchanged_lines():
+    """Test an edit only re-runs the statements from the changed line"""
+    lines = [f'v{i} = v{i - 1} + 1\n' for i in range(1, 200)]
+    lines.insert(0, 'v0 .0..1.\n')
+    analyzer = IncrementalAnalyzer()
+
+    analyzer.update(lines)
+    assert analyzer.executed == 200
+
+    lines[190] = 'v190 = v189 * 2\n'
+    lines.append('v199?\n')
+    result = analyzer.update(lines)
+    assert analyzer.executed == 11
+    assert summary(result) == summary(analyze(lines))
+
+    assert analyzer.update(lines) is result
+    assert analyzer.executed == 0
+
+
+def test_update_matches_full_analysis():
+    """Test successive edits give the results of analyzing each version"""
+    versions = [
+        'x .0..10.\nfn f(a)\n    r = a * 2\n    << r\n--\ny = f(x)\ny?\n',
+        # Redefine the function after it was used
+        'x .0..10.\nfn f(a)\n    r = a * 3\n    << r\n--\ny = f(x)\ny?\n',
+        # Nested blocks, with a query inside
+        'x .0..10.\nfn f(a)\n    r = a * 3\n    << r\n--\n?? x > 5\n    y = f(x)\n    y?\n>>\n'
+        '    y = 0\n--\ny?\n',
+        # Back to an earlier version, then errors
+        'x .0..10.\nfn f(a)\n    r = a * 2\n    << r\n--\ny = f(x)\ny?\n',
+        'x .0..10.\nfn f(a)\n    r = a * 2\n    << r\n--\ny = f(z)\ny?\n',
+        'x .0..10.\nz?\nx 1..2\n',
+        # Errors that are not checks
+        'x .0..10.\nz = x / 0\nz?\n',
+        'x .0..10.\n>>\n',
+        '',
+        'x .0..10.\ny = x + 1\ny?\n',
+    ]
+    analyzer = IncrementalAnalyzer()
+    for source in versions:
+        assert summary(analyzer.update(source)) == summary(analyze(source))
+
+
+def test_update_parse_error():
+    """Test parse errors are located, keeping the results of the statements before"""
+    analyzer = IncrementalAnalyzer()
+    result = analyzer.update('x .0..10.\nfn f(a)\n    << a\n')
+
+    assert summary(result) == ({'x': '[0, 10]'}, [], [('AssertionError', 3)])
+    assert summary(analyzer.update('x .0..10.\nfn f(a)\n    << a\n--\n')) == (
+        {'x': '[0, 10]'},
+        [],
+        [],
+    )
+
+
+@pytest.mark.parametrize(
+    'bdsl_file',
+    sorted(glob.glob(os.path.join(os.path.dirname(__file__), 'examples', '*.bdsl'))),
+    ids=os.path.basename,
+)
+def test_line_by_line_edits(bdsl_file):
+    """Test typing an example one line at a time"""
+    with open(bdsl_file, 'r', encoding='utf-8') as f:
+        lines = f.readlines()
+    analyzer = IncrementalAnalyzer()
+    for end in range(1, len(lines) + 1):
+        result = summary(analyzer.update(lines[:end]))
+        expected = summary(analyze(lines[:end]))
+        try:
+            parse_program(lines[:end])
+        except AssertionError:
+            # Unclosed blocks: the analyzer keeps the results of the statements before
+            result, expected = result[2:], expected[2:]
+        assert result == expected
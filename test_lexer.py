@@ -32,3 +32,45 @@ def test_function():
     # assert rest[0] == ''
 
     line = 'fn function_name(x,y)'
+
+
+def test_tokenize_without_spaces():
+    """Operators do not need surrounding whitespace"""
+
+    toks = lx.tokenize('z = x+y*2')
+    assert [t.type for t in toks] == [
+        lx.TOKEN_VAR,
+        lx.TOKEN_ASSIGN,
+        lx.TOKEN_VAR,
+        lx.TOKEN_OP,
+        lx.TOKEN_VAR,
+        lx.TOKEN_OP,
+        lx.TOKEN_NUM,
+    ]
+    assert [t.text for t in toks] == ['z', '=', 'x', '+', 'y', '*', '2']
+    assert [t.col for t in toks] == [0, 2, 4, 5, 6, 7, 8]
+
+
+def test_tokenize_minus():
+    """A minus is a number sign only when no operand precedes it"""
+
+    toks = lx.tokenize('z! = -20 * x-1')
+    assert [t.text for t in toks] == ['z!', '=', '-20', '*', 'x', '-', '1']
+    assert toks[2].type == lx.TOKEN_NUM
+    assert toks[5].type == lx.TOKEN_OP
+
+
+def test_tokenize_compat():
+    """Tokens unpack like get_token_type results"""
+
+    (tok_type, *rest) = lx.tokenize('x! .0..10')[1]
+    assert tok_type == lx.TOKEN_RANGE
+    assert rest == ['0', '10', '.', '']
+
+    (tok_type, *rest) = lx.tokenize('x!')[0]
+    assert tok_type == lx.TOKEN_VAR
+    assert rest == ['x', '!']
+
+    toks = lx.tokenize('>> ;; else branch')
+    assert [t.type for t in toks] == [lx.TOKEN_ELSE, lx.TOKEN_COMMENT]
+    assert toks[1].groups == ('else branch',)
@@ -0,0 +1,140 @@
+import asyncio
+import threading
+
+from incremental import IncrementalAnalyzer
+from lsp import LanguageServer, encode_message, function_symbols, read_message
+
+URI = 'file:///test.bdsl'
+SOURCE = """fn double(a)
+    r = a * 2
+    << r
+--
+x .0..10.
+y = double(x)
+y?
+z?
+"""
+
+
+def session(messages: list[dict]) -> list[dict]:
+    """Sends the messages to a server, returning what it sent after analyzing"""
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        server = LanguageServer(send, debounce=0)
+        for message in messages:
+            await server.handle(message)
+        tasks = [doc.task for doc in server.documents.values() if doc.task is not None]
+        await asyncio.gather(*tasks, return_exceptions=True)
+        hover = {'textDocument': {'uri': URI}, 'position': {'line': 5, 'character': 0}}
+        await server.handle({'id': 'hover', 'method': 'textDocument/hover', 'params': hover})
+
+    asyncio.run(run())
+    return sent
+
+
+def test_diagnostics_and_hover():
+    """Test edits are analyzed once they settle, publishing their errors"""
+    open_doc = {'textDocument': {'uri': URI, 'text': SOURCE}}
+    fixed = {'textDocument': {'uri': URI}, 'contentChanges': [{'text': SOURCE[:-3]}]}
+    sent = session(
+        [
+            {'id': 1, 'method': 'initialize', 'params': {}},
+            {'method': 'textDocument/didOpen', 'params': open_doc},
+            {'method': 'textDocument/didChange', 'params': fixed},
+        ]
+    )
+
+    assert sent[0]['result']['capabilities']['hoverProvider']
+    # The first version is cancelled by the edit before it is analyzed
+    published = [msg for msg in sent if msg.get('method') == 'textDocument/publishDiagnostics']
+    assert [msg['params']['diagnostics'] for msg in published] == [[]]
+    assert sent[-1]['result']['contents']['value'] == '`y` ∈ `[0, 20]`'
+
+
+def test_diagnostic_range():
+    """Test errors are reported on the columns of the faulty variable"""
+    open_doc = {'textDocument': {'uri': URI, 'text': SOURCE}}
+    sent = session([{'method': 'textDocument/didOpen', 'params': open_doc}])
+
+    [diag] = sent[0]['params']['diagnostics']
+    assert diag['range'] == {
+        'start': {'line': 7, 'character': 0},
+        'end': {'line': 7, 'character': 1},
+    }
+    assert diag['message'] == 'VariableNotDefinedError: z'
+
+
+def test_failed_analysis_is_published(monkeypatch):
+    """Test an analysis raising publishes its error, replacing the stale diagnostics"""
+
+    def failing_update(self, text, cancel=None):
+        raise ZeroDivisionError('division by zero')
+
+    monkeypatch.setattr(IncrementalAnalyzer, 'update', failing_update)
+    open_doc = {'textDocument': {'uri': URI, 'text': SOURCE}}
+    sent = session([{'method': 'textDocument/didOpen', 'params': open_doc}])
+
+    [published] = [msg for msg in sent if msg.get('method') == 'textDocument/publishDiagnostics']
+    [diag] = published['params']['diagnostics']
+    assert (diag['code'], diag['message']) == ('ZeroDivisionError', 'division by zero')
+
+
+def test_unknown_method():
+    sent = session([{'id': 7, 'method': 'workspace/unknown', 'params': {}}])
+    assert sent[0]['id'] == 7 and sent[0]['error']['code'] == -32601
+
+
+def test_failed_request_gets_error_reply():
+    """Test a request raising, like one with malformed params, is still replied to"""
+    sent = session([{'id': 3, 'method': 'textDocument/hover', 'params': None}])
+    assert sent[0]['id'] == 3 and sent[0]['error']['code'] == -32603
+    assert sent[0]['error']['message'].startswith('TypeError')
+
+
+def test_failed_notification_is_logged(capsys):
+    """Test a notification raising is logged, and the next messages are still handled"""
+    no_text = {'textDocument': {'uri': URI}}
+    open_doc = {'textDocument': {'uri': URI, 'text': SOURCE[:-3]}}
+    sent = session(
+        [
+            {'method': 'textDocument/didOpen', 'params': no_text},
+            {'method': 'textDocument/didOpen', 'params': open_doc},
+        ]
+    )
+
+    assert 'textDocument/didOpen failed: KeyError' in capsys.readouterr().err
+    assert sent[-1]['result']['contents']['value'] == '`y` ∈ `[0, 20]`'
+
+
+def test_function_symbols():
+    lines = SOURCE.splitlines()
+    [fn] = function_symbols(lines)
+    assert (fn['name'], fn['detail']) == ('double', '(a)')
+    assert (fn['range']['start']['line'], fn['range']['end']['line']) == (0, 3)
+
+
+def test_cancelled_update_resumes():
+    """Test a cancelled analysis stops, and the next one completes it"""
+    lines = ['v0 .0..1.\n'] + [f'v{i} = v{i - 1} + 1\n' for i in range(1, 100)]
+    analyzer = IncrementalAnalyzer()
+    cancel = threading.Event()
+    cancel.set()
+
+    assert analyzer.update(lines, cancel) is None
+    result = analyzer.update(lines)
+    assert str(result.bounds['v99']) == '[99, 100]'
+    assert analyzer.executed == 100
+
+
+def test_message_framing():
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(encode_message({'id': 1, 'method': 'shutdown'}))
+        reader.feed_eof()
+        return await read_message(reader), await read_message(reader)
+
+    assert asyncio.run(run()) == ({'id': 1, 'method': 'shutdown'}, None)
@@ -0,0 +1,72 @@
+from bdsl_ir import Assign, BinOp, Declare, Num, RangeSpec, Var
+from bdsl_parser import parse_program
+from optimizer import optimize, stable_vars
+
+
+def optimized(code: str):
+    return optimize(parse_program(code.splitlines(keepends=True)))
+
+
+def test_constant_folding():
+    """Test operations between literals are computed"""
+    prog = optimized('x 0..10\ny = 2 * 3 + x\nz = 10 / 4\nw = x / 0\n')
+
+    assert prog[1].expr == BinOp('+', Num(6), Var('x'))
+    assert prog[2] == Declare(3, 'z = 10 / 4\n', 'z', False, RangeSpec(2.5, 2.5))
+    assert prog[3].expr == BinOp('/', Var('x'), Num(0))
+
+
+def test_stable_vars():
+    """Test only variables that never change can be propagated"""
+    prog = parse_program(
+        """
+a 0..1
+b = a
+c = a
+c! = 2
+d = a
+d.
+e = a
+?? e > 0
+    f = a
+--
+g = a
+h = a
+while h < 1
+    g! = a
+--
+""".splitlines(
+            keepends=True
+        )
+    )
+    assert stable_vars(prog) == {'a', 'b'}
+
+
+def test_copy_propagation():
+    """Test alias chains are collapsed"""
+    prog = optimized('x 0..10\ny = x\nz = y\nw = z + 1\nz?\n')
+
+    assert prog[2] == Assign(3, 'z = y\n', 'z', False, Var('x'))
+    assert prog[3].expr == BinOp('+', Var('x'), Num(1))
+
+
+def test_common_subexpressions():
+    """Test repeated expressions reuse the variable holding them and are shared"""
+    prog = optimized('x 0..10\ny 1..2\na = x + y\nb = x + y - 2\nc = x * y + x * y\n')
+
+    assert prog[3].expr == BinOp('-', Var('a'), Num(2))
+    c_expr = prog[4].expr
+    assert c_expr.lhs is c_expr.rhs
+
+    # Calls to user functions are left alone
+    prog = optimized('fn f(a)\n    << a\n--\nx 0..1\na = f(x)\nb = f(x)\n')
+    assert prog[3].expr == prog[2].expr
+    assert prog[3].expr != Var('a')
+
+
+def test_self_referencing_overwrite():
+    """Test overwrites reading their own variable are not rewritten to read it lazily"""
+    prog = optimized('x .0..10.\ny = x + 2\nx! = x + 2\nz = x\nx! = z * 2\n')
+
+    assert prog[2].expr == BinOp('+', Var('x'), Num(2))
+    assert prog[4].expr == BinOp('*', Var('z'), Num(2))
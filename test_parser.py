@@ -0,0 +1,159 @@
+import pytest
+
+from bdsl_ir import (
+    Assign,
+    BinOp,
+    Call,
+    Declare,
+    End,
+    FnDef,
+    For,
+    If,
+    Num,
+    Query,
+    RangeSpec,
+    Return,
+    Show,
+    Var,
+    While,
+    program_constants,
+)
+from bdsl_parser import parse_expr, parse_program
+from lexer import tokenize
+
+
+def test_statements():
+    """Test each line kind is parsed to its statement"""
+
+    program = parse_program(
+        [
+            ';; comment\n',
+            'x .0..10\n',
+            '\n',
+            'y! = x+2 ;; trailing comment\n',
+            'z = 5\n',
+            'z?\n',
+            '?v\n',
+        ]
+    )
+
+    assert [type(s) for s in program] == [Declare, Assign, Declare, Query, Show]
+
+    decl = program[0]
+    assert isinstance(decl, Declare)
+    assert decl.line_num == 2
+    assert decl.range == RangeSpec(0, 10, True, False)
+    assert not decl.overwrite
+
+    assign = program[1]
+    assert isinstance(assign, Assign)
+    assert assign.overwrite
+    assert assign.expr == BinOp('+', Var('x'), Num(2))
+
+    assert program[2] == Declare(5, 'z = 5\n', 'z', False, RangeSpec(5, 5))
+
+
+def test_if_and_function():
+    """Test conditions and function bodies"""
+
+    program = parse_program(
+        [
+            'fn f(a, b)\n',
+            '    ?? a > 1\n',
+            '        a! = b\n',
+            '    --\n',
+            '    << a\n',
+            '--\n',
+            '?? x >= 5\n',
+            '--\n',
+        ]
+    )
+
+    assert [type(s) for s in program] == [FnDef, If, End]
+
+    fn_def = program[0]
+    assert isinstance(fn_def, FnDef)
+    assert fn_def.args == ('a', 'b')
+    assert [type(s) for s in fn_def.body] == [If, Assign, End, Return]
+    assert [s.line_num for s in fn_def.body] == [2, 3, 4, 5]
+    assert str(fn_def.body[1]) == 'a! = b'
+
+    cond = program[1]
+    assert isinstance(cond, If)
+    assert cond.condition.vals == ('x', 5)
+    assert cond.condition.cond == '>='
+
+    assert parse_program(['<< res\n']) == (Return(1, '<< res\n', 'res'),)
+
+
+def test_expression_precedence():
+    """Test expression trees honor precedence and left associativity"""
+
+    expr = parse_expr(tokenize('x + y * 2 - z / 4'))
+    assert expr == BinOp(
+        '-',
+        BinOp('+', Var('x'), BinOp('*', Var('y'), Num(2))),
+        BinOp('/', Var('z'), Num(4)),
+    )
+    assert str(expr) == 'x + y * 2 - z / 4'
+
+    assert str(parse_expr(tokenize('a - b - c'))) == 'a - b - c'
+    assert str(BinOp('-', Var('a'), BinOp('-', Var('b'), Var('c')))) == 'a - (b - c)'
+
+    assert parse_expr(tokenize('f(x, y + 1)')) == Call(
+        'f', (Var('x'), BinOp('+', Var('y'), Num(1)))
+    )
+
+
+
+def test_while():
+    """Test loop bodies are parsed up to their `--`, nested blocks included"""
+
+    program = parse_program(
+        [
+            'while x < 10\n',
+            '    ?? x > 5\n',
+            '        x! = x + 2\n',
+            '    --\n',
+            '    while y > 0\n',
+            '        y! = y - 1\n',
+            '    --\n',
+            '    x! = x + 1\n',
+            '--\n',
+            'x?\n',
+        ]
+    )
+
+    assert [type(s) for s in program] == [While, Query]
+    loop = program[0]
+    assert isinstance(loop, While)
+    assert loop.condition.vals == ('x', 10)
+    assert [type(s) for s in loop.body] == [If, Assign, End, While, Assign]
+    assert [s.line_num for s in loop.body[3].body] == [6]
+    assert loop.constants() == {10, 5, 2, 0, 1}
+
+    with pytest.raises(AssertionError, match='Loop at line 1 is not closed'):
+        parse_program(['while x < 10\n', '    x! = x + 1\n'])
+    with pytest.raises(AssertionError, match='Cannot return from a loop'):
+        parse_program(['fn f(a)\n', 'while a < 1\n', '<< a\n', '--\n', '--\n'])
+
+
+def test_for():
+    """Test counted loops parse their range, which must be bounded"""
+
+    program = parse_program(['for i .0..10\n', '    s! = s + i\n', '--\n'])
+
+    assert [type(s) for s in program] == [For]
+    loop = program[0]
+    assert isinstance(loop, For)
+    assert loop.var == 'i'
+    assert [type(s) for s in loop.body] == [Assign]
+    assert loop.span() == (0, 9)
+    assert program_constants(program) == {0, 10}
+
+    assert parse_program(['for i 0.5..3.\n', '--\n'])[0].span() == (1, 3)
+
+    with pytest.raises(AssertionError, match='Malformed for loop'):
+        parse_program(['for i < 10\n', '--\n'])
+    with pytest.raises(AssertionError, match='Loop variable i cannot be set in the loop'):
+        parse_program(['for i .0..10\n', '    i! = i + 2\n', '--\n'])
@@ -0,0 +1,78 @@
+import io
+import json
+
+import pytest
+
+from bdsl_types import ProgramData
+from profiler import ProfilingInterpreter
+
+CODE = """fn grow(a)
+    r = a * a
+    << r
+--
+x .1..2. ;; [1, 2]
+?? x > 1.5
+    y = 1
+>>
+    y = 2
+--
+z = grow(y) + x
+z?
+"""
+
+
+@pytest.fixture
+def profiled():
+    interp = ProfilingInterpreter(out=io.StringIO())
+    interp.exec_code(CODE.splitlines(keepends=True), ProgramData('<test>'))
+    yield interp
+    interp.stop()
+
+
+def test_profile_lines(profiled):
+    """Test every line run is profiled, the lazy work showing on the query"""
+    lines = {line_num: stats for (line_num, _), stats in profiled.lines.items()}
+
+    # Function bodies are profiled on each call
+    assert set(lines) == {1, 2, 3, 5, 6, 7, 8, 9, 10, 11, 12}
+    assert lines[12].calc_bounds > 0 and lines[11].calc_bounds == 0
+    assert lines[12].peak_intervals >= 2 and lines[11].peak_intervals == 0
+    assert lines[12].seconds >= lines[2].seconds
+    assert all(stats.runs == 1 for stats in lines.values())
+    assert lines[12].peak_bytes > 0
+
+
+def test_profile_functions(profiled):
+    """Test user function calls are profiled, inclusive of their lines"""
+    [(name, stats)] = profiled.fn_stats.items()
+
+    assert name == 'grow'
+    assert stats.runs == 1
+    assert 0 < stats.calc_bounds <= profiled.lines[(12, 'z?')].calc_bounds
+    assert stats.seconds <= profiled.lines[(12, 'z?')].seconds
+
+
+def test_profile_json(profiled, tmp_path):
+    path = tmp_path / 'profile.json'
+    profiled.write_json(str(path))
+    data = json.loads(path.read_text())
+
+    assert [line['line'] for line in data['lines']] == [1, 2, 3, 5, 6, 7, 8, 9, 10, 11, 12]
+    assert data['functions'][0]['name'] == 'grow'
+    assert set(data['functions'][0]) == {
+        'name',
+        'runs',
+        'seconds',
+        'calc_bounds',
+        'peak_intervals',
+        'alloc_bytes',
+        'peak_bytes',
+    }
+
+
+def test_profile_report(profiled):
+    profiled.print_report(rows=3)
+    report = profiled.out.getvalue().split('profile, lines')[1]
+
+    assert report.count('\n') == 1 + 1 + 3 + 1 + 1 + 1
+    assert 'grow' in report
@@ -0,0 +1,63 @@
+import random
+
+import pytest
+
+import relational
+from bdsl_ir import BinOp, Num, Var
+from bounds import Bounds
+from relational import DBM, ZERO, Difference, alias_differences, condition_differences
+
+
+def test_condition_differences():
+    """Test conditions become differences, for the branch taken and the other one"""
+    assert condition_differences('x', '>', 'y') == (
+        [Difference('y', 'x', 0, True)],
+        [Difference('x', 'y', 0)],
+    )
+    assert condition_differences('x', '<=', 5) == (
+        [Difference('x', ZERO, 5)],
+        [Difference(ZERO, 'x', -5, True)],
+    )
+    assert condition_differences('x', '==', 'y')[1] == []
+
+    assert alias_differences('y', BinOp('-', Var('x'), Num(2))) == [
+        Difference('y', 'x', -2),
+        Difference('x', 'y', 2),
+    ]
+    assert alias_differences('y', BinOp('*', Var('x'), Num(2))) == []
+
+
+def test_closure_narrows():
+    """Test bounds are derived through the differences, strictness included"""
+    dbm = DBM(['x', 'y', 'z'])
+    dbm.add_bounds('x', Bounds.from_num_tuples(((0, 10),)))
+    dbm.add_bounds('z', Bounds.from_num_tuples(((0, 3),)))
+    # x < y <= z + 1
+    dbm.add(Difference('x', 'y', 0, True)).add(Difference('y', 'z', 1)).close()
+
+    unbounded = Bounds.from_num_tuples(((None, None),))
+    assert not dbm.is_empty()
+    assert str(dbm.narrow('x', unbounded)) == '[0, 4)'
+    assert str(dbm.narrow('y', unbounded)) == '(0, 4]'
+
+    dbm.add(Difference(ZERO, 'x', -4)).close()
+    assert dbm.is_empty()
+    assert len(dbm.narrow('x', unbounded)) == 0
+
+
+@pytest.mark.skipif(not relational.HAS_NUMPY, reason='NumPy not installed')
+def test_numpy_closure_matches():
+    """Test the NumPy closure finds the same bounds as the Python one"""
+    rng = random.Random(1)
+    names = [f'v{i}' for i in range(40)]
+    dbm = DBM(names)
+    for _ in range(120):
+        lhs, rhs = rng.sample(names, 2)
+        dbm.add(Difference(lhs, rhs, rng.randint(0, 20), rng.random() < 0.3))
+
+    expected = dbm.copy()
+    relational._close_python(expected.weights, expected.strict)
+    weights, strict = relational._close_numpy(dbm.weights, dbm.strict)
+
+    assert weights == expected.weights
+    assert strict == expected.strict
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import os
+import subprocess
+
+import bdsl
+import server as server_module
+from server import AnalysisServer
+
+
+def serve(requests: list[dict]) -> dict:
+    """Replies to the requests, sent on one stream, by id"""
+    server = AnalysisServer(bdsl.Opts(), jobs=4)
+    replies = []
+
+    async def write(data: bytes):
+        replies.append(json.loads(data))
+
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b''.join(json.dumps(req).encode() + b'\n' for req in requests))
+        reader.feed_eof()
+        await server.serve_stream(reader, write)
+
+    asyncio.run(run())
+    server.executor.shutdown()
+    assert len(replies) == len(requests)
+    return {reply['id']: reply for reply in replies}
+
+
+def test_serve_analyses():
+    """Test every request gets its reply, with the analysis results"""
+    replies = serve(
+        [{'id': n, 'source': f'x .0..{n}.\ny = x * 2\ny?\n'} for n in range(1, 20)]
+        + [{'id': 'opt', 'source': 'x 0..1\nx?\n', 'options': {'optimize': True}}]
+    )
+
+    for n in range(1, 20):
+        assert replies[n]['ok']
+        assert replies[n]['queries'][0]['bounds']['text'] == f'[0, {2 * n}]'
+    assert replies['opt']['bounds']['x']['text'] == '(0, 1)'
+
+
+def test_serve_libraries():
+    """Test registered libraries are available to the analyses listing them"""
+    lib = 'fn double(a)\n    r = a * 2\n    << r\n--\n'
+    use = 'x .1..2.\ny = double(x)\ny?\n'
+    server = AnalysisServer(bdsl.Opts(), jobs=1)
+    register = {'id': 'lib', 'op': 'register', 'library': 'math', 'source': lib}
+    assert asyncio.run(server.handle(json.dumps(register))) == {'id': 'lib', 'ok': True}
+    with_lib = asyncio.run(server.handle(json.dumps({'source': use, 'libraries': ['math']})))
+    without_lib = asyncio.run(server.handle(json.dumps({'source': use})))
+    server.executor.shutdown()
+
+    assert with_lib['queries'][0]['bounds']['text'] == '[2, 4]'
+    assert not without_lib['ok']
+    assert without_lib['diagnostics'][0]['message'] == 'Function double not defined'
+
+
+def test_serve_bad_requests():
+    """Test malformed requests get an error reply, without stopping the server"""
+    replies = serve(
+        [
+            {'id': 1, 'op': 'nope'},
+            {'id': 2, 'source': 'x 0..1\n', 'options': {'max_fragments': True}},
+            {'id': 3, 'source': 'x 0..1\n', 'libraries': ['missing']},
+            {'id': 4, 'op': 'register', 'library': 'bad', 'source': 'x 0..1\n'},
+            {'id': 5, 'source': 'x 0..1\n'},
+        ]
+    )
+
+    assert [replies[n]['ok'] for n in range(1, 6)] == [False] * 4 + [True]
+    assert replies[3]['error'] == 'Unknown libraries: missing'
+
+
+def test_serve_unexpected_errors(monkeypatch):
+    """Test a request failing unexpectedly still gets its error reply"""
+
+    def failing_analyze(*args):
+        raise ZeroDivisionError('division by zero')
+
+    monkeypatch.setattr(server_module, 'analyze', failing_analyze)
+    replies = serve([{'id': 1, 'source': 'x 0..1\n'}, {'id': 2, 'op': 'nope'}])
+
+    assert replies[1] == {'id': 1, 'ok': False, 'error': 'ZeroDivisionError: division by zero'}
+    assert replies[2] == {'id': 2, 'ok': False, 'error': 'Unknown op: nope'}
+
+
+def test_serve_stdio():
+    """Tests `bdsl.py --serve` over stdin/stdout."""
+    bounds_script = os.path.join(os.path.dirname(__file__), 'bdsl.py')
+    result = subprocess.run(
+        ['python', bounds_script, '--serve', '-j', '2'],
+        input='{"id": 1, "source": "x 0..3\\nx?\\n"}\nnot json\n',
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+    assert result.returncode == 0
+    replies = sorted(map(json.loads, result.stdout.splitlines()), key=lambda r: str(r['id']))
+    assert replies[0]['queries'][0]['bounds']['text'] == '(0, 3)'
+    assert replies[1]['id'] is None and not replies[1]['ok']
@@ -0,0 +1,99 @@
+import random
+
+import pytest
+
+import bdsl
+from bounds import Bounds
+
+np = pytest.importorskip('numpy')
+import vectorized  # pylint: disable=wrong-import-position
+
+
+def frag(n: int, offset: int) -> Bounds:
+    return Bounds.from_num_tuples(tuple((offset + 10 * i, offset + 10 * i + 3) for i in range(n)))
+
+
+def python_path(b1: Bounds, b2: Bounds, op: str, monkeypatch) -> Bounds:
+    with monkeypatch.context() as m:
+        m.setattr(vectorized, 'HAS_NUMPY', False)
+        return bdsl.collapse_expr([b1.copy(), b2.copy()], [op])
+
+
+@pytest.mark.parametrize('op', ['+', '-', '*'])
+def test_matches_python_path(op, monkeypatch):
+    """Test the vectorized cross product gives the same bounds"""
+    b1 = frag(5, 0)
+    b2 = Bounds.from_num_tuples(((100, 101), (200, 202), (300, 303), (400, 404)))
+
+    res = vectorized.collapse_bounds(b1, b2, op)
+    assert res is not None
+    assert str(res) == str(python_path(b1, b2, op, monkeypatch))
+
+
+def test_division_excludes_zero():
+    """Test divisions crossing zero exclude it"""
+    b1 = Bounds.from_num_tuples(((-6, 6), (10, 12)))
+    b2 = Bounds.from_num_tuples(((2, 3), (4, 5)))
+
+    res = vectorized.collapse_bounds(b1, b2, '/')
+    assert str(res) == '[-2.0, 0) ∪ (0, 3.0] ∪ [3.3333333333333335, 6.0]'
+
+    # Division by intervals reaching zero is left to the python path
+    assert vectorized.collapse_bounds(b1, Bounds.from_num_tuples(((0, 1),)), '/') is None
+    assert vectorized.collapse_bounds(b1, Bounds.from_num_tuples(((-2, 1), (4, 5))), '/') is None
+
+
+def test_normalize_merges_overlaps():
+    """Test results are sorted, disjoint and keep included endpoints"""
+    b1 = Bounds.from_num_tuples(((None, 0), (10, 20)), included=False)
+    b2 = Bounds.from_num_tuples(((0, 5), (5, 6)))
+
+    res = vectorized.collapse_bounds(b1, b2, '+')
+    assert res is not None
+    assert str(res) == '(None, 6) ∪ (10, 26)'
+
+    ints = Bounds.from_num_tuples(((1, 2), (3, 4)))
+    assert str(vectorized.collapse_bounds(ints, ints, '+')) == '[2, 8]'
+
+
+def random_bounds(rnd: random.Random) -> Bounds:
+    """Up to 6 disjoint intervals, some with a float endpoint"""
+    n = rnd.randint(1, 6)
+    points = sorted(rnd.sample(range(-30, 30), 2 * n))
+    intervals = []
+    for i in range(n):
+        lo = points[2 * i] + (0.5 if rnd.random() < 0.2 else 0)
+        intervals.append((lo, points[2 * i + 1]))
+    return Bounds.from_num_tuples(tuple(intervals), included=rnd.random() < 0.5)
+
+
+def test_matches_python_path_random(monkeypatch):
+    """Test random operands render the same through both paths, integer endpoints included"""
+    rnd = random.Random(0)
+    for _ in range(1000):
+        b1, b2, op = random_bounds(rnd), random_bounds(rnd), rnd.choice('+-*/')
+        res = vectorized.collapse_bounds(b1, b2, op)
+        if res is not None:
+            assert str(res) == str(python_path(b1, b2, op, monkeypatch)), (b1, op, b2)
+
+    # Ties between `-0.0` and `0` keep the integer
+    b1 = Bounds.from_num_tuples(((-3.5, -2), (0, 13)), included=False)
+    b2 = Bounds.from_num_tuples(((-5, -4), (2, 10)), included=False)
+    assert str(vectorized.collapse_bounds(b1, b2, '*')) == '(-52, 0) ∪ (0, 130)'
+    assert str(python_path(b1, b2, '*', monkeypatch)) == '(-52, 0) ∪ (0, 130)'
+
+
+def test_collapse_expr_uses_vectorized(monkeypatch):
+    """Test fragmented operands go through numpy"""
+    calls = []
+    collapse = vectorized.collapse_bounds
+
+    def spy(b1, b2, op):
+        calls.append(op)
+        return collapse(b1, b2, op)
+
+    monkeypatch.setattr(vectorized, 'collapse_bounds', spy)
+    bdsl.collapse_expr([frag(1, 0), frag(1, 1)], ['+'])
+    assert not calls
+    bdsl.collapse_expr([frag(4, 0), frag(4, 1)], ['+'])
+    assert calls == ['+']
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
 
+from bdsl_ir import Expr
 from bounds import Bounds, Interval
 from configuration import UNICODE_OUT
 from colors import c
@@ -12,21 +13,18 @@ class VarData:
     name: str
     bounds: Bounds | None
     size: int = 1
-    expr: list[str] | None = None
+    expr: Expr | None = None
 
     @classmethod
     def auto(
-        cls, name: str, arg2: Bounds | Interval | list[str] | None, size: str | None
+        cls, name: str, arg2: Bounds | Interval | Expr | None, size: str | None
     ):
 
         size_i: int | None = 1 if size is None else int(size)
         if arg2 is None:
             bounds = None
             expr = None
-        elif isinstance(arg2, list):
-            assert all(
-                isinstance(arg2i, str) for arg2i in arg2
-            ), f'Expression {arg2} must be a list of strings'
+        elif isinstance(arg2, Expr):
             expr = arg2
             bounds = None
         else:
@@ -75,4 +73,4 @@ class VarData:
             return f'{varname} : {bs_string}'
 
         # return f'{self.name} ({self.size}) "{' '.join(self.expr)}"'
-        return f'{varname} "{' '.join(self.expr)}"'
+        return f'{varname} "{self.expr}"'
@@ -0,0 +1,168 @@
+"""
+NumPy implementation of the interval cross product used by `collapse_expr`.
+
+All the pairs of intervals of the two operands are combined at once, then
+the results are normalized (sorted and merged) with a single sort and sweep.
+NumPy is optional: without it `HAS_NUMPY` is False and callers keep using
+the pure Python path.
+"""
+
+from array import array
+
+from bounds import Bounds
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # pylint: disable=invalid-name
+
+HAS_NUMPY = np is not None
+
+_OPS = {
+    '+': lambda x, y: x + y,
+    '-': lambda x, y: x - y,
+    '*': lambda x, y: x * y,
+    '/': lambda x, y: x / y,
+}
+
+
+def _unpack_mask(mask: int, n: int):
+    raw = np.frombuffer(mask.to_bytes((n + 7) // 8, 'little'), dtype=np.uint8)
+    return np.unpackbits(raw, count=n, bitorder='little').astype(bool)
+
+
+def _pack_mask(flags) -> int:
+    return int.from_bytes(np.packbits(flags, bitorder='little').tobytes(), 'little')
+
+
+def _endpoints(bounds: Bounds):
+    """Lower and upper endpoints, as (values, included, is_int) arrays"""
+    vals, incl, ints = bounds.packed()
+    n = len(vals)
+    v = np.frombuffer(vals, dtype=np.float64)
+    inc = _unpack_mask(incl, n)
+    its = _unpack_mask(ints, n)
+    return (v[0::2], inc[0::2], its[0::2]), (v[1::2], inc[1::2], its[1::2])
+
+
+def normalize(lo, lo_in, lo_int, hi, hi_in, hi_int) -> Bounds:
+    """
+    Unites a set of (possibly overlapping) intervals, given as flat arrays
+    of their endpoints, into sorted disjoint bounds. Among equal ends,
+    integer ones are kept, like `Bounds.union_many`.
+    """
+    order = np.lexsort((~lo_int, ~lo_in, lo))
+    lo, lo_in, lo_int = lo[order], lo_in[order], lo_int[order]
+    hi, hi_in, hi_int = hi[order], hi_in[order], hi_int[order]
+
+    # Furthest upper end seen so far: ranking by (value, included, integer)
+    #   lets a running maximum pick the included, then integer, one among
+    #   equal values.
+    by_hi = np.lexsort((hi_int, hi_in, hi))
+    rank = np.empty_like(by_hi)
+    rank[by_hi] = np.arange(len(by_hi))
+    reach = by_hi[np.maximum.accumulate(rank)]
+
+    prev_hi, prev_in = hi[reach[:-1]], hi_in[reach[:-1]]
+    gaps = (lo[1:] > prev_hi) | ((lo[1:] == prev_hi) & ~lo_in[1:] & ~prev_in)
+    starts = np.flatnonzero(np.concatenate(([True], gaps)))
+    ends = reach[np.append(starts[1:] - 1, len(lo) - 1)]
+
+    vals = np.empty(2 * len(starts))
+    vals[0::2], vals[1::2] = lo[starts], hi[ends]
+    bounded = np.isfinite(vals)
+    incl = np.empty(len(vals), dtype=bool)
+    incl[0::2], incl[1::2] = lo_in[starts], hi_in[ends]
+    ints = np.empty(len(vals), dtype=bool)
+    ints[0::2], ints[1::2] = lo_int[starts], hi_int[ends]
+
+    return Bounds.from_packed(
+        array('d', vals.tobytes()),
+        _pack_mask(incl & bounded),
+        _pack_mask(ints & bounded),
+    )
+
+
+def collapse_bounds(b1: Bounds, b2: Bounds, op: str) -> Bounds | None:
+    """
+    Applies `op` between every interval of `b1` and every interval of `b2`,
+    uniting the results.
+
+    Follows the same rules as the pure Python path, except that empty
+    results are dropped. Returns None for the degenerate cases (division
+    by intervals reaching 0, reversed or only empty results) that the
+    caller should leave to it.
+    """
+    (lo1, lo1_in, lo1_int), (hi1, hi1_in, hi1_int) = _endpoints(b1)
+    (lo2, lo2_in, lo2_int), (hi2, hi2_in, hi2_int) = _endpoints(b2)
+    # Rows index intervals of b1, columns intervals of b2
+    lo1, lo1_in, lo1_int = lo1[:, None], lo1_in[:, None], lo1_int[:, None]
+    hi1, hi1_in, hi1_int = hi1[:, None], hi1_in[:, None], hi1_int[:, None]
+
+    if op == '/':
+        if np.any((lo2 <= 0) & (hi2 >= 0)):
+            return None
+        min_ops = (lo1, lo1_in, lo1_int), (hi2, hi2_in, hi2_int)
+        max_ops = (hi1, hi1_in, hi1_int), (lo2, lo2_in, lo2_int)
+    else:
+        min_ops = (lo1, lo1_in, lo1_int), (lo2, lo2_in, lo2_int)
+        max_ops = (hi1, hi1_in, hi1_int), (hi2, hi2_in, hi2_int)
+
+    opf = _OPS[op]
+    shape = (len(b1), len(b2))
+    results = []
+    for (x, x_in, x_int), (y, y_in, y_int) in (min_ops, max_ops):
+        unbounded = np.broadcast_to(np.isinf(x) | np.isinf(y), shape)
+        with np.errstate(all='ignore'):
+            val = np.broadcast_to(opf(x, y), shape)
+        is_int = np.broadcast_to(x_int & y_int, shape) & (op != '/')
+        results.append(
+            [a.ravel() for a in (val, np.broadcast_to(x_in & y_in, shape), is_int, unbounded)]
+        )
+    (r_min, min_in, min_int, min_unb), (r_max, max_in, max_int, max_unb) = results
+
+    both = ~min_unb & ~max_unb
+    if op == '/':
+        if np.any(both & (r_max < r_min)):
+            return None
+        # Results crossing zero exclude it
+        split = (min_unb | ((r_min < 0) & (max_unb | (r_max > 0)))) & (
+            max_unb | (r_max >= 0)
+        )
+    else:
+        swap = both & (r_max < r_min)
+        r_min, r_max = np.where(swap, r_max, r_min), np.where(swap, r_min, r_max)
+        min_in, max_in = np.where(swap, max_in, min_in), np.where(swap, min_in, max_in)
+        min_int, max_int = np.where(swap, max_int, min_int), np.where(swap, min_int, max_int)
+        split = np.zeros_like(swap)
+
+    r_min = np.where(min_unb, -np.inf, r_min)
+    r_max = np.where(max_unb, np.inf, r_max)
+
+    if np.any(split):
+        n_split = np.count_nonzero(split)
+        zeros = np.zeros(n_split)
+        no, yes = np.zeros(n_split, dtype=bool), np.ones(n_split, dtype=bool)
+        # Lower pieces end at the zero, upper pieces (appended) start there
+        r_max, max_in, max_int = (
+            np.where(split, 0, r_max),
+            np.where(split, False, max_in),
+            np.where(split, True, max_int),
+        )
+        r_min = np.concatenate((r_min, zeros))
+        min_in = np.concatenate((min_in, no))
+        min_int = np.concatenate((min_int, yes))
+        r_max = np.concatenate((r_max, results[1][0][split]))
+        max_in = np.concatenate((max_in, results[1][1][split]))
+        max_int = np.concatenate((max_int, results[1][2][split]))
+        # The original upper end of the split pieces may be unbounded
+        r_max[-n_split:] = np.where(results[1][3][split], np.inf, r_max[-n_split:])
+
+    # Drop empty results, like `(2, 2)`
+    keep = (r_min != r_max) | (min_in & max_in)
+    if not np.any(keep):
+        return None
+
+    return normalize(
+        r_min[keep], min_in[keep], min_int[keep], r_max[keep], max_in[keep], max_int[keep]
+    )